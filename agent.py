@@ -3,47 +3,98 @@ Logique de l'agent conversationnel (FR) avec GPT-4o-mini.
 
 Fonctions principales:
 - llm_generate(prompt): interroge GPT-4o-mini via le SDK OpenAI
+- llm_stream(prompt): même requête en streaming (générateur de tokens)
 - respond(user_text): renvoie la réponse (LLM ou fallback)
+- respond_stream(user_text): réponse en flux de tokens (LLM ou fallback)
 """
 
-from typing import Optional
+from typing import Iterator, Optional
+
+import hedging
+import tracing
 
 try:
-    # SDK OpenAI (python-openai >= 1.0)
+    # SDK OpenAI (python-openai >= 1.0), client partagé du processus
     from openai import OpenAI
+    from openai_client import get_client, llm_timeout
 except Exception:  # pragma: no cover
     OpenAI = None  # géré au runtime
 
+SYSTEM_PROMPT = "Tu es un assistant vocal francophone, réponds brièvement en français."
+NOTHING_HEARD_REPLY = "Je n'ai rien entendu. Peux-tu répéter ?"
+
 
 def llm_generate(prompt: str) -> Optional[str]:
     """Produit une réponse en français en utilisant GPT-4o-mini.
 
     Requiert OPENAI_API_KEY dans l'environnement.
-    Retourne None en cas d'erreur pour laisser le fallback s'appliquer.
+    Retourne None en cas d'erreur ou de budget du tour épuisé pour laisser le fallback s'appliquer.
     """
     if not prompt or not prompt.strip():
         return None
     try:
         if OpenAI is None:
             return None
-        client = OpenAI()
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Tu es un assistant vocal francophone, réponds brièvement en français."},
-                {"role": "user", "content": prompt},
-            ],
+        client = hedging.no_retry(get_client())
+        tracing.mark("llm_request")
+        # Budget du tour et hedging; BudgetExceeded → None → fallback écho
+        resp = hedging.call(
+            "llm",
+            lambda timeout: client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                timeout=timeout,
+            ),
+            llm_timeout(),
         )
+        tracing.mark("llm_response")
         text = resp.choices[0].message.content if resp.choices else None
         return text.strip() if text else None
     except Exception:
         return None
 
 
+def llm_stream(prompt: str) -> Iterator[str]:
+    """Comme llm_generate, mais renvoie les tokens au fil de l'eau (stream=True).
+
+    En cas d'erreur ou de budget du tour épuisé (hedging.py), le générateur s'arrête simplement
+    (le fallback est géré par l'appelant).
+    """
+    if not prompt or not prompt.strip() or OpenAI is None:
+        return
+    try:
+        client = hedging.no_retry(get_client())
+        tracing.mark("llm_request")
+        # Budget et hedging sur le premier token; le flux perdant est fermé
+        tokens = hedging.stream(
+            "llm",
+            lambda timeout: client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                stream=True,
+                timeout=timeout,
+            ),
+            lambda event: event.choices[0].delta.content if event.choices else None,
+            llm_timeout(),
+        )
+        for delta in tokens:
+            # Réponse LLM = premier token reçu
+            tracing.mark("llm_response")
+            yield delta
+    except Exception:
+        return
+
+
 def respond(user_text: str) -> str:
     """Retourne la réponse texte de l'agent."""
     if not user_text or not user_text.strip():
-        return "Je n'ai rien entendu. Peux-tu répéter ?"
+        return NOTHING_HEARD_REPLY
 
     # Essai LLM d'abord
     llm_response = llm_generate(user_text)
@@ -54,5 +105,15 @@ def respond(user_text: str) -> str:
     return f"Tu as dit : {user_text.strip()}"
 
 
+def respond_stream(user_text: str) -> Iterator[str]:
+    """Retourne la réponse de l'agent token par token (fallback écho si le LLM ne répond rien)."""
+    if not user_text or not user_text.strip():
+        yield NOTHING_HEARD_REPLY
+        return
 
-
+    got_tokens = False
+    for token in llm_stream(user_text):
+        got_tokens = True
+        yield token
+    if not got_tokens:
+        yield f"Tu as dit : {user_text.strip()}"
@@ -0,0 +1,213 @@
+"""
+Runtime asyncio de la boucle de conversation de talk_segments.py (--runtime async).
+
+La boucle synchrone enchaîne bip → capture → STT → décision → lecture bloquante. Ici chaque
+étape est une tâche asyncio reliée à la suivante par une file bornée:
+
+    capture → fin de tour → transcription → décision → lecture
+
+- capture: positions d'écriture du service de capture (aucune copie d'échantillons)
+- fin de tour: VAD + endpointer (stt_openai.UtteranceDetector), tour copié hors du tampon
+- transcription / décision / lecture: appels bloquants exécutés dans des threads (asyncio.to_thread)
+
+La capture et la détection de fin de tour continuent pendant la transcription, la décision et
+la lecture des tours précédents. La décision attend que la lecture précédente soit terminée
+(la mémoire de session est mise à jour par la lecture). Chaque étape publie sa durée de
+service et la profondeur de sa file d'entrée (metrics: stage_<nom>_ms, stage_<nom>_queue).
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+import metrics
+from barge_in import BargeIn
+from capture import get_capture_service
+from decision_cache import DecisionCache
+from segment_player import SegmentPlayer
+from stt_openai import UtteranceDetector, _write_wav_bytes, transcribe_wave
+from talk_segments import (
+    beep_short,
+    choose_next_action,
+    compute_allowed_records,
+    execute_decision,
+    update_memory,
+)
+
+
+class StageStats:
+    """Durée de service et profondeur de file d'une étape."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.busy_s = 0.0
+        self.max_service_s = 0.0
+        self.max_depth = 0
+
+    def record(self, service_s: float, depth: int) -> None:
+        self.count += 1
+        self.busy_s += service_s
+        self.max_service_s = max(self.max_service_s, service_s)
+        self.max_depth = max(self.max_depth, depth)
+        metrics.observe(f"stage_{self.name}_ms", service_s * 1000.0)
+        metrics.observe(f"stage_{self.name}_queue", depth)
+
+    def line(self) -> str:
+        mean_ms = self.busy_s / self.count * 1000.0 if self.count else 0.0
+        return (
+            f"{self.name}: n={self.count} service moy={mean_ms:.1f} ms max={self.max_service_s * 1000.0:.0f} ms "
+            f"file max={self.max_depth}"
+        )
+
+
+class SegmentPipeline:
+    """Étapes de la conversation talk_segments reliées par des files asyncio bornées."""
+
+    def __init__(
+        self,
+        memory: Dict[str, Any],
+        id_to_path: Dict[str, str],
+        records_for_prompt: List[Dict[str, str]],
+        player: Optional[SegmentPlayer] = None,
+        decision_cache: Optional[DecisionCache] = None,
+        barge_in: Optional[BargeIn] = None,
+        queue_size: Optional[int] = None,
+    ):
+        if queue_size is None:
+            try:
+                queue_size = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+            except Exception:
+                queue_size = 4
+        self.memory = memory
+        self.id_to_path = id_to_path
+        self.records_for_prompt = records_for_prompt
+        self.player = player
+        self.decision_cache = decision_cache
+        self.barge_in = barge_in
+        self.queue_size = max(1, queue_size)
+        self.capture = get_capture_service()
+        self.stats = {
+            name: StageStats(name)
+            for name in ("capture", "endpoint", "transcribe", "decide", "playback")
+        }
+        self._done: Optional[asyncio.Event] = None
+
+    # --- étapes ---
+
+    async def _capture(self, out_q: "asyncio.Queue[int]") -> None:
+        stats = self.stats["capture"]
+        pos = self.capture.position
+        while True:
+            _, end = await asyncio.to_thread(self.capture.wait_read, pos, 0.1)
+            if end > pos:
+                # Positions seulement: les échantillons restent dans le tampon circulaire.
+                # Durée de service = attente de place dans la file (contre-pression)
+                t0 = time.perf_counter()
+                await out_q.put(end)
+                pos = end
+                stats.record(time.perf_counter() - t0, out_q.qsize())
+
+    async def _endpoint(self, end: int, out_q: "asyncio.Queue[np.ndarray]") -> None:
+        audio = self._detector.advance(end)
+        if audio is None and self._detector.timed_out:
+            audio = self._detector.flush()
+        if audio is not None and audio.size:
+            # Copie: le tour peut attendre dans la file pendant que le tampon avance
+            await out_q.put(np.array(audio, dtype=np.float32, copy=True))
+
+    async def _transcribe(self, audio: np.ndarray, out_q: "asyncio.Queue[str]") -> None:
+        wav_bytes = _write_wav_bytes(audio, self.capture.sample_rate_hz)
+        text = await asyncio.to_thread(transcribe_wave, wav_bytes)
+        await out_q.put(text)
+
+    async def _decide(self, text: str, out_q: "asyncio.Queue[tuple]") -> None:
+        if text:
+            print(f"Reconnu (STT): {text}")
+        else:
+            print("(STT) silence ou inaudible.")
+        # La lecture en cours met la mémoire à jour: décider sur l'état qui en résulte
+        await out_q.join()
+        update_memory(text, self.memory)
+        allowed = compute_allowed_records(self.memory, self.id_to_path)
+        decision = await asyncio.to_thread(
+            choose_next_action, text, self.memory, self.records_for_prompt, allowed, None, self.decision_cache
+        )
+        await out_q.put((decision, allowed))
+
+    async def _playback(self, item: tuple) -> None:
+        decision, allowed = item
+        keep = await asyncio.to_thread(
+            execute_decision, decision, allowed, self.memory, self.id_to_path, self.player, self.barge_in
+        )
+        if not keep:
+            self._done.set()
+            return
+        await asyncio.to_thread(beep_short)
+
+    async def _serve(
+        self,
+        name: str,
+        in_q: asyncio.Queue,
+        handler: Callable[[Any], Awaitable[None]],
+    ) -> None:
+        stats = self.stats[name]
+        while True:
+            item = await in_q.get()
+            depth = in_q.qsize()
+            t0 = time.perf_counter()
+            try:
+                await handler(item)
+            except Exception as e:
+                print(f"[RUNTIME] Étape {name}: erreur {e}")
+            finally:
+                stats.record(time.perf_counter() - t0, depth)
+                in_q.task_done()
+
+    # --- exécution ---
+
+    async def run(self) -> None:
+        self._done = asyncio.Event()
+        self._detector = UtteranceDetector(self.capture)
+        size = self.queue_size
+        # File des positions de capture plus profonde: ~50 blocs de 20 ms
+        positions: "asyncio.Queue[int]" = asyncio.Queue(maxsize=max(size, 50))
+        utterances: "asyncio.Queue[np.ndarray]" = asyncio.Queue(maxsize=size)
+        texts: "asyncio.Queue[str]" = asyncio.Queue(maxsize=size)
+        actions: "asyncio.Queue[tuple]" = asyncio.Queue(maxsize=size)
+        tasks = [
+            asyncio.create_task(self._capture(positions)),
+            asyncio.create_task(self._serve("endpoint", positions, lambda end: self._endpoint(end, utterances))),
+            asyncio.create_task(self._serve("transcribe", utterances, lambda audio: self._transcribe(audio, texts))),
+            asyncio.create_task(self._serve("decide", texts, lambda text: self._decide(text, actions))),
+            asyncio.create_task(self._serve("playback", actions, self._playback)),
+        ]
+        await asyncio.to_thread(beep_short)
+        try:
+            await self._done.wait()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def report(self) -> str:
+        return "\n".join("[RUNTIME] " + stats.line() for stats in self.stats.values())
+
+
+def run_async(
+    memory: Dict[str, Any],
+    id_to_path: Dict[str, str],
+    records_for_prompt: List[Dict[str, str]],
+    player: Optional[SegmentPlayer] = None,
+    decision_cache: Optional[DecisionCache] = None,
+    barge_in: Optional[BargeIn] = None,
+) -> None:
+    """Lance la conversation en mode pipeline asyncio jusqu'à la fin de session (ou Ctrl+C)."""
+    pipeline = SegmentPipeline(memory, id_to_path, records_for_prompt, player, decision_cache, barge_in)
+    try:
+        asyncio.run(pipeline.run())
+    finally:
+        print(pipeline.report())
@@ -0,0 +1,346 @@
+"""
+Moteur de sortie audio persistant (un OutputStream PortAudio par processus).
+
+Fonctions principales:
+- OutputEngine: flux de sortie unique alimenté par un tampon circulaire préalloué
+- NullOutputEngine: même moteur vidé par une horloge, sans périphérique (rejeu de session, benchmarks)
+- get_output_engine(): instance partagée du processus (ou de la session active, session_scope)
+- resolve_output_device_index(name): index sounddevice d'un périphérique de sortie par nom
+
+Tout ce qui est joué est publié dans OutputEngine.reference (echo_gate.PlaybackReference)
+pour que la capture puisse reconnaître notre propre voix renvoyée par Meet.
+"""
+
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+import session_scope
+import tracing
+from echo_gate import PlaybackReference
+
+OUTPUT_SAMPLE_RATE_HZ = 48000
+_UNRESOLVED = object()
+
+
+def resolve_output_device_index(name_or_substr: str) -> "int | None":
+    """Retourne l'index du périphérique de sortie dont le nom contient name_or_substr (insensible à la casse).
+    Si vide ou introuvable, retourne None.
+    """
+    try:
+        if not name_or_substr:
+            return None
+        import sounddevice as sd
+
+        devices = sd.query_devices()
+        target = name_or_substr.lower()
+        for idx, dev in enumerate(devices):
+            try:
+                if dev.get("max_output_channels", 0) <= 0:
+                    continue
+                dev_name = str(dev.get("name", "")).lower()
+                if target in dev_name:
+                    return idx
+            except Exception:
+                continue
+        return None
+    except Exception:
+        return None
+
+
+class OutputEngine:
+    """Sortie mono float32 via un OutputStream ouvert une seule fois.
+
+    Les échantillons sont copiés dans un tampon circulaire préalloué que le callback
+    PortAudio vide bloc par bloc: un nouvel extrait peut être mis en file pendant que le
+    précédent est joué. L'index du périphérique est résolu une fois (device, SD_OUTPUT_DEVICE puis
+    PULSE_SINK) et n'est re-résolu qu'après une erreur de périphérique. device est aussi passé en
+    PULSE_SINK le temps de l'ouverture (sink PulseAudio de la session).
+    """
+
+    def __init__(
+        self,
+        sample_rate_hz: int = OUTPUT_SAMPLE_RATE_HZ,
+        capacity_s: float = 30.0,
+        blocksize: int = 480,
+        fallback_device: Optional[int] = None,
+        device: Optional[str] = None,
+    ):
+        self.device_name = device or None
+        self.sample_rate_hz = int(sample_rate_hz)
+        self.blocksize = int(blocksize)
+        self.fallback_device = fallback_device
+        self._ring = np.zeros(max(self.blocksize, int(capacity_s * self.sample_rate_hz)), dtype=np.float32)
+        # Compteurs absolus (en échantillons) des positions de lecture et d'écriture
+        self._read = 0
+        self._write = 0
+        self._cond = threading.Condition()
+        self._stream = None
+        self._device = _UNRESOLVED
+        self._tones: Dict[Tuple[float, float, float], np.ndarray] = {}
+        self.reference = PlaybackReference()
+
+    # --- périphérique / flux ---
+
+    def _resolve_device(self) -> "int | None":
+        if self._device is _UNRESOLVED:
+            name = self.device_name or os.getenv("SD_OUTPUT_DEVICE") or os.getenv("PULSE_SINK") or ""
+            device = resolve_output_device_index(name)
+            self._device = device if device is not None else self.fallback_device
+        return self._device
+
+    def _open_stream(self):
+        import sounddevice as sd
+
+        with session_scope.pulse_env("PULSE_SINK", self.device_name):
+            stream = sd.OutputStream(
+                samplerate=self.sample_rate_hz,
+                channels=1,
+                dtype="float32",
+                blocksize=self.blocksize,
+                latency="low",
+                device=self._resolve_device(),
+                callback=self._callback,
+            )
+            stream.start()
+        return stream
+
+    def start(self) -> None:
+        """Ouvre le flux si nécessaire; en cas d'erreur, re-résout le périphérique et réessaie une fois."""
+        if self._stream is not None and self._stream.active:
+            return
+        self._close_stream()
+        try:
+            self._stream = self._open_stream()
+        except Exception as e:
+            print(f"[AUDIO] Ouverture sortie échouée ({e}); nouvelle résolution du périphérique.")
+            self._device = _UNRESOLVED
+            self._stream = self._open_stream()
+
+    def _close_stream(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    def close(self) -> None:
+        self.stop()
+        self._close_stream()
+
+    # --- tampon circulaire ---
+
+    def _callback(self, outdata, frames, time_info, status) -> None:
+        out = outdata[:, 0]
+        self._fill(out)
+        # Instant où ce bloc sera entendu: horloge du flux (DAC) ramenée à time.monotonic()
+        try:
+            delay = float(time_info.outputBufferDacTime - time_info.currentTime)
+        except Exception:
+            delay = 0.0
+        if not 0.0 < delay < 1.0:
+            delay = float(getattr(self._stream, "latency", 0.0) or 0.0)
+        self.reference.publish(out, time.monotonic() + delay, self.sample_rate_hz)
+
+    def _fill(self, out: np.ndarray) -> None:
+        """Copie les prochains échantillons du tampon dans out (silence si vide)."""
+        n = out.shape[0]
+        cap = self._ring.shape[0]
+        with self._cond:
+            k = min(n, self._write - self._read)
+            if k > 0:
+                start = self._read % cap
+                first = min(k, cap - start)
+                out[:first] = self._ring[start:start + first]
+                if first < k:
+                    out[first:k] = self._ring[:k - first]
+                self._read += k
+                self._cond.notify_all()
+        if k < n:
+            out[max(k, 0):] = 0.0
+
+    def enqueue(self, samples: np.ndarray) -> int:
+        """Ajoute des échantillons mono float32 à la file de lecture (attend s'il manque de place).
+
+        Les échantillons int16 (bundle de segments en memory-map) sont convertis directement
+        dans le tampon circulaire, sans copie intermédiaire.
+        Retourne la position absolue de fin de l'extrait (utilisable par wait()).
+        """
+        tracing.mark("first_audio")
+        if getattr(samples, "dtype", None) == np.int16:
+            samples = samples.reshape(-1)
+            scale = 1.0 / 32768.0
+        else:
+            samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+            scale = None
+        self.start()
+        cap = self._ring.shape[0]
+        pos = 0
+        with self._cond:
+            while pos < samples.shape[0]:
+                free = cap - (self._write - self._read)
+                if free <= 0:
+                    self._cond.wait(timeout=0.5)
+                    if self._stream is None or not self._stream.active:
+                        break
+                    continue
+                k = min(free, samples.shape[0] - pos)
+                start = self._write % cap
+                first = min(k, cap - start)
+                if scale is None:
+                    self._ring[start:start + first] = samples[pos:pos + first]
+                    if first < k:
+                        self._ring[:k - first] = samples[pos + first:pos + k]
+                else:
+                    np.multiply(samples[pos:pos + first], scale, out=self._ring[start:start + first])
+                    if first < k:
+                        np.multiply(samples[pos + first:pos + k], scale, out=self._ring[:k - first])
+                self._write += k
+                pos += k
+            return self._write
+
+    def wait(self, until: Optional[int] = None, timeout: Optional[float] = None) -> bool:
+        """Attend que la file soit jouée (jusqu'à la position until si fournie)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            target = self._write if until is None else until
+            while self._read < min(target, self._write):
+                if self._stream is None or not self._stream.active:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(timeout=0.5 if remaining is None else min(0.5, remaining))
+        # Laisse sortir le dernier bloc déjà transmis au périphérique
+        latency = getattr(self._stream, "latency", 0.0) or 0.0
+        if latency > 0:
+            time.sleep(float(latency))
+        return True
+
+    def play(self, samples: np.ndarray) -> bool:
+        """Joue un extrait et attend la fin de sa lecture."""
+        try:
+            end = self.enqueue(samples)
+            return self.wait(until=end)
+        except Exception as e:
+            print(f"[AUDIO] Erreur de sortie: {e}")
+            self._device = _UNRESOLVED
+            self._close_stream()
+            return False
+
+    def stop(self) -> None:
+        """Abandonne tout ce qui reste en file (effet au prochain bloc du callback)."""
+        with self._cond:
+            self._read = self._write
+            self._cond.notify_all()
+
+    @property
+    def position(self) -> int:
+        """Position de lecture absolue (échantillons transmis au périphérique)."""
+        with self._cond:
+            return self._read
+
+    @property
+    def write_position(self) -> int:
+        """Position absolue de fin de file (début du prochain extrait mis en file)."""
+        with self._cond:
+            return self._write
+
+    def reached(self, until: int) -> bool:
+        """Vrai si la lecture a atteint until (ou si le flux n'est plus actif)."""
+        with self._cond:
+            if self._stream is None or not self._stream.active:
+                return True
+            return self._read >= min(until, self._write)
+
+    @property
+    def pending_frames(self) -> int:
+        with self._cond:
+            return self._write - self._read
+
+    # --- sons précalculés ---
+
+    def tone(self, freq_hz: float = 440.0, duration_s: float = 0.1, amplitude: float = 0.2) -> np.ndarray:
+        """Sinusoïde précalculée (mise en cache par fréquence/durée/amplitude)."""
+        key = (float(freq_hz), float(duration_s), float(amplitude))
+        tone = self._tones.get(key)
+        if tone is None:
+            t = np.arange(int(self.sample_rate_hz * duration_s), dtype=np.float32) / self.sample_rate_hz
+            tone = (amplitude * np.sin(2 * np.pi * freq_hz * t)).astype(np.float32)
+            self._tones[key] = tone
+        return tone
+
+    def beep(self, freq_hz: float = 440.0, duration_s: float = 0.1) -> bool:
+        return self.play(self.tone(freq_hz, duration_s))
+
+
+class _TimeInfo:
+    outputBufferDacTime = 0.0
+    currentTime = 0.0
+
+
+class _ClockStream:
+    """Remplace l'OutputStream: appelle le callback du moteur au rythme du temps réel."""
+
+    latency = 0.0
+
+    def __init__(self, engine: "NullOutputEngine"):
+        self.engine = engine
+        self.active = True
+        threading.Thread(target=self._run, name="null-output", daemon=True).start()
+
+    def _run(self) -> None:
+        engine = self.engine
+        frames = engine.blocksize
+        out = np.zeros((frames, 1), dtype=np.float32)
+        period = frames / float(engine.sample_rate_hz)
+        next_t = time.monotonic()
+        while self.active:
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            engine._callback(out, frames, _TimeInfo(), None)
+            if engine.on_block is not None:
+                engine.on_block(out[:, 0], time.monotonic())
+
+    def close(self) -> None:
+        self.active = False
+
+
+class NullOutputEngine(OutputEngine):
+    """Moteur de sortie sans périphérique: le tampon est vidé en temps réel et jeté.
+
+    on_block(bloc, instant) est appelé après chaque bloc « joué » (horodatage de la lecture).
+    """
+
+    def __init__(self, on_block: Optional[Callable[[np.ndarray, float], None]] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.on_block = on_block
+
+    def _open_stream(self):
+        return _ClockStream(self)
+
+
+_engine: Optional[OutputEngine] = None
+_engine_lock = threading.Lock()
+
+
+def get_output_engine(fallback_device: Optional[int] = None) -> OutputEngine:
+    """Retourne le moteur de sortie partagé du processus (créé au premier appel).
+
+    Dans une portée de session, le moteur est celui de la session (sink scope.sink).
+    """
+    global _engine
+    scope = session_scope.current()
+    if scope is not None:
+        return scope.get("output", lambda: OutputEngine(fallback_device=fallback_device, device=scope.sink))
+    with _engine_lock:
+        if _engine is None:
+            _engine = OutputEngine(fallback_device=fallback_device)
+        return _engine
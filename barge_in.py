@@ -0,0 +1,160 @@
+"""
+Barge-in: écoute pendant la lecture et coupe l'agent quand l'interlocuteur parle.
+
+La capture persistante (capture.py, source PULSE_SOURCE = meet_output.monitor) reste
+ouverte pendant que le moteur de sortie joue. Un thread de veille passe les nouveaux
+échantillons dans un VAD adaptatif; après BARGE_IN_MIN_SPEECH_MS de parole continue, la
+file de sortie est vidée (OutputEngine.stop, effet au bloc suivant) et la position de
+début de parole est retenue pour que le tour suivant démarre dessus, pré-roll compris,
+sans bip ni attente.
+
+- BargeIn(engine, capture): arm() / disarm() autour d'une lecture, play(samples), wait(until)
+- consume(): position de capture où l'interlocuteur a commencé à parler (ou None)
+
+Une prise de parole expliquée par notre propre lecture (écho Meet, echo_gate) ne coupe pas.
+"""
+
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+
+import metrics
+import session_scope
+from audio_output import OutputEngine
+from capture import CaptureService, get_capture_service
+from echo_gate import get_echo_gate
+from vad import AdaptiveVAD, Endpointer
+
+# Extrait récent (avant la lecture) servant à initialiser le plancher de bruit
+PRIME_MS = 500
+# Contexte avant le début de parole pour estimer le retard d'écho
+ECHO_CONTEXT_MS = 1000
+
+
+class BargeIn:
+    """Veille VAD sur la capture pendant la lecture; vide la sortie à la prise de parole."""
+
+    def __init__(
+        self,
+        engine: OutputEngine,
+        capture: Optional[CaptureService] = None,
+        min_speech_ms: Optional[float] = None,
+    ):
+        if min_speech_ms is None:
+            try:
+                min_speech_ms = float(os.getenv("BARGE_IN_MIN_SPEECH_MS", "100"))
+            except Exception:
+                min_speech_ms = 100.0
+        self.engine = engine
+        self.capture = capture or get_capture_service()
+        self.min_speech_ms = float(min_speech_ms)
+        self.interrupted_at: Optional[int] = None
+        # Position de lecture (OutputEngine.position) au moment de la coupure
+        self.played_until: Optional[int] = None
+        self._triggered = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.echo_gate = get_echo_gate()
+
+    @property
+    def interrupted(self) -> bool:
+        return self._triggered.is_set()
+
+    def consume(self) -> Optional[int]:
+        """Retourne puis oublie la position de début de parole de la dernière interruption."""
+        pos, self.interrupted_at = self.interrupted_at, None
+        self._triggered.clear()
+        return pos
+
+    # --- veille ---
+
+    def arm(self) -> None:
+        """Démarre la veille à partir de la position de capture courante."""
+        if self._thread is not None:
+            return
+        self.interrupted_at = None
+        self.played_until = None
+        self._triggered.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=session_scope.wrap(self._watch), name="barge-in", daemon=True)
+        self._thread.start()
+
+    def disarm(self) -> None:
+        thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=1.0)
+
+    def _watch(self) -> None:
+        capture = self.capture
+        sr = capture.sample_rate_hz
+        vad = AdaptiveVAD(sr)
+        endpointer = Endpointer(vad.frame_ms, min_speech_ms=self.min_speech_ms)
+        base = capture.position
+        vad.prime(capture.view(base - int(sr * PRIME_MS / 1000), base))
+        pos = base
+        while not self._stop.is_set():
+            chunk, pos = capture.wait_read(pos, timeout=0.05)
+            if not chunk.size:
+                continue
+            for kind, frame in endpointer.update(vad.process(chunk)):
+                if kind != "start":
+                    continue
+                speech_start = base + frame * vad.frame_len
+                if self._is_echo(speech_start, pos):
+                    metrics.incr("barge_in_echo_ignored")
+                    base += endpointer.frame_index * vad.frame_len
+                    endpointer.reset()
+                    break
+                self.played_until = self.engine.position
+                self.engine.stop()
+                self.interrupted_at = speech_start
+                # Retard de détection: audio capturé entre le début de parole et la coupure
+                metrics.observe("barge_in_detect_ms", (pos - self.interrupted_at) * 1000.0 / sr)
+                metrics.incr("barge_in_count")
+                print("[BARGE-IN] Interruption détectée; lecture coupée.")
+                self._triggered.set()
+                return
+
+    def _is_echo(self, speech_start: int, pos: int) -> bool:
+        """Vrai si la majorité des trames depuis le début de parole sont notre propre écho."""
+        if self.echo_gate is None:
+            return False
+        sr = self.capture.sample_rate_hz
+        start = max(speech_start - int(sr * ECHO_CONTEXT_MS / 1000), self.capture.oldest_position)
+        echo = self.echo_gate.analyze(self.capture.view(start, pos), self.capture.time_at(start), sr)
+        frame_len = max(1, int(round(sr * self.echo_gate.frame_ms / 1000.0)))
+        onset = echo[(speech_start - start) // frame_len:]
+        return onset.size > 0 and float(np.mean(onset)) >= 0.5
+
+    # --- lecture interruptible ---
+
+    def wait(self, until: int) -> bool:
+        """Attend la fin de lecture jusqu'à until; False si l'interlocuteur a interrompu."""
+        while not self.engine.reached(until):
+            if self._triggered.wait(timeout=0.02):
+                return False
+        return not self.interrupted
+
+    def play(self, samples: np.ndarray) -> bool:
+        """Joue un extrait en veille; retourne True s'il a été joué jusqu'au bout."""
+        self.arm()
+        try:
+            end = self.engine.enqueue(samples)
+            return self.wait(end)
+        finally:
+            self.disarm()
+
+
+def create_barge_in(enabled: bool, engine: OutputEngine) -> Optional[BargeIn]:
+    """BargeIn si activé (option --barge-in ou BARGE_IN=1), sinon None."""
+    if not enabled and (os.getenv("BARGE_IN", "0") or "0").strip() != "1":
+        return None
+    try:
+        return BargeIn(engine)
+    except Exception as e:
+        print(f"[BARGE-IN] Indisponible ({e}); lecture sans interruption.")
+        return None
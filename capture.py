@@ -0,0 +1,234 @@
+"""
+Service de capture persistant (un InputStream PortAudio ouvert pour toute la session).
+
+- CaptureService: écrit la capture dans un tampon circulaire NumPy préalloué (sans allocation
+  par bloc) et fournit des vues sans copie sur n'importe quelle fenêtre récente
+- FedCaptureService: même tampon alimenté par push() sans périphérique (rejeu de session, benchmarks)
+- get_capture_service(): instance partagée du processus (ou de la session active, session_scope)
+- resolve_input_device_index(name): index sounddevice d'un périphérique d'entrée par nom
+"""
+
+import os
+import threading
+import time
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+
+import session_scope
+
+
+def resolve_input_device_index(name_or_substr: str) -> "int | None":
+    """Index du périphérique d'entrée dont le nom contient name_or_substr (insensible à la casse)."""
+    try:
+        if not name_or_substr:
+            return None
+        import sounddevice as sd
+
+        name_lc = name_or_substr.lower()
+        # On privilégie les devices avec canaux d'entrée > 0
+        for idx, dev in enumerate(sd.query_devices()):
+            try:
+                if dev.get("max_input_channels", 0) <= 0:
+                    continue
+                if name_lc in str(dev.get("name", "")).lower():
+                    return idx
+            except Exception:
+                continue
+    except Exception:
+        pass
+    return None
+
+
+class CaptureService:
+    """Capture mono float32 continue dans un tampon circulaire « miroir ».
+
+    Chaque échantillon est écrit deux fois (positions i et i + capacité): toute fenêtre
+    d'au plus `capacity` échantillons est donc contiguë en mémoire et peut être rendue
+    comme une vue NumPy (ou un memoryview via .data) sans np.concatenate.
+    Les positions sont des compteurs absolus d'échantillons depuis le démarrage.
+    Une vue reste valide tant que moins de `capacity_s` secondes ont été capturées depuis.
+    """
+
+    def __init__(
+        self,
+        sample_rate_hz: int = 16000,
+        capacity_s: float = 60.0,
+        blocksize: int = 320,
+        device: Optional[str] = None,
+    ):
+        self.device = device or None
+        self.sample_rate_hz = int(sample_rate_hz)
+        self.blocksize = int(blocksize)
+        self.capacity = max(self.blocksize, int(capacity_s * self.sample_rate_hz))
+        self._ring = np.zeros(2 * self.capacity, dtype=np.float32)
+        self._write = 0
+        # Ancre temporelle (position absolue, instant monotonic de sa capture)
+        self._anchor = (0, time.monotonic())
+        self._cond = threading.Condition()
+        self._stream = None
+        self._taps: List[Callable[[np.ndarray, float], None]] = []
+
+    # --- flux ---
+
+    def start(self) -> None:
+        """Ouvre le flux d'entrée (device, SD_INPUT_DEVICE, PULSE_SOURCE, PULSE_SOURCE_NAME) s'il ne l'est pas.
+
+        device est aussi passé en PULSE_SOURCE le temps de l'ouverture (source PulseAudio de la session).
+        """
+        if self._stream is not None and self._stream.active:
+            return
+        import sounddevice as sd
+
+        device_name = (
+            self.device
+            or os.getenv("SD_INPUT_DEVICE")
+            or os.getenv("PULSE_SOURCE")
+            or os.getenv("PULSE_SOURCE_NAME")
+            or ""
+        )
+        with session_scope.pulse_env("PULSE_SOURCE", self.device):
+            stream = sd.InputStream(
+                samplerate=self.sample_rate_hz,
+                channels=1,
+                dtype="float32",
+                blocksize=self.blocksize,
+                callback=self._callback,
+                device=resolve_input_device_index(device_name),
+            )
+            stream.start()
+        self._stream = stream
+
+    def close(self) -> None:
+        stream, self._stream = self._stream, None
+        if stream is None:
+            return
+        try:
+            stream.close()
+        except Exception:
+            pass
+
+    def _callback(self, indata, frames, time_info, status) -> None:
+        # Âge du bloc à l'arrivée (horloge ADC du flux), pour dater la capture
+        try:
+            age = float(time_info.currentTime - time_info.inputBufferAdcTime)
+        except Exception:
+            age = 0.0
+        block = indata[:, 0] if indata.ndim == 2 else indata
+        end_time = time.monotonic() - age + block.shape[0] / float(self.sample_rate_hz) if 0.0 < age < 1.0 else None
+        self.push(block, end_time)
+
+    def add_tap(self, tap: Callable[[np.ndarray, float], None]) -> None:
+        """Appelle tap(bloc, instant de fin) pour chaque bloc écrit (enregistrement de session)."""
+        self._taps.append(tap)
+
+    # --- tampon circulaire ---
+
+    def push(self, block: np.ndarray, end_time: Optional[float] = None) -> None:
+        """Écrit un bloc (copie dans le tampon préalloué, sans allocation).
+
+        end_time: instant (time.monotonic) de capture de la fin du bloc (défaut: maintenant).
+        """
+        k = int(block.shape[0])
+        if k <= 0:
+            return
+        cap = self.capacity
+        if k > cap:
+            block = block[-cap:]
+            k = cap
+        with self._cond:
+            p = self._write % cap
+            n1 = min(k, cap - p)
+            self._ring[p:p + n1] = block[:n1]
+            self._ring[p + cap:p + cap + n1] = block[:n1]
+            if n1 < k:
+                n2 = k - n1
+                self._ring[:n2] = block[n1:]
+                self._ring[cap:cap + n2] = block[n1:]
+            self._write += k
+            stamp = time.monotonic() if end_time is None else end_time
+            self._anchor = (self._write, stamp)
+            self._cond.notify_all()
+        for tap in self._taps:
+            tap(block, stamp)
+
+    @property
+    def position(self) -> int:
+        """Nombre total d'échantillons capturés (position d'écriture absolue)."""
+        with self._cond:
+            return self._write
+
+    @property
+    def oldest_position(self) -> int:
+        """Plus ancienne position encore disponible dans le tampon."""
+        with self._cond:
+            return max(0, self._write - self.capacity)
+
+    def time_at(self, position: int) -> float:
+        """Instant (time.monotonic) de capture de l'échantillon à la position absolue donnée."""
+        with self._cond:
+            anchor_pos, anchor_t = self._anchor
+        return anchor_t - (anchor_pos - position) / float(self.sample_rate_hz)
+
+    def view(self, start: int, end: int) -> np.ndarray:
+        """Vue sans copie sur les échantillons [start, end) (bornés à la fenêtre disponible)."""
+        with self._cond:
+            end = min(end, self._write)
+            start = max(start, self._write - self.capacity, 0)
+        if end <= start:
+            return self._ring[:0]
+        offset = start % self.capacity
+        return self._ring[offset:offset + (end - start)]
+
+    def wait_read(self, pos: int, timeout: Optional[float] = 1.0) -> Tuple[np.ndarray, int]:
+        """Attend de nouveaux échantillons après pos; retourne (vue [pos, écriture), nouvelle position).
+
+        Si le lecteur a pris plus de `capacity` de retard, les échantillons écrasés sont sautés.
+        """
+        with self._cond:
+            if self._write <= pos:
+                self._cond.wait(timeout=timeout)
+            end = self._write
+            if end - pos > self.capacity:
+                print(f"[CAPTURE] Lecteur en retard: {end - pos - self.capacity} échantillons perdus.")
+                pos = end - self.capacity
+        return self.view(pos, end), end
+
+
+class FedCaptureService(CaptureService):
+    """Capture sans périphérique: les blocs sont fournis par push() (rejeu de session, benchmarks)."""
+
+    def start(self) -> None:
+        pass
+
+
+_service: Optional[CaptureService] = None
+_service_lock = threading.Lock()
+
+
+def _default_sample_rate() -> int:
+    try:
+        return int(os.getenv("INPUT_SAMPLE_RATE_HZ", "16000") or 16000)
+    except Exception:
+        return 16000
+
+
+def get_capture_service(sample_rate_hz: Optional[int] = None) -> CaptureService:
+    """Retourne le service de capture partagé (ouvert au premier appel, INPUT_SAMPLE_RATE_HZ).
+
+    Dans une portée de session, le service est celui de la session (source scope.source).
+    """
+    global _service
+    scope = session_scope.current()
+    if scope is not None:
+        service = scope.get(
+            "capture",
+            lambda: CaptureService(sample_rate_hz=sample_rate_hz or _default_sample_rate(), device=scope.source),
+        )
+        service.start()
+        return service
+    with _service_lock:
+        if _service is None:
+            _service = CaptureService(sample_rate_hz=sample_rate_hz or _default_sample_rate())
+        _service.start()
+        return _service
@@ -0,0 +1,131 @@
+"""
+Cache des décisions LLM de talk_segments (mémoïsation de decide_next_action).
+
+Clé: texte normalisé du dernier tour + drapeaux mémoire + record_ids autorisés + empreinte
+des enregistrements du prompt. Éviction LRU en mémoire (DECISION_CACHE_SIZE, def: 256) et
+persistance optionnelle SQLite entre redémarrages (DECISION_CACHE_PATH).
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import metrics
+
+MEMORY_FLAGS = ("greeted", "presentation_received", "email_captured", "invite_sent")
+
+
+def make_key(
+    normalized_text: str,
+    memory: Dict[str, Any],
+    allowed_record_ids: List[str],
+    records_for_prompt: Optional[List[Dict[str, str]]] = None,
+) -> str:
+    records = [(r.get("id"), r.get("intent", "")) for r in (records_for_prompt or [])]
+    payload = {
+        "text": normalized_text,
+        "flags": [bool(memory.get(flag)) for flag in MEMORY_FLAGS],
+        "allowed": list(allowed_record_ids),
+        "records": hashlib.sha1(json.dumps(records, ensure_ascii=False).encode("utf-8")).hexdigest()[:12],
+    }
+    return json.dumps(payload, ensure_ascii=False, sort_keys=True)
+
+
+class DecisionCache:
+    """LRU borné + stockage SQLite optionnel (écriture immédiate, rechargement au démarrage)."""
+
+    def __init__(self, max_entries: int = 256, path: Optional[str] = None):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self.hits = 0
+        self.misses = 0
+        self._llm_ms_total = 0.0
+        self._llm_calls = 0
+        if path:
+            self._open_db(path)
+
+    def _open_db(self, path: str) -> None:
+        try:
+            db = sqlite3.connect(path, check_same_thread=False)
+            db.execute("CREATE TABLE IF NOT EXISTS decisions (key TEXT PRIMARY KEY, value TEXT, updated REAL)")
+            rows = db.execute(
+                "SELECT key, value FROM decisions ORDER BY updated DESC LIMIT ?", (self.max_entries,)
+            ).fetchall()
+            for key, value in reversed(rows):
+                self._entries[key] = json.loads(value)
+            self._db = db
+            print(f"[CACHE] {len(rows)} décisions rechargées depuis {path}.")
+        except Exception as e:
+            print(f"[CACHE] Stockage disque indisponible ({e}); cache mémoire seul.")
+            self._db = None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                metrics.incr("decision_cache_misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            metrics.incr("decision_cache_hits")
+            metrics.incr("decision_cache_saved_ms", self.mean_llm_ms)
+            return json.loads(json.dumps(value))
+
+    def put(self, key: str, decision: Dict[str, Any], llm_ms: Optional[float] = None) -> None:
+        with self._lock:
+            if llm_ms is not None:
+                self._llm_ms_total += llm_ms
+                self._llm_calls += 1
+            self._entries[key] = decision
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO decisions (key, value, updated) VALUES (?, ?, ?)",
+                        (key, json.dumps(decision, ensure_ascii=False), time.time()),
+                    )
+                    self._db.execute(
+                        "DELETE FROM decisions WHERE key NOT IN "
+                        "(SELECT key FROM decisions ORDER BY updated DESC LIMIT ?)",
+                        (self.max_entries,),
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"[CACHE] Écriture disque échouée: {e}")
+
+    @property
+    def mean_llm_ms(self) -> float:
+        """Latence LLM moyenne observée (estimation du temps gagné par hit)."""
+        return self._llm_ms_total / self._llm_calls if self._llm_calls else 0.0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats_line(self) -> str:
+        return (
+            f"hits={self.hits} misses={self.misses} taux={self.hit_rate:.0%} "
+            f"gain≈{self.hits * self.mean_llm_ms:.0f} ms"
+        )
+
+
+def create_decision_cache() -> Optional[DecisionCache]:
+    """Cache selon l'environnement: DECISION_CACHE=0 le désactive; DECISION_CACHE_PATH le persiste."""
+    if (os.getenv("DECISION_CACHE", "1") or "1").strip() == "0":
+        return None
+    try:
+        size = int(os.getenv("DECISION_CACHE_SIZE", "256"))
+    except Exception:
+        size = 256
+    return DecisionCache(max_entries=size, path=os.getenv("DECISION_CACHE_PATH") or None)
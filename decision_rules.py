@@ -0,0 +1,58 @@
+"""
+Décisions locales (sans appel réseau) pour les tours dont l'issue est imposée par l'état.
+
+Table de règles ordonnée évaluée avant decide_next_action: la première règle applicable
+produit la décision; si aucune ne s'applique, le tour est ambigu et part au LLM.
+Les heuristiques de transcription (email, présentation) sont appliquées à la mémoire
+par talk_segments avant l'évaluation.
+"""
+
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Predicate = Callable[[str, Dict[str, Any], List[str]], bool]
+Builder = Callable[[str, Dict[str, Any], List[str]], Dict[str, Any]]
+
+
+def _decision(action: str, record_id: Optional[str] = None, email: Optional[str] = None) -> Dict[str, Any]:
+    return {"action": action, "record_id": record_id, "variables": {"email": email} if email else {}, "reason": ""}
+
+
+# (nom, condition(texte, mémoire, autorisés), décision(texte, mémoire, autorisés))
+RULES: List[Tuple[str, Predicate, Builder]] = [
+    # Email déjà capturé: la seule action sensée est l'invitation
+    (
+        "email_captured",
+        lambda text, mem, allowed: bool(mem.get("email_captured") and mem.get("email") and not mem.get("invite_sent")),
+        lambda text, mem, allowed: _decision("do_tool", email=mem.get("email")),
+    ),
+    # Le gating n'autorise qu'un seul enregistrement: le LLM serait de toute façon corrigé
+    (
+        "single_allowed",
+        lambda text, mem, allowed: len(allowed) == 1,
+        lambda text, mem, allowed: _decision("play_record", record_id=allowed[0]),
+    ),
+    # Rien d'autorisé et pas d'email: le prompt impose ask_clarification
+    (
+        "nothing_allowed",
+        lambda text, mem, allowed: not allowed and not mem.get("email_captured"),
+        lambda text, mem, allowed: _decision("ask_clarification"),
+    ),
+]
+
+
+def decide_locally(
+    last_user_text: str,
+    memory: Dict[str, Any],
+    allowed_record_ids: List[str],
+) -> Optional[Dict[str, Any]]:
+    """Retourne la décision imposée par la première règle applicable, ou None (tour ambigu)."""
+    allowed = list(allowed_record_ids)
+    for name, applies, build in RULES:
+        try:
+            if applies(last_user_text or "", memory, allowed):
+                decision = build(last_user_text or "", memory, allowed)
+                decision["reason"] = f"rule:{name}"
+                return decision
+        except Exception as e:
+            print(f"[RULES] Règle '{name}' ignorée: {e}")
+    return None
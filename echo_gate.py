@@ -0,0 +1,175 @@
+"""
+Suppression de l'auto-écho: ignorer notre propre voix quand Meet la renvoie sur meet_output.monitor.
+
+- PlaybackReference: référence publiée par le moteur de sortie (audio_output) pour tout ce
+  qu'il joue (segments, TTS, bips): énergie de chaque bloc du callback et instant où il est
+  entendu (horloge time.monotonic)
+- EchoGate: compare l'enveloppe d'énergie capturée à celle de la référence, décalée du
+  retard d'écho estimé (corrélation sur une grille de retards, vectorisée); les trames
+  expliquées par la lecture sont marquées écho et retirées avant transcription
+- get_echo_gate(): porte du processus sur la référence du moteur partagé (ECHO_GATE=0 pour désactiver),
+  une par session dans une portée session_scope
+"""
+
+import os
+import threading
+from typing import Optional
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import metrics
+import session_scope
+
+SILENCE_DB = -120.0
+# En dessous, la référence est considérée muette (pas d'écho possible)
+REF_ACTIVE_DB = -50.0
+# Fenêtre de l'enveloppe de référence autour de chaque trame: queue de réverbération (après)
+# et gigue d'horloge (avant), en trames
+TAIL_FRAMES = 8
+LEAD_FRAMES = 2
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+class PlaybackReference:
+    """Enveloppe d'énergie horodatée de la sortie audio (un point par bloc de callback)."""
+
+    def __init__(self, capacity: int = 6000):
+        self.capacity = int(capacity)
+        self._times = np.zeros(self.capacity, dtype=np.float64)
+        self._db = np.full(self.capacity, SILENCE_DB, dtype=np.float32)
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def publish(self, block: np.ndarray, t_start: float, sample_rate_hz: int) -> None:
+        """Enregistre un bloc joué; t_start = instant (monotonic) de sa sortie effective."""
+        n = int(block.shape[0])
+        if n <= 0:
+            return
+        db = 10.0 * np.log10(float(np.dot(block, block)) / n + 1e-12)
+        t_center = t_start + 0.5 * n / float(sample_rate_hz)
+        with self._lock:
+            i = self._count % self.capacity
+            self._times[i] = t_center
+            self._db[i] = max(db, SILENCE_DB)
+            self._count += 1
+
+    def envelope(self, times: np.ndarray) -> np.ndarray:
+        """Énergie (dB) de la sortie aux instants donnés (silence hors de la fenêtre connue)."""
+        with self._lock:
+            count = min(self._count, self.capacity)
+            if count == 0:
+                return np.full(np.shape(times), SILENCE_DB, dtype=np.float32)
+            start = self._count % self.capacity if self._count > self.capacity else 0
+            order = (np.arange(count) + start) % self.capacity
+            t = self._times[order]
+            db = self._db[order]
+        out = np.interp(times, t, db, left=SILENCE_DB, right=SILENCE_DB)
+        return out.astype(np.float32)
+
+
+class EchoGate:
+    """Marque les trames capturées dominées par notre propre lecture.
+
+    - ECHO_MAX_LAG_MS (def: 600): retard d'écho maximal cherché (pas de 10 ms)
+    - ECHO_MIN_CORR (def: 0.5): corrélation d'enveloppe minimale pour conclure à un écho
+    - ECHO_MARGIN_DB (def: 6): une trame plus forte que l'écho prédit + marge est gardée (double parole)
+    - ECHO_MIN_SPEECH_MS (def: 250): parole restante minimale pour transcrire
+    """
+
+    def __init__(
+        self,
+        reference: PlaybackReference,
+        frame_ms: float = 20.0,
+        max_lag_ms: Optional[float] = None,
+        min_corr: Optional[float] = None,
+        margin_db: Optional[float] = None,
+        min_speech_ms: Optional[float] = None,
+    ):
+        self.reference = reference
+        self.frame_ms = float(frame_ms)
+        self.max_lag_ms = _env_float("ECHO_MAX_LAG_MS", 600.0) if max_lag_ms is None else float(max_lag_ms)
+        self.min_corr = _env_float("ECHO_MIN_CORR", 0.5) if min_corr is None else float(min_corr)
+        self.margin_db = _env_float("ECHO_MARGIN_DB", 6.0) if margin_db is None else float(margin_db)
+        self.min_speech_ms = _env_float("ECHO_MIN_SPEECH_MS", 250.0) if min_speech_ms is None else float(min_speech_ms)
+        self._lags = np.arange(0.0, self.max_lag_ms + 1e-6, 10.0) / 1000.0
+
+    def analyze(self, samples: np.ndarray, t0: float, sample_rate_hz: int) -> np.ndarray:
+        """Masque écho (bool) par trame de frame_ms; t0 = instant de capture du premier échantillon."""
+        frame_len = max(1, int(round(sample_rate_hz * self.frame_ms / 1000.0)))
+        n = int(samples.shape[0]) // frame_len
+        if n < 3:
+            return np.zeros((n,), dtype=bool)
+        frames = np.asarray(samples[:n * frame_len], dtype=np.float32).reshape(n, frame_len)
+        c_db = 10.0 * np.log10(np.einsum("ij,ij->i", frames, frames) / frame_len + 1e-12)
+        centers = t0 + (np.arange(n) + 0.5) * (frame_len / float(sample_rate_hz))
+        # Enveloppe de référence pour chaque retard candidat: (retards, trames)
+        ref = self.reference.envelope(centers[None, :] - self._lags[:, None])
+        active = ref > REF_ACTIVE_DB
+        if active.sum(axis=1).max() < 3:
+            return np.zeros((n,), dtype=bool)
+        rc = ref - ref.mean(axis=1, keepdims=True)
+        cc = c_db - c_db.mean()
+        corr = (rc @ cc) / (np.linalg.norm(rc, axis=1) * np.linalg.norm(cc) + 1e-9)
+        best = int(np.argmax(corr))
+        if corr[best] < self.min_corr:
+            return np.zeros((n,), dtype=bool)
+        r = ref[best]
+        act = active[best]
+        # Couplage sortie → capture (dB), estimé sur les trames où la référence joue
+        gain = float(np.median(c_db[act] - r[act]))
+        # Écho attendu: maximum de la référence sur [i - TAIL_FRAMES, i + LEAD_FRAMES]
+        padded = np.pad(r, (TAIL_FRAMES, LEAD_FRAMES), constant_values=SILENCE_DB)
+        r_env = sliding_window_view(padded, TAIL_FRAMES + LEAD_FRAMES + 1).max(axis=1)
+        return (r_env > REF_ACTIVE_DB) & (c_db <= r_env + gain + self.margin_db)
+
+    def filter(self, samples: np.ndarray, t0: float, sample_rate_hz: int) -> Optional[np.ndarray]:
+        """Retire les trames d'écho; None si la parole restante est trop courte pour être transcrite.
+
+        Retourne samples inchangé (sans copie) si aucune trame n'est marquée.
+        """
+        from vad import AdaptiveVAD
+
+        echo = self.analyze(samples, t0, sample_rate_hz)
+        if not echo.any():
+            return samples
+        vad = AdaptiveVAD(sample_rate_hz, frame_ms=self.frame_ms)
+        frame_len = vad.frame_len
+        speech = vad.process(samples)[:echo.shape[0]]
+        kept_speech_ms = float(np.count_nonzero(speech & ~echo[:speech.shape[0]])) * self.frame_ms
+        dropped_s = float(np.count_nonzero(echo)) * self.frame_ms / 1000.0
+        metrics.incr("echo_frames_dropped", float(np.count_nonzero(echo)))
+        if kept_speech_ms < self.min_speech_ms:
+            return None
+        metrics.incr("stt_seconds_avoided", dropped_s)
+        n = echo.shape[0]
+        frames = samples[:n * frame_len].reshape(n, frame_len)[~echo].reshape(-1)
+        return np.concatenate((frames, samples[n * frame_len:]))
+
+
+_gate: Optional[EchoGate] = None
+_gate_lock = threading.Lock()
+
+
+def get_echo_gate() -> Optional[EchoGate]:
+    """Porte anti-écho sur la référence du moteur de sortie partagé, ou None si ECHO_GATE=0."""
+    global _gate
+    if (os.getenv("ECHO_GATE", "1") or "1").strip() == "0":
+        return None
+    scope = session_scope.current()
+    if scope is not None:
+        from audio_output import get_output_engine
+
+        return scope.get("echo_gate", lambda: EchoGate(get_output_engine().reference))
+    with _gate_lock:
+        if _gate is None:
+            from audio_output import get_output_engine
+
+            _gate = EchoGate(get_output_engine().reference)
+        return _gate
@@ -0,0 +1,263 @@
+"""
+Appels OpenAI bornés par un budget de latence par tour, avec requête dupliquée (hedging).
+
+- budget: TURN_BUDGET_MS (def: 6000; 0 = pas de budget) compté depuis la fin de parole du tour
+  (étape speech_end de tracing; à défaut depuis le début de l'appel). Chaque tentative reçoit
+  timeout = min(timeout de l'appel, temps restant) et n'est pas relancée par le SDK.
+- hedging (HEDGE, def: 1): si la tentative n'a pas répondu après le percentile HEDGE_PERCENTILE
+  (def: 95) des latences récentes de ce type d'appel (HEDGE_DELAY_MS, def: 1500, tant que moins de
+  HEDGE_MIN_SAMPLES mesures, def: 20), une seconde requête identique part; la première réponse gagne.
+  La perdante est annulée: un flux est fermé, une requête simple est abandonnée (son résultat est
+  ignoré, sa durée reste bornée par le budget).
+- budget épuisé: BudgetExceeded; l'appelant applique son repli local (écho de agent.respond,
+  décision par défaut du gating, segment de remplissage de talk_segments).
+
+Métriques par type d'appel (stt, llm, decision): hedge_<nom>_calls, _issued (requêtes dupliquées),
+_won (la duplication a répondu la première), _cancelled, budget_<nom>_miss, hedge_<nom>_attempt_ms.
+"""
+
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Iterator, List, Optional
+
+import metrics
+import session_scope
+import tracing
+
+
+class BudgetExceeded(Exception):
+    """Le budget de latence du tour est épuisé avant la réponse."""
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def enabled() -> bool:
+    return (os.getenv("HEDGE", "1") or "1").strip() != "0"
+
+
+def budget_s() -> float:
+    """Budget du tour en secondes (0 = désactivé)."""
+    return max(0.0, _env_float("TURN_BUDGET_MS", 6000.0)) / 1000.0
+
+
+def turn_deadline(start: Optional[float] = None) -> Optional[float]:
+    """Échéance (time.monotonic) du tour en cours, ou de l'appel commencé à start hors tour."""
+    budget = budget_s()
+    if budget <= 0.0:
+        return None
+    turn = tracing.current()
+    anchor = turn.marks.get("speech_end") if turn is not None else None
+    if anchor is None:
+        anchor = time.monotonic() if start is None else start
+    return anchor + budget
+
+
+def hedge_delay_s(name: str) -> float:
+    """Délai avant la requête dupliquée: percentile des latences récentes de name."""
+    default = max(0.0, _env_float("HEDGE_DELAY_MS", 1500.0)) / 1000.0
+    if metrics.count(f"hedge_{name}_attempt_ms") < _env_float("HEDGE_MIN_SAMPLES", 20):
+        return default
+    q = min(0.999, max(0.5, _env_float("HEDGE_PERCENTILE", 95.0) / 100.0))
+    value = metrics.quantiles(f"hedge_{name}_attempt_ms", (q,)).get(q)
+    return default if value is None else value / 1000.0
+
+
+def no_retry(client):
+    """Client sans nouvelle tentative du SDK (le budget et le hedging en tiennent lieu)."""
+    with_options = getattr(client, "with_options", None)
+    return with_options(max_retries=0) if with_options is not None else client
+
+
+def missed(name: str) -> bool:
+    """Vrai si l'appel name a dépassé le budget pendant le tour en cours."""
+    turn = tracing.current()
+    return turn is not None and name in (turn.fields.get("budget_miss") or [])
+
+
+def _miss(name: str) -> BudgetExceeded:
+    metrics.incr(f"budget_{name}_miss")
+    turn = tracing.current()
+    previous = list(turn.fields.get("budget_miss") or []) if turn is not None else []
+    tracing.annotate(budget_miss=previous + [name])
+    print(f"[BUDGET] {name}: budget du tour épuisé, repli local.")
+    return BudgetExceeded(name)
+
+
+def _timeout(timeout_s: float, deadline: Optional[float]) -> float:
+    if deadline is None:
+        return timeout_s
+    return max(0.05, min(timeout_s, deadline - time.monotonic()))
+
+
+def _next_wait(hedge_at: Optional[float], deadline: Optional[float]) -> Optional[float]:
+    times = [t for t in (hedge_at, deadline) if t is not None]
+    return max(0.0, min(times) - time.monotonic()) if times else None
+
+
+def call(name: str, request: Callable[[float], Any], timeout_s: float) -> Any:
+    """Exécute request(timeout) avec budget et hedging; retourne la première réponse.
+
+    Lève BudgetExceeded si le budget s'épuise, ou l'erreur de la dernière tentative échouée.
+    """
+    start = time.monotonic()
+    deadline = turn_deadline(start)
+    if deadline is not None and deadline - start <= 0.0:
+        raise _miss(name)
+    metrics.incr(f"hedge_{name}_calls")
+    results: "queue.Queue[tuple]" = queue.Queue()
+
+    def attempt(index: int) -> None:
+        t0 = time.monotonic()
+        try:
+            results.put((index, True, request(_timeout(timeout_s, deadline)), t0))
+        except Exception as e:
+            results.put((index, False, e, t0))
+
+    def launch(index: int) -> None:
+        threading.Thread(target=session_scope.wrap(attempt), args=(index,), name=f"hedge-{name}-{index}", daemon=True).start()
+
+    launch(0)
+    pending = 1
+    hedge_at = start + hedge_delay_s(name) if enabled() else None
+    while True:
+        try:
+            index, ok, value, t0 = results.get(timeout=_next_wait(hedge_at, deadline))
+        except queue.Empty:
+            now = time.monotonic()
+            if hedge_at is not None and now >= hedge_at:
+                hedge_at = None
+                metrics.incr(f"hedge_{name}_issued")
+                launch(1)
+                pending += 1
+            elif deadline is not None and now >= deadline:
+                metrics.incr(f"hedge_{name}_cancelled", pending)
+                raise _miss(name)
+            continue
+        pending -= 1
+        if ok:
+            metrics.observe(f"hedge_{name}_attempt_ms", (time.monotonic() - t0) * 1000.0)
+            if index == 1:
+                metrics.incr(f"hedge_{name}_won")
+            if pending:
+                metrics.incr(f"hedge_{name}_cancelled", pending)
+            return value
+        if pending == 0:
+            raise value
+
+
+def stream(
+    name: str,
+    open_stream: Callable[[float], Any],
+    extract: Callable[[Any], Optional[str]],
+    timeout_s: float,
+) -> Iterator[str]:
+    """Flux de tokens avec budget et hedging sur le premier token.
+
+    open_stream(timeout) ouvre un flux d'événements, extract(événement) en tire le texte.
+    La tentative qui produit le premier token gagne; les autres flux sont fermés. Lève
+    BudgetExceeded si aucun token n'arrive avant l'échéance du tour.
+    """
+    start = time.monotonic()
+    deadline = turn_deadline(start)
+    if deadline is not None and deadline - start <= 0.0:
+        raise _miss(name)
+    metrics.incr(f"hedge_{name}_calls")
+    events: "queue.Queue[tuple]" = queue.Queue()
+    cancelled: List[threading.Event] = []
+    streams: List[Any] = []
+    _done = object()
+
+    def attempt(index: int) -> None:
+        t0 = time.monotonic()
+        try:
+            handle = open_stream(_timeout(timeout_s, deadline))
+            streams[index] = handle
+            for ev in handle:
+                if cancelled[index].is_set():
+                    break
+                text = extract(ev)
+                if text:
+                    events.put((index, True, text, t0))
+            events.put((index, True, _done, t0))
+        except Exception as e:
+            events.put((index, False, e, t0))
+        finally:
+            if cancelled[index].is_set():
+                _close(streams[index])
+
+    def launch(index: int) -> None:
+        cancelled.append(threading.Event())
+        streams.append(None)
+        threading.Thread(target=session_scope.wrap(attempt), args=(index,), name=f"hedge-{name}-{index}", daemon=True).start()
+
+    def cancel(keep: Optional[int]) -> int:
+        count = 0
+        for i, flag in enumerate(cancelled):
+            if i != keep and not flag.is_set():
+                flag.set()
+                _close(streams[i])
+                count += 1
+        return count
+
+    launch(0)
+    live = 1
+    winner: Optional[int] = None
+    hedge_at = start + hedge_delay_s(name) if enabled() else None
+    try:
+        while True:
+            wait = None if winner is not None else _next_wait(hedge_at, deadline)
+            try:
+                index, ok, value, t0 = events.get(timeout=wait)
+            except queue.Empty:
+                now = time.monotonic()
+                if hedge_at is not None and now >= hedge_at:
+                    hedge_at = None
+                    metrics.incr(f"hedge_{name}_issued")
+                    launch(len(cancelled))
+                    live += 1
+                elif deadline is not None and now >= deadline:
+                    metrics.incr(f"hedge_{name}_cancelled", cancel(None))
+                    raise _miss(name)
+                continue
+            if winner is not None and index != winner:
+                continue
+            if not ok or value is _done:
+                if winner is not None:
+                    if not ok:
+                        raise value
+                    return
+                live -= 1
+                if live == 0:
+                    if not ok:
+                        raise value
+                    return
+                continue
+            if winner is None:
+                winner = index
+                metrics.observe(f"hedge_{name}_attempt_ms", (time.monotonic() - t0) * 1000.0)
+                if index > 0:
+                    metrics.incr(f"hedge_{name}_won")
+                losers = cancel(winner)
+                if losers:
+                    metrics.incr(f"hedge_{name}_cancelled", losers)
+            yield value
+    finally:
+        # Consommateur arrêté (barge-in, erreur): plus aucun flux ne doit rester ouvert
+        cancel(None)
+
+
+def _close(handle: Any) -> None:
+    close = getattr(handle, "close", None)
+    if close is None:
+        return
+    try:
+        close()
+    except Exception:
+        pass
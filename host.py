@@ -0,0 +1,270 @@
+"""
+Hôte multi-sessions: plusieurs conversations simultanées dans un seul processus.
+
+Chaque session a sa paire PulseAudio (sink de sortie, source de capture), sa mémoire
+talk_segments, son moteur de sortie, sa capture et son tour tracé (session_scope). Sont
+partagés: le modèle XTTS (un seul create_coqui_synth, accès ordonnancé par tts_scheduler),
+le cache de synthèse, le cache PCM / bundle des segments, le cache de décisions et le client OpenAI.
+Une conversation terminée (invitation envoyée, action end) est suivie d'une nouvelle sur la même paire.
+
+Utilisation:
+  python host.py --sessions 4 [--kind segments|talk] [--barge-in]
+  python host.py --config sessions.json
+
+Session i (1..N) par défaut: sink agent_output_<i>, source meet_output_<i>.monitor
+(HOST_SINK_PATTERN / HOST_SOURCE_PATTERN, {i} remplacé par le numéro). Fichier de configuration:
+  [{"name": "appel-1", "kind": "segments", "sink": "agent_output_1", "source": "meet_output_1.monitor"}, ...]
+
+Non pris en charge en mode hôte: --speculate, le runtime asyncio, l'enregistrement et le rejeu
+de session (processus à session unique). Les sessions tracées portent le champ session.
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import agent
+import metrics
+import session_scope
+import talk
+import talk_segments
+from audio_output import get_output_engine
+from barge_in import create_barge_in
+from decision_cache import create_decision_cache
+from openai_client import warm_up
+from session_scope import SessionScope
+from tts_cache import TtsCache, create_cached_synth, prewarm_phrases
+from tts_scheduler import FairScheduler, scheduled_stream_synth, scheduled_synth
+
+KINDS = ("segments", "talk")
+RESTART_DELAY_S = 1.0
+
+
+@dataclass
+class SessionSpec:
+    name: str
+    kind: str = "segments"
+    sink: Optional[str] = None
+    source: Optional[str] = None
+
+
+def default_sessions(count: int, kind: str) -> List[SessionSpec]:
+    """count sessions numérotées à partir de 1 sur les paires agent_output_<i> / meet_output_<i>.monitor."""
+    sink_pattern = os.getenv("HOST_SINK_PATTERN") or "agent_output_{i}"
+    source_pattern = os.getenv("HOST_SOURCE_PATTERN") or "meet_output_{i}.monitor"
+    return [
+        SessionSpec(f"s{i}", kind, sink_pattern.format(i=i), source_pattern.format(i=i))
+        for i in range(1, max(0, count) + 1)
+    ]
+
+
+def load_sessions(path: Path, default_kind: str) -> List[SessionSpec]:
+    """Sessions décrites par un fichier JSON (liste d'objets name, kind, sink, source)."""
+    entries = json.loads(path.read_text(encoding="utf-8"))
+    defaults = default_sessions(len(entries), default_kind)
+    specs = []
+    for entry, default in zip(entries, defaults):
+        kind = str(entry.get("kind") or default.kind)
+        if kind not in KINDS:
+            raise ValueError(f"type de session inconnu: {kind}")
+        specs.append(
+            SessionSpec(
+                str(entry.get("name") or default.name),
+                kind,
+                entry.get("sink") or default.sink,
+                entry.get("source") or default.source,
+            )
+        )
+    return specs
+
+
+class SharedResources:
+    """Ressources chargées une fois et partagées par toutes les sessions."""
+
+    def __init__(self, kinds: List[str], scheduler: Optional[FairScheduler] = None):
+        self.scheduler = scheduler or FairScheduler()
+        self.id_to_path: Dict[str, str] = {}
+        self.records_for_prompt: List[Dict[str, str]] = []
+        self.player = None
+        self.decision_cache = None
+        self.synth = None
+        self.stream_synth = None
+        if "segments" in kinds:
+            self._load_segments()
+        if "talk" in kinds:
+            self._load_tts()
+
+    def _load_segments(self) -> None:
+        segments_dir = Path(__file__).resolve().parent / "segments"
+        manifest = talk_segments.load_manifest(segments_dir / "manifest.json")
+        self.id_to_path = manifest["id_to_path"]
+        self.records_for_prompt = manifest["records"]
+        self.player = talk_segments.create_segment_player(self.id_to_path)
+        if self.player is None:
+            raise RuntimeError("le mode hôte nécessite SEGMENT_PLAYER=memory")
+        self.decision_cache = create_decision_cache()
+
+    def _load_tts(self) -> None:
+        from tts_engine import create_coqui_stream_synth, create_coqui_synth
+
+        os.environ.setdefault("COQUI_TOS_AGREED", "1")
+        use_worker = (os.getenv("TTS_WORKER", "0") or "0").strip() == "1"
+        base_synth = scheduled_synth(create_coqui_synth(use_worker=use_worker), self.scheduler)
+        stream_synth = None
+        if not use_worker and (os.getenv("XTTS_STREAM", "1") or "1").strip() != "0":
+            try:
+                stream_synth = scheduled_stream_synth(create_coqui_stream_synth(), self.scheduler)
+            except Exception as e:
+                print(f"[TTS] Inférence en flux indisponible ({e}); synthèse par phrase.")
+        self.install_synth(base_synth, stream_synth)
+
+    def install_synth(self, base_synth, stream_synth=None) -> None:
+        """Synthèse partagée (déjà ordonnancée) derrière le cache TTS commun."""
+        synth = create_cached_synth(base_synth, talk._to_48k_mono, stream_synth=stream_synth)
+        if isinstance(synth, TtsCache):
+            if stream_synth is not None:
+                stream_synth = synth.stream
+            added = synth.prewarm(prewarm_phrases([agent.NOTHING_HEARD_REPLY]))
+            print(f"[TTS-CACHE] {len(synth)} phrases en cache ({added} nouvelles).")
+        self.synth = synth
+        self.stream_synth = stream_synth
+
+
+class Host:
+    """Une conversation par session, chacune dans son thread et sa portée session_scope.
+
+    on_scope(scope) est appelé dans chaque session avant la première conversation
+    (capture et sortie de substitution des benchmarks via scope.set).
+    """
+
+    def __init__(
+        self,
+        specs: List[SessionSpec],
+        shared: SharedResources,
+        barge_in: bool = False,
+        stream_llm: bool = True,
+        on_scope: Optional[Callable[[SessionScope], None]] = None,
+    ):
+        self.specs = specs
+        self.shared = shared
+        self.barge_in = barge_in
+        self.stream_llm = stream_llm
+        self.on_scope = on_scope
+        self.stop = threading.Event()
+        # Conversations terminées par session
+        self.conversations: Dict[str, int] = {spec.name: 0 for spec in specs}
+        self._threads: List[threading.Thread] = []
+
+    def start(self) -> None:
+        for spec in self.specs:
+            thread = threading.Thread(target=self._run, args=(spec,), name=f"session-{spec.name}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def wait(self) -> None:
+        """Attend l'arrêt (stop ou Ctrl+C)."""
+        while not self.stop.is_set():
+            self.stop.wait(0.5)
+
+    def _run(self, spec: SessionSpec) -> None:
+        scope = SessionScope(spec.name, sink=spec.sink, source=spec.source)
+        with session_scope.activate(scope):
+            if self.on_scope is not None:
+                self.on_scope(scope)
+            engine = get_output_engine()
+            barge_in = create_barge_in(self.barge_in, engine)
+            player = self.shared.player.for_engine(engine) if self.shared.player is not None else None
+            print(f"[HOST] Session {spec.name} ({spec.kind}): sink={spec.sink} source={spec.source}")
+            while not self.stop.is_set():
+                try:
+                    if spec.kind == "talk":
+                        self._talk(engine, barge_in)
+                    else:
+                        self._segments(player, barge_in)
+                    print(f"[HOST] Session {spec.name}: conversation terminée, nouvelle conversation.")
+                    self.conversations[spec.name] += 1
+                    metrics.incr("host_conversations")
+                except Exception as e:
+                    print(f"[HOST] Session {spec.name}: erreur ({e}); reprise.")
+                    metrics.incr("host_session_errors")
+                self.stop.wait(RESTART_DELAY_S)
+
+    def _segments(self, player, barge_in) -> None:
+        shared = self.shared
+        memory = talk_segments.new_memory()
+        talk_segments.greet(memory, shared.id_to_path, player, barge_in)
+        talk_segments.run_conversation(
+            memory, shared.id_to_path, shared.records_for_prompt, player, shared.decision_cache, barge_in
+        )
+
+    def _talk(self, engine, barge_in) -> None:
+        talk.run_conversation(
+            self.shared.synth,
+            engine,
+            barge_in,
+            stream_synth=self.shared.stream_synth,
+            stream_llm=self.stream_llm,
+        )
+
+
+def main():
+    try:
+        mp.set_start_method("spawn", force=True)
+    except RuntimeError:
+        pass
+
+    parser = argparse.ArgumentParser(description="Hôte multi-sessions (une paire PulseAudio par conversation)")
+    parser.add_argument("--sessions", type=int, default=int(os.getenv("HOST_SESSIONS", "2") or 2), help="nombre de sessions (def: HOST_SESSIONS ou 2)")
+    parser.add_argument("--kind", choices=KINDS, default="segments", help="boucle des sessions: segments (talk_segments) ou talk")
+    parser.add_argument("--config", type=str, default=None, help="fichier JSON des sessions (name, kind, sink, source)")
+    parser.add_argument("--barge-in", action="store_true", help="Interruption de la lecture dans chaque session (équivaut à BARGE_IN=1)")
+    parser.add_argument("--no-stream", action="store_true", help="Sessions talk: réponse LLM complète avant synthèse")
+    args = parser.parse_args()
+
+    try:
+        from dotenv import load_dotenv
+
+        load_dotenv(dotenv_path=Path(__file__).resolve().parent / ".env", override=False)
+    except Exception:
+        pass
+
+    if not os.getenv("OPENAI_API_KEY"):
+        print("Erreur: OPENAI_API_KEY n'est pas défini dans l'environnement.")
+        sys.exit(1)
+
+    try:
+        specs = load_sessions(Path(args.config), args.kind) if args.config else default_sessions(args.sessions, args.kind)
+    except Exception as e:
+        print(f"Erreur: configuration des sessions invalide: {e}")
+        sys.exit(1)
+    if not specs:
+        print("Erreur: aucune session configurée.")
+        sys.exit(1)
+
+    # Client OpenAI partagé, préchauffé pendant le chargement du modèle et des segments
+    warm_up()
+    metrics.start_http_server()
+    try:
+        shared = SharedResources(sorted({spec.kind for spec in specs}))
+    except Exception as e:
+        print(f"Erreur: ressources partagées indisponibles: {e}")
+        sys.exit(1)
+
+    host = Host(specs, shared, barge_in=args.barge_in, stream_llm=not args.no_stream)
+    host.start()
+    print(f"[HOST] {len(specs)} sessions actives. Ctrl+C pour quitter.")
+    try:
+        host.wait()
+    except KeyboardInterrupt:
+        host.stop.set()
+        print("Au revoir !")
+
+
+if __name__ == "__main__":
+    main()
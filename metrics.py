@@ -0,0 +1,226 @@
+"""
+Métriques du processus (thread-safe, sans dépendance).
+
+- incr(name, value): compteur cumulatif
+- observe(name, value): mesure (compte, somme, min, max, dernière valeur) et histogramme glissant
+- snapshot(): état courant de toutes les métriques
+- quantiles(name): percentiles de la fenêtre glissante (METRICS_WINDOW_S, def: 300 s)
+- render_prometheus() / start_http_server(): exposition au format texte Prometheus
+  (METRICS_PORT pour l'activer, METRICS_HOST def: 127.0.0.1)
+
+Les histogrammes sont log-linéaires à la façon HDR: SUB_BUCKETS intervalles par puissance
+de 2 (erreur relative ≤ 1/SUB_BUCKETS), stockés creux; la fenêtre glissante est découpée en
+WINDOW_SLOTS tranches recyclées au fil du temps.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+SUB_BUCKETS = 16
+WINDOW_SLOTS = 5
+DEFAULT_QUANTILES = (0.5, 0.9, 0.95, 0.99)
+
+_lock = threading.Lock()
+_counters: Dict[str, float] = {}
+_observations: Dict[str, Dict[str, float]] = {}
+_histograms: Dict[str, "RollingHistogram"] = {}
+
+
+def _window_s() -> float:
+    try:
+        return max(1.0, float(os.getenv("METRICS_WINDOW_S", "300")))
+    except Exception:
+        return 300.0
+
+
+def _bucket(value: float) -> int:
+    """Indice log-linéaire: SUB_BUCKETS intervalles égaux entre 2^e et 2^(e+1); 0 pour value <= 0."""
+    if value <= 0.0:
+        return 0
+    mantissa, exponent = math.frexp(value)  # value = mantissa * 2^exponent, 0.5 <= mantissa < 1
+    return exponent * SUB_BUCKETS + int((mantissa * 2.0 - 1.0) * SUB_BUCKETS) + 1_000_000
+
+
+def _bucket_value(index: int) -> float:
+    """Valeur représentative (milieu) d'un intervalle."""
+    if index == 0:
+        return 0.0
+    exponent, sub = divmod(index - 1_000_000, SUB_BUCKETS)
+    return math.ldexp(0.5 * (1.0 + (sub + 0.5) / SUB_BUCKETS), exponent)
+
+
+class RollingHistogram:
+    """Histogramme log-linéaire sur une fenêtre glissante (tranches recyclées)."""
+
+    def __init__(self, window_s: float):
+        self.slot_s = window_s / WINDOW_SLOTS
+        self._slots = [dict() for _ in range(WINDOW_SLOTS)]  # type: list
+        self._epochs = [-1] * WINDOW_SLOTS
+
+    def record(self, value: float, now: float) -> None:
+        epoch = int(now / self.slot_s)
+        i = epoch % WINDOW_SLOTS
+        if self._epochs[i] != epoch:
+            self._slots[i] = {}
+            self._epochs[i] = epoch
+        slot = self._slots[i]
+        b = _bucket(value)
+        slot[b] = slot.get(b, 0) + 1
+
+    def merged(self, now: float) -> Dict[int, int]:
+        epoch = int(now / self.slot_s)
+        counts: Dict[int, int] = {}
+        for i in range(WINDOW_SLOTS):
+            if epoch - self._epochs[i] < WINDOW_SLOTS:
+                for b, c in self._slots[i].items():
+                    counts[b] = counts.get(b, 0) + c
+        return counts
+
+    def quantiles(self, qs: Iterable[float], now: float) -> Dict[float, float]:
+        counts = self.merged(now)
+        total = sum(counts.values())
+        if total == 0:
+            return {}
+        result: Dict[float, float] = {}
+        ordered = sorted(counts.items())
+        for q in qs:
+            rank = max(1, int(math.ceil(q * total)))
+            seen = 0
+            for b, c in ordered:
+                seen += c
+                if seen >= rank:
+                    result[q] = _bucket_value(b)
+                    break
+        return result
+
+
+def incr(name: str, value: float = 1.0) -> None:
+    with _lock:
+        _counters[name] = _counters.get(name, 0.0) + value
+
+
+def observe(name: str, value: float) -> None:
+    value = float(value)
+    now = time.monotonic()
+    with _lock:
+        hist = _histograms.get(name)
+        if hist is None:
+            hist = _histograms[name] = RollingHistogram(_window_s())
+        hist.record(value, now)
+        obs = _observations.get(name)
+        if obs is None:
+            _observations[name] = {"count": 1, "sum": value, "min": value, "max": value, "last": value}
+            return
+        obs["count"] += 1
+        obs["sum"] += value
+        obs["min"] = min(obs["min"], value)
+        obs["max"] = max(obs["max"], value)
+        obs["last"] = value
+
+
+def counter(name: str) -> float:
+    with _lock:
+        return _counters.get(name, 0.0)
+
+
+def count(name: str) -> int:
+    """Nombre total de mesures de name (0 si aucune)."""
+    with _lock:
+        obs = _observations.get(name)
+        return int(obs["count"]) if obs is not None else 0
+
+
+def quantiles(name: str, qs: Iterable[float] = DEFAULT_QUANTILES) -> Dict[float, float]:
+    """Percentiles de name sur la fenêtre glissante ({} si aucune mesure récente)."""
+    with _lock:
+        hist = _histograms.get(name)
+        return hist.quantiles(qs, time.monotonic()) if hist is not None else {}
+
+
+def snapshot() -> Dict[str, dict]:
+    """Copie des compteurs et mesures (moyenne et percentiles glissants inclus)."""
+    now = time.monotonic()
+    with _lock:
+        observations = {}
+        for name, obs in _observations.items():
+            entry = dict(obs, mean=obs["sum"] / obs["count"] if obs["count"] else 0.0)
+            for q, v in _histograms[name].quantiles(DEFAULT_QUANTILES, now).items():
+                entry[f"p{q * 100:g}"] = v
+            observations[name] = entry
+        return {"counters": dict(_counters), "observations": observations}
+
+
+def _prom_name(name: str) -> str:
+    return "tts_agent_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def render_prometheus() -> str:
+    """Compteurs (counter) et mesures (summary: percentiles glissants, _sum/_count cumulés)."""
+    snap = snapshot()
+    lines = []
+    for name, value in sorted(snap["counters"].items()):
+        prom = _prom_name(name) + "_total"
+        lines.append(f"# TYPE {prom} counter")
+        lines.append(f"{prom} {value:g}")
+    for name, obs in sorted(snap["observations"].items()):
+        prom = _prom_name(name)
+        lines.append(f"# TYPE {prom} summary")
+        for q in DEFAULT_QUANTILES:
+            value = obs.get(f"p{q * 100:g}")
+            if value is not None:
+                lines.append(f'{prom}{{quantile="{q:g}"}} {value:.6g}')
+        lines.append(f"{prom}_sum {obs['sum']:.6g}")
+        lines.append(f"{prom}_count {obs['count']:g}")
+    return "\n".join(lines) + "\n"
+
+
+_server = None
+
+
+def start_http_server(port: Optional[int] = None, host: Optional[str] = None):
+    """Sert /metrics (format Prometheus) dans un thread; METRICS_PORT non défini ou 0 = désactivé.
+
+    Retourne le serveur (ou None). Un seul serveur par processus.
+    """
+    global _server
+    if port is None:
+        try:
+            port = int(os.getenv("METRICS_PORT", "0") or "0")
+        except Exception:
+            port = 0
+    if port <= 0:
+        return None
+    if _server is not None:
+        return _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    host = host or os.getenv("METRICS_HOST", "127.0.0.1") or "127.0.0.1"
+    try:
+        server = ThreadingHTTPServer((host, port), _Handler)
+    except OSError as e:
+        print(f"[METRICS] Endpoint indisponible sur {host}:{port} ({e}).")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    _server = server
+    print(f"[METRICS] Endpoint Prometheus: http://{host}:{port}/metrics")
+    return server
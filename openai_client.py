@@ -0,0 +1,94 @@
+"""
+Client OpenAI partagé du processus.
+
+- get_client(): client unique avec pool HTTP keep-alive réglé (une seule poignée de main TLS)
+- create_client(): construit un client avec ces réglages
+- set_client(): remplace le client du processus (enregistrement / rejeu de session)
+- stt_timeout() / llm_timeout(): timeouts explicites par appel
+- warm_up(): ouvre la connexion au démarrage via une requête peu coûteuse
+"""
+
+import os
+import threading
+import time
+from typing import Optional
+
+import httpx
+from openai import OpenAI
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def stt_timeout() -> float:
+    """Timeout (s) d'un appel de transcription (OPENAI_STT_TIMEOUT_S, def: 15)."""
+    return _env_float("OPENAI_STT_TIMEOUT_S", 15.0)
+
+
+def llm_timeout() -> float:
+    """Timeout (s) d'un appel chat.completions (OPENAI_LLM_TIMEOUT_S, def: 20)."""
+    return _env_float("OPENAI_LLM_TIMEOUT_S", 20.0)
+
+
+_client: Optional[OpenAI] = None
+_client_lock = threading.Lock()
+
+
+def create_client() -> OpenAI:
+    """Nouveau client OpenAI avec le pool httpx keep-alive réglé.
+
+    Le pool garde les connexions ouvertes entre deux tours (OPENAI_KEEPALIVE_S, def: 120;
+    la valeur par défaut de httpx, 5 s, est plus courte qu'un tour de parole).
+    """
+    http_client = httpx.Client(
+        limits=httpx.Limits(
+            max_connections=int(_env_float("OPENAI_MAX_CONNECTIONS", 8)),
+            max_keepalive_connections=int(_env_float("OPENAI_MAX_KEEPALIVE", 4)),
+            keepalive_expiry=_env_float("OPENAI_KEEPALIVE_S", 120.0),
+        ),
+        timeout=httpx.Timeout(llm_timeout(), connect=_env_float("OPENAI_CONNECT_TIMEOUT_S", 5.0)),
+    )
+    return OpenAI(
+        http_client=http_client,
+        max_retries=int(_env_float("OPENAI_MAX_RETRIES", 1)),
+    )
+
+
+def get_client() -> OpenAI:
+    """Retourne le client OpenAI du processus (créé au premier appel par create_client)."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = create_client()
+        return _client
+
+
+def set_client(client) -> None:
+    """Installe client (même interface: audio.transcriptions, chat.completions, models) pour tout le processus."""
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def warm_up(background: bool = True) -> None:
+    """Préchauffe la connexion (DNS + TLS) avec une requête légère (models.retrieve).
+
+    En arrière-plan par défaut pour ne pas retarder le démarrage; les erreurs sont ignorées.
+    """
+
+    def _run() -> None:
+        t0 = time.monotonic()
+        try:
+            get_client().models.retrieve("whisper-1", timeout=_env_float("OPENAI_CONNECT_TIMEOUT_S", 5.0))
+            print(f"[OPENAI] Connexion préchauffée en {(time.monotonic() - t0) * 1000:.0f} ms.")
+        except Exception as e:
+            print(f"[OPENAI] Préchauffage ignoré: {e}")
+
+    if background:
+        threading.Thread(target=_run, name="openai-warmup", daemon=True).start()
+    else:
+        _run()
@@ -0,0 +1,200 @@
+"""
+Rééchantillonnage polyphase à sinc fenêtré (Kaiser), en flux.
+
+- PolyphaseResampler(in_sr, out_sr): API par blocs avec état (pas de raccord entre blocs TTS),
+  tampons de sortie réutilisés
+- resample(x, in_sr, out_sr): conversion d'un tampon complet (retard du filtre compensé)
+- to_48k_mono(wav, sr): remplaçant de talk._to_48k_mono
+- stream_resample(chunks): flux de morceaux (waveform, sr) → flux de morceaux au taux de sortie
+
+Les bancs de filtres sont précalculés pour les taux rencontrés (24k→48k, 22.05k→48k,
+44.1k→48k, 48k→16k) et mis en cache pour tout autre couple.
+"""
+
+import threading
+from math import gcd
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Demi-longueur du filtre prototype, en échantillons d'entrée (par côté)
+TAPS_PER_SIDE = 16
+KAISER_BETA = 8.6
+COMMON_RATES = ((24000, 48000), (22050, 48000), (44100, 48000), (48000, 16000))
+
+_banks: Dict[Tuple[int, int], Tuple[np.ndarray, int, int, int]] = {}
+_banks_lock = threading.Lock()
+
+
+def _design_bank(up: int, down: int) -> Tuple[np.ndarray, int]:
+    """Banc polyphase (up, taps) d'un passe-bas à sinc fenêtré: bank[p, k] = h[p + k*up].
+
+    Le centre du prototype est un multiple de down: le retard de groupe tombe sur un
+    nombre entier d'échantillons de sortie (retourné avec le banc).
+    """
+    half = TAPS_PER_SIDE * max(up, down)
+    center = -(-half // down) * down
+    length = 2 * center + 1
+    taps = -(-length // up)
+    cutoff = 0.5 / max(up, down) * 0.95  # fréquence de coupure normalisée au taux suréchantillonné
+    n = np.arange(length, dtype=np.float64) - center
+    h = 2.0 * cutoff * np.sinc(2.0 * cutoff * n) * np.kaiser(length, KAISER_BETA)
+    h *= up / h.sum()  # gain unitaire en continu après insertion de zéros
+    h = np.pad(h, (0, taps * up - length))
+    return h.reshape(taps, up).T.astype(np.float32).copy(), center // down
+
+
+def get_bank(in_sr: int, out_sr: int) -> Tuple[np.ndarray, int, int, int]:
+    """(banc, up, down, retard en échantillons de sortie) pour le couple de taux (calculé une fois)."""
+    g = gcd(int(in_sr), int(out_sr))
+    up, down = int(out_sr) // g, int(in_sr) // g
+    with _banks_lock:
+        entry = _banks.get((up, down))
+        if entry is None:
+            bank, delay = _design_bank(up, down)
+            entry = (bank, up, down, delay)
+            _banks[(up, down)] = entry
+        return entry
+
+
+def precompute_common_banks() -> None:
+    for in_sr, out_sr in COMMON_RATES:
+        get_bank(in_sr, out_sr)
+
+
+class PolyphaseResampler:
+    """Rééchantillonneur polyphase avec état, bloc par bloc.
+
+    La sortie n vaut sum_k bank[p, k] * x[b - k] avec b = (n*down) // up et p = (n*down) % up.
+    Les sorties de même phase sont espacées de `up` et leurs bases de `down`: chaque phase
+    est un produit matrice-vecteur sur une vue glissante (sans copie) de l'entrée.
+    L'historique de taps-1 échantillons est conservé entre blocs. Le tableau renvoyé par
+    process() est une vue sur un tampon interne réutilisé: il doit être consommé
+    (copié / mis en file) avant l'appel suivant.
+    """
+
+    def __init__(self, in_sr: int, out_sr: int):
+        self.in_sr = int(in_sr)
+        self.out_sr = int(out_sr)
+        # delay: retard de groupe du filtre, en échantillons de sortie (entier)
+        self.bank, self.up, self.down, self.delay = get_bank(self.in_sr, self.out_sr)
+        self.taps = self.bank.shape[1]
+        self._rev_bank = self.bank[:, ::-1].copy()
+        self._out = np.zeros((0,), dtype=np.float32)
+        self._xbuf = np.zeros((0,), dtype=np.float32)
+        self.reset()
+
+    def reset(self) -> None:
+        self._history = np.zeros((self.taps - 1,), dtype=np.float32)
+        # Prochaine sortie: indice de base relatif au bloc courant et phase
+        self._base = 0
+        self._phase = 0
+
+    @staticmethod
+    def _grow(buf: np.ndarray, size: int) -> np.ndarray:
+        if buf.shape[0] >= size:
+            return buf
+        return np.zeros((max(size, int(buf.shape[0] * 1.5)),), dtype=np.float32)
+
+    def process(self, chunk: np.ndarray) -> np.ndarray:
+        """Rééchantillonne un bloc; retourne les échantillons de sortie disponibles."""
+        chunk = np.asarray(chunk, dtype=np.float32).reshape(-1)
+        n_in = chunk.shape[0]
+        if n_in == 0:
+            return self._out[:0]
+        hist = self.taps - 1
+        self._xbuf = self._grow(self._xbuf, hist + n_in)
+        xb = self._xbuf[:hist + n_in]
+        xb[:hist] = self._history
+        xb[hist:] = chunk
+
+        # Nombre de sorties dont l'échantillon de base est disponible dans ce bloc
+        last = (n_in - 1 - self._base) * self.up + (self.up - 1) - self._phase
+        n_out = 0 if last < 0 else last // self.down + 1
+        if n_out > 0:
+            self._out = self._grow(self._out, n_out)
+            out = self._out[:n_out]
+            # ligne r = xb[r:r+taps] = x[r-hist .. r]: la sortie de base b utilise la ligne b
+            windows = sliding_window_view(xb, self.taps)
+            for n0 in range(min(self.up, n_out)):
+                pos = self._phase + n0 * self.down
+                b = self._base + pos // self.up
+                count = (n_out - 1 - n0) // self.up + 1
+                rows = windows[b:b + (count - 1) * self.down + 1:self.down]
+                out[n0::self.up] = rows @ self._rev_bank[pos % self.up]
+            end = self._phase + n_out * self.down
+            self._base += end // self.up
+            self._phase = end % self.up
+        self._base -= n_in
+        if hist:
+            self._history = xb[-hist:].copy()
+        return self._out[:n_out]
+
+    def flush(self) -> np.ndarray:
+        """Vide le filtre (queue du signal) avec des zéros."""
+        return self.process(np.zeros((self.taps,), dtype=np.float32))
+
+
+def resample(x: np.ndarray, in_sr: int, out_sr: int) -> np.ndarray:
+    """Rééchantillonne un tampon complet, retard du filtre compensé (longueur = durée × out_sr)."""
+    x = np.asarray(x, dtype=np.float32).reshape(-1)
+    if in_sr == out_sr or x.size == 0:
+        return x
+    rs = PolyphaseResampler(in_sr, out_sr)
+    target = int(round(x.shape[0] * out_sr / in_sr))
+    body = rs.process(x).copy()
+    tail = rs.flush()
+    y = np.concatenate((body, tail))
+    out = y[rs.delay:rs.delay + target]
+    if out.shape[0] < target:
+        out = np.pad(out, (0, target - out.shape[0]))
+    return out
+
+
+def to_48k_mono(wav: np.ndarray, sr: int) -> np.ndarray:
+    """Convertit en mono float32 et rééchantillonne à 48 kHz (polyphase)."""
+    if wav.ndim > 1:
+        wav = np.mean(wav, axis=-1)
+    wav = wav.astype("float32", copy=False)
+    if sr == 48000 or sr <= 0 or wav.size == 0:
+        return wav
+    return resample(wav, int(sr), 48000)
+
+
+def make_stream_resampler(in_sr: int, out_sr: int = 48000) -> Optional[PolyphaseResampler]:
+    """Rééchantillonneur en flux, ou None si les taux sont identiques."""
+    return None if int(in_sr) == int(out_sr) else PolyphaseResampler(in_sr, out_sr)
+
+
+def stream_resample(chunks: Iterable[Tuple[np.ndarray, int]], out_sr: int = 48000) -> Iterator[np.ndarray]:
+    """Rééchantillonne un flux de morceaux mono (p.ex. synthèse XTTS en flux) sans raccord entre eux.
+
+    Un seul PolyphaseResampler avec état pour tout le flux; le retard du filtre est retiré
+    en tête et la queue vidée à la fin. Chaque morceau renvoyé est une copie.
+    """
+    rs: Optional[PolyphaseResampler] = None
+    skip = 0
+    for wav, sr in chunks:
+        wav = np.asarray(wav, dtype=np.float32).reshape(-1)
+        if rs is None:
+            rs = make_stream_resampler(sr, out_sr)
+            skip = rs.delay if rs is not None else 0
+        if rs is None:
+            if wav.size:
+                yield wav
+            continue
+        y = rs.process(wav)
+        if skip:
+            drop = min(skip, y.shape[0])
+            y = y[drop:]
+            skip -= drop
+        if y.size:
+            yield y.copy()
+    if rs is not None:
+        tail = rs.flush()[skip:]
+        if tail.size:
+            yield tail.copy()
+
+
+precompute_common_banks()
@@ -0,0 +1,473 @@
+#!/usr/bin/env python3
+"""
+Benchmark de bout en bout hors ligne: talk_segments.py et talk.py sans micro, sans Meet, sans API.
+
+- serveur OpenAI de substitution (scripts/fake_openai.py): transcriptions et chat.completions,
+  latences log-normales configurables, réponses prédéfinies
+- source audio fichier: les WAV du scénario (ou une parole synthétique) sont poussés en temps
+  réel dans le service de capture, la détection de fin de tour de record_until_silence est inchangée
+- sortie nulle: le moteur de sortie est vidé par une horloge au lieu de PortAudio, les débuts
+  et fins de lecture (échantillons non nuls) sont horodatés
+- exécution: chaque boucle tourne dans son propre processus (CPU et pic RSS propres) sur N
+  conversations scriptées
+
+Latence d'un tour = fin de parole de l'interlocuteur → premier échantillon joué. Rapport JSON
+(p50/p95/p99, intervalles de tracing.py, CPU, pic RSS) comparable d'un commit à l'autre.
+
+Scénario (--script fichier.json), un tour = {"text": transcription renvoyée, "wav": chemin optionnel}:
+  {"talk_segments": [[{"text": "Oui, je vous entends."}, ...], ...], "talk": [[...], ...]}
+
+Utilisation:
+  python scripts/bench_e2e.py [--flows talk_segments,talk] [--conversations 3] [--tts fake|xtts]
+                              [--stt-latency 450,900] [--llm-latency 350,800] [--out bench.json] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+CAPTURE_RATE_HZ = 16000
+BLOCK_MS = 20
+# Silence de sortie requis avant de parler (bip d'écoute compris)
+IDLE_S = 0.8
+RESPONSE_TIMEOUT_S = 60.0
+
+DEFAULT_SCRIPTS: Dict[str, List[List[Dict[str, str]]]] = {
+    "talk_segments": [[
+        {"text": "Oui, je vous entends très bien."},
+        {"text": "D'accord, je vous écoute."},
+        {"text": "Oui, allez-y."},
+        {"text": "Je m'appelle Paul Martin, je suis consultant."},
+        {"text": "Mon adresse est paul.martin@example.com"},
+    ]],
+    "talk": [[
+        {"text": "Bonjour, est-ce que vous pouvez m'aider ?"},
+        {"text": "Je voudrais prendre un rendez-vous pour demain."},
+        {"text": "Combien de temps prend la démarche ?"},
+    ]],
+}
+
+
+# --- audio ---
+
+def synth_speech(duration_s: float, sample_rate_hz: int, seed: int = 0) -> np.ndarray:
+    """Signal voisé synthétique (harmoniques d'un fondamental vibrant, modulation syllabique)."""
+    rng = np.random.default_rng(seed)
+    n = int(duration_s * sample_rate_hz)
+    t = np.arange(n) / float(sample_rate_hz)
+    f0 = 130.0 + 40.0 * rng.random() + 15.0 * np.sin(2 * np.pi * 3.0 * t)
+    phase = 2 * np.pi * np.cumsum(f0) / sample_rate_hz
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 12))
+    envelope = 0.55 + 0.45 * np.abs(np.sin(np.pi * 4.0 * t))
+    x = envelope * voiced + 0.05 * rng.standard_normal(n)
+    return (0.25 * x / (np.max(np.abs(x)) + 1e-9)).astype(np.float32)
+
+
+def load_wav(path: Path, sample_rate_hz: int) -> np.ndarray:
+    """WAV PCM 16 bits (mono ou stéréo) → float32 mono au taux demandé."""
+    from resample import resample
+
+    with wave.open(str(path), "rb") as wf:
+        sr, channels = wf.getframerate(), wf.getnchannels()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        pcm = pcm.reshape(-1, channels).mean(axis=1)
+    return resample(pcm, sr, sample_rate_hz) if sr != sample_rate_hz else pcm
+
+
+def turn_audio(turn: Dict[str, str], index: int) -> np.ndarray:
+    if turn.get("wav"):
+        return load_wav(Path(turn["wav"]), CAPTURE_RATE_HZ)
+    duration = min(4.0, max(0.9, 0.065 * len(turn.get("text", ""))))
+    return synth_speech(duration, CAPTURE_RATE_HZ, seed=index)
+
+
+class FileAudioSource:
+    """Pousse des blocs de 20 ms en temps réel dans un CaptureService: bruit de fond, puis les
+    extraits demandés par say()."""
+
+    def __init__(self, capture, noise_rms: float = 0.001):
+        self.capture = capture
+        self.noise_rms = float(noise_rms)
+        self.block = int(capture.sample_rate_hz * BLOCK_MS / 1000)
+        self._pending: Optional[np.ndarray] = None
+        self._done = threading.Event()
+        self._spoken_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._rng = np.random.default_rng(7)
+        self._thread = threading.Thread(target=self._run, name="bench-source", daemon=True)
+        self._thread.start()
+
+    def say(self, samples: np.ndarray) -> float:
+        """Joue un extrait dans la capture; retourne l'instant (monotonic) de sa fin."""
+        with self._lock:
+            self._done.clear()
+            self._pending = np.asarray(samples, dtype=np.float32)
+        self._done.wait()
+        return self._spoken_at
+
+    def _run(self) -> None:
+        period = self.block / float(self.capture.sample_rate_hz)
+        offset = 0
+        next_t = time.monotonic()
+        while not self._stop.is_set():
+            next_t += period
+            delay = next_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            block = (self.noise_rms * self._rng.standard_normal(self.block)).astype(np.float32)
+            with self._lock:
+                pending = self._pending
+                if pending is not None:
+                    part = pending[offset:offset + self.block]
+                    block[:part.shape[0]] += part
+                    offset += self.block
+            now = time.monotonic()
+            self.capture.push(block, now)
+            if pending is not None and offset >= pending.shape[0]:
+                with self._lock:
+                    self._pending = None
+                offset = 0
+                self._spoken_at = now
+                self._done.set()
+
+    def close(self) -> None:
+        self._stop.set()
+
+
+class PlaybackLog:
+    """Intervalles de sortie non silencieuse (début, fin) horodatés par la sortie nulle."""
+
+    def __init__(self):
+        self.intervals: List[List[float]] = []
+        self._cond = threading.Condition()
+
+    def update(self, active: bool, now: float) -> None:
+        with self._cond:
+            if active:
+                if not self.intervals or self.intervals[-1][1] is not None:
+                    self.intervals.append([now, None])
+                    self._cond.notify_all()
+            elif self.intervals and self.intervals[-1][1] is None:
+                self.intervals[-1][1] = now
+                self._cond.notify_all()
+
+    def first_start_after(self, t: float, timeout: float) -> Optional[float]:
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                for start, _ in self.intervals:
+                    if start > t:
+                        return start
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(min(0.1, remaining))
+
+    def last_end(self) -> Optional[float]:
+        """Fin de la dernière lecture terminée (None si aucune)."""
+        with self._cond:
+            ended = [end for _, end in self.intervals if end is not None]
+        return ended[-1] if ended else None
+
+    def wait_idle(self, idle_s: float, after: float, timeout: float) -> bool:
+        """Attend une lecture terminée après after suivie de idle_s de silence."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._cond:
+                last = self.intervals[-1] if self.intervals else None
+                ended = last is not None and last[1] is not None and last[1] > after
+            if ended and time.monotonic() - last[1] >= idle_s:
+                return True
+            time.sleep(0.05)
+        return False
+
+
+def _install_null_output(log: PlaybackLog) -> None:
+    """Remplace le moteur de sortie du processus par une sortie cadencée sans périphérique."""
+    import audio_output
+
+    audio_output._engine = audio_output.NullOutputEngine(on_block=lambda out, now: log.update(bool(np.any(out)), now))
+
+
+def _install_file_capture():
+    import capture
+
+    capture._service = capture.FedCaptureService(CAPTURE_RATE_HZ)
+    return capture._service
+
+
+def _synthetic_bundle(out_dir: Path) -> Path:
+    """Bundle de segments synthétiques (paroles de 1 à 3 s) quand ffmpeg ne peut pas décoder."""
+    from segment_bundle import manifest_records, write_bundle
+
+    records = []
+    for i, rec in enumerate(manifest_records(ROOT / "segments" / "manifest.json")):
+        pcm = synth_speech(1.0 + (i % 3), 48000, seed=100 + i)
+        records.append(({"id": rec["id"], "intent": rec["intent"]}, np.round(pcm * 32767.0).astype(np.int16)))
+    path = out_dir / "synthetic.bundle"
+    write_bundle(path, records)
+    return path
+
+
+def _prepare_segments(out_dir: Path) -> str:
+    """Source des segments: bundle compilé, décodage ffmpeg, sinon bundle synthétique (SEGMENT_BUNDLE)."""
+    from segment_player import decode_segment
+
+    first = next(iter(sorted((ROOT / "segments").glob("*.m4a"))), None)
+    if (ROOT / "segments" / "segments.bundle").exists():
+        return "bundle"
+    if first is not None and decode_segment(first) is not None:
+        return "ffmpeg"
+    os.environ["SEGMENT_BUNDLE"] = str(_synthetic_bundle(out_dir))
+    return "synthetic"
+
+
+def _fake_tts(rtf: float):
+    """Synthétiseurs de substitution pour talk.py: durée ∝ texte, calcul simulé à rtf × durée."""
+
+    def synth(text: str):
+        duration = max(0.3, 0.06 * len(text))
+        time.sleep(rtf * duration)
+        return synth_speech(duration, 24000, seed=len(text)), 24000
+
+    def stream_synth(text: str):
+        duration = max(0.3, 0.06 * len(text))
+        audio = synth_speech(duration, 24000, seed=len(text))
+        step = 12000
+        for start in range(0, audio.shape[0], step):
+            chunk = audio[start:start + step]
+            time.sleep(rtf * chunk.shape[0] / 24000.0)
+            yield chunk, 24000
+
+    return (lambda *a, **k: synth), (lambda *a, **k: stream_synth)
+
+
+# --- exécution d'une boucle (processus enfant) ---
+
+def _post_transcript(server_url: str, text: str, enqueue: bool = False) -> None:
+    import urllib.request
+
+    req = urllib.request.Request(
+        server_url.rsplit("/v1", 1)[0] + "/_bench/transcript",
+        data=json.dumps({"text": text, "enqueue": enqueue}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    urllib.request.urlopen(req, timeout=5).read()
+
+
+def _drive(conversation, source, log, server_url, finished, latencies, failures) -> None:
+    """Joue le rôle de l'interlocuteur: attend l'écoute, parle, mesure la réponse."""
+    import _thread
+
+    start = time.monotonic()
+    if not log.wait_idle(IDLE_S, start - 3600.0, RESPONSE_TIMEOUT_S):
+        failures.append("start")
+    for i, turn in enumerate(conversation):
+        if finished.is_set():
+            break
+        _post_transcript(server_url, turn.get("text", ""))
+        spoken_at = source.say(turn_audio(turn, i))
+        response = log.first_start_after(spoken_at, RESPONSE_TIMEOUT_S)
+        if response is None:
+            failures.append(f"turn{i}")
+            break
+        latencies.append((response - spoken_at) * 1000.0)
+        log.wait_idle(IDLE_S, response, RESPONSE_TIMEOUT_S)
+    if not finished.is_set():
+        # La boucle n'a pas de fin de session (talk.py) ou a décroché: Ctrl+C simulé
+        _thread.interrupt_main()
+
+
+def _run_flow(flow: str, conversations, server_url: str, tts: str, tts_rtf: float, out_dir: str, results) -> None:
+    out = Path(out_dir)
+    trace_path = out / f"{flow}.jsonl"
+    os.environ.update({
+        "OPENAI_BASE_URL": server_url,
+        "OPENAI_API_KEY": "bench",
+        "TRACE": "1",
+        "TRACE_PATH": str(trace_path),
+        "TTS_CACHE": "0",
+        "BARGE_IN": "0",
+        "INPUT_SAMPLE_RATE_HZ": str(CAPTURE_RATE_HZ),
+    })
+    os.environ.pop("METRICS_PORT", None)
+    segments = _prepare_segments(out) if flow == "talk_segments" else "n/a"
+
+    log = PlaybackLog()
+    _install_null_output(log)
+    capture = _install_file_capture()
+    source = FileAudioSource(capture)
+
+    if flow == "talk_segments":
+        import talk_segments as module
+    else:
+        import talk as module
+
+        if tts == "fake":
+            module.create_coqui_synth, module.create_coqui_stream_synth = _fake_tts(tts_rtf)
+
+    latencies: List[float] = []
+    failures: List[str] = []
+    usage0 = resource.getrusage(resource.RUSAGE_SELF)
+    wall0 = time.monotonic()
+    for conversation in conversations:
+        finished = threading.Event()
+        driver = threading.Thread(
+            target=_drive,
+            args=(conversation, source, log, server_url, finished, latencies, failures),
+            name="bench-driver",
+            daemon=True,
+        )
+        sys.argv = [f"{flow}.py"]
+        driver.start()
+        try:
+            module.main()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            finished.set()
+        driver.join(timeout=5.0)
+    wall = time.monotonic() - wall0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    source.close()
+
+    traces = []
+    if trace_path.exists():
+        traces = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    spans: Dict[str, List[float]] = {}
+    for record in traces:
+        for name, value in record.get("spans", {}).items():
+            spans.setdefault(name, []).append(value)
+    cpu_s = (usage.ru_utime - usage0.ru_utime) + (usage.ru_stime - usage0.ru_stime)
+    results.put((flow, {
+        "conversations": len(conversations),
+        "turns": len(latencies),
+        "failures": failures,
+        "turn_latency_ms": _percentiles(latencies),
+        "spans_ms": {name: _percentiles(values) for name, values in sorted(spans.items())},
+        "cpu_s": round(cpu_s, 3),
+        "cpu_ms_per_turn": round(1000.0 * cpu_s / max(1, len(latencies)), 1),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024.0, 1),
+        "wall_s": round(wall, 2),
+        "segments": segments,
+        "tts": tts if flow == "talk" else "n/a",
+    }))
+
+
+def _percentiles(values: List[float]) -> Dict[str, Any]:
+    if not values:
+        return {"n": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    return {
+        "n": int(arr.size),
+        "p50": round(float(np.percentile(arr, 50)), 1),
+        "p95": round(float(np.percentile(arr, 95)), 1),
+        "p99": round(float(np.percentile(arr, 99)), 1),
+        "mean": round(float(arr.mean()), 1),
+        "max": round(float(arr.max()), 1),
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark e2e hors ligne (faux serveur OpenAI, audio fichier, sortie nulle)")
+    parser.add_argument("--flows", type=str, default="talk_segments,talk", help="boucles à mesurer (talk_segments,talk)")
+    parser.add_argument("--conversations", type=int, default=3, help="nombre de conversations par boucle")
+    parser.add_argument("--script", type=str, default=None, help="scénario JSON (voir docstring)")
+    parser.add_argument("--tts", choices=("fake", "xtts"), default="fake", help="synthèse de talk.py")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="RTF simulé de la synthèse fake")
+    parser.add_argument("--stt-latency", type=str, default="450,900", help="médiane,p95 (ms)")
+    parser.add_argument("--llm-latency", type=str, default="350,800", help="médiane,p95 (ms) avant le premier token")
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", type=str, default=None, help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--json", action="store_true", help="affiche le rapport JSON complet")
+    args = parser.parse_args()
+
+    scripts = DEFAULT_SCRIPTS
+    if args.script:
+        scripts = json.loads(Path(args.script).read_text(encoding="utf-8"))
+    server = FakeOpenAIServer(
+        stt_latency=args.stt_latency, llm_latency=args.llm_latency, token_ms=args.token_ms, seed=args.seed
+    ).start()
+
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "conversations": args.conversations,
+            "server": server.describe(),
+            "tts_rtf": args.tts_rtf,
+            "seed": args.seed,
+        },
+        "flows": {},
+    }
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench-e2e-") as out_dir:
+        for flow in [f.strip() for f in args.flows.split(",") if f.strip()]:
+            base = scripts.get(flow) or DEFAULT_SCRIPTS.get(flow)
+            if not base:
+                print(f"[BENCH] Boucle inconnue: {flow}")
+                continue
+            conversations = [base[i % len(base)] for i in range(max(1, args.conversations))]
+            calls0 = dict(server.calls)
+            results = ctx.Queue()
+            proc = ctx.Process(
+                target=_run_flow, args=(flow, conversations, server.url, args.tts, args.tts_rtf, out_dir, results)
+            )
+            proc.start()
+            try:
+                name, result = results.get(timeout=RESPONSE_TIMEOUT_S * (1 + sum(len(c) for c in conversations)))
+            except Exception:
+                print(f"[BENCH] {flow}: pas de résultat (processus terminé: {proc.exitcode})")
+                proc.terminate()
+                continue
+            proc.join(timeout=10)
+            result["openai_calls"] = {k: server.calls[k] - calls0.get(k, 0) for k in server.calls}
+            report["flows"][name] = result
+            lat = result["turn_latency_ms"]
+            print(
+                f"[BENCH] {name}: {result['turns']} tours, latence p50={lat.get('p50')} p95={lat.get('p95')} "
+                f"p99={lat.get('p99')} ms, CPU {result['cpu_ms_per_turn']} ms/tour, pic RSS {result['peak_rss_mb']} Mo"
+            )
+    server.close()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"[BENCH] Rapport: {args.out}")
+    if args.json:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
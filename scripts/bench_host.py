@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Montée en charge de host.py hors ligne: combien de sessions simultanées pour une latence p95 donnée.
+
+Chaque palier (--levels 1,2,4,8) tourne dans son propre processus: N sessions host.Host avec
+capture fichier et sortie nulle par session (mêmes substituts que bench_e2e.py), ressources
+partagées (modèle XTTS ou synthèse fake ordonnancée par tts_scheduler, segments, client OpenAI)
+et serveur OpenAI de substitution (transcriptions en file, une par fin de parole).
+Chaque session joue --turns tours (scénario de bench_e2e, reprise au début quand la
+conversation se termine), départs décalés aléatoirement.
+
+Latence d'un tour = fin de parole → premier échantillon joué par la session. Le rapport donne
+par palier p50/p95/p99, l'attente d'accès au modèle (tts_queue_wait_ms), CPU et pic RSS;
+avec --target-p95-ms, la montée s'arrête au premier palier hors cible et le rapport indique
+le plus grand nombre de sessions tenu (max_sessions).
+
+Utilisation:
+  python scripts/bench_host.py [--kind talk|segments] [--levels 1,2,4,8] [--turns 6]
+                               [--tts fake|xtts] [--tts-rtf 0.3] [--target-p95-ms 1500] [--out host.json]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_e2e import (  # noqa: E402
+    CAPTURE_RATE_HZ,
+    DEFAULT_SCRIPTS,
+    IDLE_S,
+    RESPONSE_TIMEOUT_S,
+    FileAudioSource,
+    PlaybackLog,
+    _fake_tts,
+    _git_commit,
+    _percentiles,
+    _post_transcript,
+    _prepare_segments,
+    turn_audio,
+)
+from fake_openai import FakeOpenAIServer  # noqa: E402
+
+FLOWS = {"segments": "talk_segments", "talk": "talk"}
+STAGGER_S = 1.5
+
+
+def _drive_session(name, source, log, host, script, turns, server_url, latencies, failures) -> None:
+    """Interlocuteur d'une session: tours successifs, nouvelle conversation après la fin de la précédente."""
+    time.sleep(random.uniform(0.0, STAGGER_S))
+    if not log.wait_idle(IDLE_S, time.monotonic() - 3600.0, RESPONSE_TIMEOUT_S):
+        failures.append(f"{name}:start")
+    ended = host.conversations[name]
+    index = 0
+    for _ in range(turns):
+        turn = script[index % len(script)]
+        _post_transcript(server_url, turn.get("text", ""), enqueue=True)
+        spoken_at = source.say(turn_audio(turn, index))
+        response = log.first_start_after(spoken_at, RESPONSE_TIMEOUT_S)
+        if response is None:
+            failures.append(f"{name}:turn{index}")
+            return
+        latencies.append((response - spoken_at) * 1000.0)
+        log.wait_idle(IDLE_S, response, RESPONSE_TIMEOUT_S)
+        index += 1
+        if host.conversations[name] != ended:
+            # Conversation terminée: attendre l'accueil de la suivante (Bonjour puis bip)
+            ended = host.conversations[name]
+            index = 0
+            greeting = log.first_start_after(log.last_end() or response, RESPONSE_TIMEOUT_S)
+            if greeting is None or not log.wait_idle(IDLE_S, greeting, RESPONSE_TIMEOUT_S):
+                failures.append(f"{name}:restart")
+                return
+
+
+def _run_level(count: int, kind: str, turns: int, script, server_url: str, tts: str, tts_rtf: float, out_dir: str, results) -> None:
+    out = Path(out_dir)
+    trace_path = out / f"host-{count}.jsonl"
+    os.environ.update({
+        "OPENAI_BASE_URL": server_url,
+        "OPENAI_API_KEY": "bench",
+        "TRACE": "1",
+        "TRACE_PATH": str(trace_path),
+        "TTS_CACHE": "0",
+        "BARGE_IN": "0",
+        # Une requête STT par fin de parole: les transcriptions en file restent appariées
+        "HEDGE": "0",
+        "INPUT_SAMPLE_RATE_HZ": str(CAPTURE_RATE_HZ),
+    })
+    os.environ.pop("METRICS_PORT", None)
+    segments = _prepare_segments(out) if kind == "segments" else "n/a"
+
+    import host
+    import metrics
+    from audio_output import NullOutputEngine
+    from capture import FedCaptureService
+    from tts_scheduler import scheduled_stream_synth, scheduled_synth
+
+    sessions: Dict[str, Any] = {}
+    ready = threading.Condition()
+
+    def on_scope(scope) -> None:
+        log = PlaybackLog()
+        scope.set("output", NullOutputEngine(on_block=lambda block, now: log.update(bool(np.any(block)), now)))
+        capture = FedCaptureService(CAPTURE_RATE_HZ)
+        scope.set("capture", capture)
+        with ready:
+            sessions[scope.name] = (FileAudioSource(capture), log)
+            ready.notify_all()
+
+    if kind == "talk" and tts == "fake":
+        shared = host.SharedResources([])
+        synth, stream_synth = _fake_tts(tts_rtf)
+        shared.install_synth(
+            scheduled_synth(synth(), shared.scheduler), scheduled_stream_synth(stream_synth(), shared.scheduler)
+        )
+    else:
+        shared = host.SharedResources([kind])
+
+    specs = host.default_sessions(count, kind)
+    runner = host.Host(specs, shared, on_scope=on_scope)
+    usage0 = resource.getrusage(resource.RUSAGE_SELF)
+    wall0 = time.monotonic()
+    runner.start()
+    with ready:
+        ready.wait_for(lambda: len(sessions) == count, timeout=RESPONSE_TIMEOUT_S)
+
+    latencies: List[float] = []
+    failures: List[str] = []
+    drivers = []
+    for spec in specs:
+        source, log = sessions[spec.name]
+        driver = threading.Thread(
+            target=_drive_session,
+            args=(spec.name, source, log, runner, script, turns, server_url, latencies, failures),
+            name=f"bench-driver-{spec.name}",
+            daemon=True,
+        )
+        driver.start()
+        drivers.append(driver)
+    for driver in drivers:
+        driver.join(timeout=RESPONSE_TIMEOUT_S * (turns + 2))
+    runner.stop.set()
+    wall = time.monotonic() - wall0
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    for source, _ in sessions.values():
+        source.close()
+
+    traces = []
+    if trace_path.exists():
+        traces = [json.loads(line) for line in trace_path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    per_session: Dict[str, int] = {}
+    for record in traces:
+        per_session[record.get("session", "?")] = per_session.get(record.get("session", "?"), 0) + 1
+    wait = metrics.snapshot()["observations"].get("tts_queue_wait_ms", {})
+    cpu_s = (usage.ru_utime - usage0.ru_utime) + (usage.ru_stime - usage0.ru_stime)
+    results.put({
+        "sessions": count,
+        "turns": len(latencies),
+        "failures": failures,
+        "turn_latency_ms": _percentiles(latencies),
+        "tts_queue_wait_ms": {k: round(v, 1) for k, v in wait.items() if k in ("count", "mean", "p50", "p95", "p99")},
+        "traced_turns_per_session": per_session,
+        "conversations_completed": sum(runner.conversations.values()),
+        "cpu_s": round(cpu_s, 3),
+        "cpu_util": round(cpu_s / max(wall, 1e-6), 2),
+        "peak_rss_mb": round(usage.ru_maxrss / 1024.0, 1),
+        "wall_s": round(wall, 2),
+        "segments": segments,
+        "tts": tts if kind == "talk" else "n/a",
+    })
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Montée en charge de host.py (sessions simultanées, p95 par palier)")
+    parser.add_argument("--kind", choices=tuple(FLOWS), default="talk", help="boucle des sessions")
+    parser.add_argument("--levels", type=str, default="1,2,4,8", help="nombres de sessions testés, dans l'ordre")
+    parser.add_argument("--turns", type=int, default=6, help="tours par session et par palier")
+    parser.add_argument("--script", type=str, default=None, help="scénario JSON (format de bench_e2e.py)")
+    parser.add_argument("--tts", choices=("fake", "xtts"), default="fake", help="synthèse des sessions talk")
+    parser.add_argument("--tts-rtf", type=float, default=0.3, help="RTF simulé de la synthèse fake")
+    parser.add_argument("--stt-latency", type=str, default="450,900", help="médiane,p95 (ms)")
+    parser.add_argument("--llm-latency", type=str, default="350,800", help="médiane,p95 (ms) avant le premier token")
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--target-p95-ms", type=float, default=None, help="arrête la montée au premier palier au-delà")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--out", type=str, default=None, help="écrit le rapport JSON dans ce fichier")
+    parser.add_argument("--json", action="store_true", help="affiche le rapport JSON complet")
+    args = parser.parse_args()
+
+    scripts = DEFAULT_SCRIPTS
+    if args.script:
+        scripts = json.loads(Path(args.script).read_text(encoding="utf-8"))
+    flow = FLOWS[args.kind]
+    script = [turn for conversation in (scripts.get(flow) or DEFAULT_SCRIPTS[flow]) for turn in conversation]
+    levels = [int(v) for v in args.levels.split(",") if v.strip()]
+    random.seed(args.seed)
+    server = FakeOpenAIServer(
+        stt_latency=args.stt_latency, llm_latency=args.llm_latency, token_ms=args.token_ms, seed=args.seed
+    ).start()
+
+    report: Dict[str, Any] = {
+        "commit": _git_commit(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {
+            "kind": args.kind,
+            "turns": args.turns,
+            "cpu_count": os.cpu_count(),
+            "server": server.describe(),
+            "tts": args.tts,
+            "tts_rtf": args.tts_rtf,
+            "target_p95_ms": args.target_p95_ms,
+            "seed": args.seed,
+        },
+        "levels": [],
+        "max_sessions": None,
+    }
+    ctx = mp.get_context("spawn")
+    with tempfile.TemporaryDirectory(prefix="bench-host-") as out_dir:
+        for count in levels:
+            results = ctx.Queue()
+            proc = ctx.Process(
+                target=_run_level,
+                args=(count, args.kind, args.turns, script, server.url, args.tts, args.tts_rtf, out_dir, results),
+            )
+            proc.start()
+            try:
+                result = results.get(timeout=RESPONSE_TIMEOUT_S * (args.turns + 4))
+            except Exception:
+                print(f"[BENCH] {count} sessions: pas de résultat (processus terminé: {proc.exitcode})")
+                proc.terminate()
+                break
+            proc.join(timeout=10)
+            if proc.is_alive():
+                proc.terminate()
+            report["levels"].append(result)
+            lat = result["turn_latency_ms"]
+            print(
+                f"[BENCH] {count} sessions: {result['turns']} tours, latence p50={lat.get('p50')} p95={lat.get('p95')} "
+                f"p99={lat.get('p99')} ms, attente TTS p95={result['tts_queue_wait_ms'].get('p95')} ms, "
+                f"CPU {result['cpu_util']} cœurs, pic RSS {result['peak_rss_mb']} Mo, échecs {len(result['failures'])}"
+            )
+            within = (
+                args.target_p95_ms is None
+                or (lat.get("p95") is not None and lat["p95"] <= args.target_p95_ms and not result["failures"])
+            )
+            if not within:
+                print(f"[BENCH] Cible p95 {args.target_p95_ms} ms dépassée à {count} sessions.")
+                break
+            report["max_sessions"] = count
+    server.close()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+        print(f"[BENCH] Rapport: {args.out}")
+    if args.json:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark: rééchantillonneur polyphase (resample.py) vs ancienne interpolation linéaire
+de talk._to_48k_mono.
+
+Mesures par couple de taux:
+  - débit (secondes d'audio traitées par seconde, tampon complet et flux par blocs)
+  - pic d'allocation mémoire par appel (tracemalloc)
+  - qualité: erreur RMS vs sinus analytique (dB) et énergie d'alias/image hors bande (dB)
+
+Utilisation:
+  python scripts/bench_resample.py [--seconds 10] [--chunk 4096] [--json]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from resample import PolyphaseResampler, resample  # noqa: E402
+
+RATE_PAIRS = ((24000, 48000), (22050, 48000), (44100, 48000), (48000, 16000))
+
+
+def legacy_resample(wav: np.ndarray, sr: int, out_sr: int) -> np.ndarray:
+    """Ancienne implémentation de talk._to_48k_mono (np.linspace + np.interp), généralisée à out_sr."""
+    duration = wav.shape[0] / float(sr)
+    new_len = max(1, int(round(duration * out_sr)))
+    x_old = np.linspace(0.0, 1.0, wav.shape[0], endpoint=False)
+    x_new = np.linspace(0.0, 1.0, new_len, endpoint=False)
+    return np.interp(x_new, x_old, wav).astype("float32", copy=False)
+
+
+def _throughput(fn: Callable[[], object], audio_s: float, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return audio_s / best if best > 0 else float("inf")
+
+
+def _peak_alloc(fn: Callable[[], object]) -> int:
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def _quality(fn: Callable[[np.ndarray, int, int], np.ndarray], in_sr: int, out_sr: int) -> Dict[str, float]:
+    """Erreur vs sinus analytique (tons dans la bande utile) et énergie hors bande (alias / images)."""
+    n = in_sr
+    t = np.arange(n) / in_sr
+    band = 0.45 * min(in_sr, out_sr)
+    errors = []
+    for f in (440.0, 2000.0, 0.8 * band):
+        x = np.sin(2 * np.pi * f * t).astype(np.float32)
+        y = fn(x, in_sr, out_sr)
+        ref = np.sin(2 * np.pi * f * np.arange(y.shape[0]) / out_sr)
+        trim = out_sr // 20
+        err = y[trim:-trim] - ref[trim:-trim]
+        errors.append(10 * np.log10(np.mean(err ** 2) / 0.5 + 1e-20))
+    # Ton proche de la limite: toute énergie hors de sa raie est un alias / une image
+    f = 0.95 * band
+    x = np.sin(2 * np.pi * f * t).astype(np.float32)
+    y = fn(x, in_sr, out_sr)
+    spec = np.abs(np.fft.rfft(y * np.hanning(y.shape[0]))) ** 2
+    freqs = np.fft.rfftfreq(y.shape[0], 1.0 / out_sr)
+    signal = spec[np.abs(freqs - f) < 50.0].sum()
+    spurious = spec[np.abs(freqs - f) >= 200.0].sum()
+    return {
+        "error_db": round(float(np.mean(errors)), 1),
+        "spurious_db": round(float(10 * np.log10(spurious / signal + 1e-20)), 1),
+    }
+
+
+def run(seconds: float, chunk: int) -> Dict[str, dict]:
+    rng = np.random.default_rng(0)
+    report: Dict[str, dict] = {}
+    for in_sr, out_sr in RATE_PAIRS:
+        x = (0.3 * rng.standard_normal(int(seconds * in_sr))).astype(np.float32)
+
+        def streamed() -> None:
+            rs = PolyphaseResampler(in_sr, out_sr)
+            for pos in range(0, x.shape[0], chunk):
+                rs.process(x[pos:pos + chunk])
+
+        report[f"{in_sr}->{out_sr}"] = {
+            "legacy": {
+                "x_realtime": round(_throughput(lambda: legacy_resample(x, in_sr, out_sr), seconds), 1),
+                "peak_alloc_kb": _peak_alloc(lambda: legacy_resample(x, in_sr, out_sr)) // 1024,
+                **_quality(legacy_resample, in_sr, out_sr),
+            },
+            "polyphase": {
+                "x_realtime": round(_throughput(lambda: resample(x, in_sr, out_sr), seconds), 1),
+                "x_realtime_stream": round(_throughput(streamed, seconds), 1),
+                "peak_alloc_kb": _peak_alloc(lambda: resample(x, in_sr, out_sr)) // 1024,
+                "peak_alloc_stream_kb": _peak_alloc(streamed) // 1024,
+                **_quality(resample, in_sr, out_sr),
+            },
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark rééchantillonnage polyphase vs interpolation linéaire")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Durée du signal de test (s)")
+    parser.add_argument("--chunk", type=int, default=4096, help="Taille des blocs en mode flux")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    report = run(args.seconds, args.chunk)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for pair, res in report.items():
+        print(f"[{pair}]")
+        for name, values in res.items():
+            print("    " + name.ljust(10) + " ".join(f"{k}={v}" for k, v in values.items()))
+
+
+if __name__ == "__main__":
+    main()
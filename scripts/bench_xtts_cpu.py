@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark XTTS v2 sur CPU: modèle par défaut vs profil CPU de tts_engine (XTTS_CPU_PROFILE=1).
+
+Chaque configuration tourne dans un processus séparé (pic RSS propre) sur le même jeu de
+phrases françaises, avec la même voix et la même graine aléatoire.
+
+Mesures par configuration:
+  - RTF (temps de synthèse / durée audio; < 1 = plus rapide que le temps réel), médiane et total
+  - pic RSS du processus (Mo), chargement du modèle inclus
+  - qualité (profil vs défaut): distance log-spectrale moyenne (dB) et rapport de durée
+
+Utilisation:
+  python scripts/bench_xtts_cpu.py [--threads 3] [--no-quantize] [--repeat 1] [--json]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+SENTENCES = (
+    "Bonjour, je suis l'assistant vocal. Comment puis-je vous aider aujourd'hui ?",
+    "Votre carte a bien été bloquée, aucune opération ne sera acceptée.",
+    "Pouvez-vous me donner votre adresse e-mail, lettre par lettre ?",
+    "Merci, je vous envoie l'invitation dans quelques instants.",
+    "Je n'ai rien entendu. Peux-tu répéter ?",
+    "Le rendez-vous est fixé au mardi douze mars, à quatorze heures trente.",
+)
+SEED = 1234
+
+
+def _run_config(name: str, env: Dict[str, str], out_dir: str, repeat: int, results) -> None:
+    """Processus enfant: charge le modèle avec l'environnement donné et synthétise les phrases."""
+    os.environ.update(env)
+    os.environ.setdefault("COQUI_TOS_AGREED", "1")
+    import torch
+
+    from tts_engine import create_coqui_synth
+
+    t0 = time.perf_counter()
+    synth = create_coqui_synth(use_worker=False)
+    load_s = time.perf_counter() - t0
+    synth(SENTENCES[0])  # préchauffage (allocations, noyaux)
+
+    rtfs: List[float] = []
+    total_synth = 0.0
+    total_audio = 0.0
+    for _ in range(repeat):
+        for i, text in enumerate(SENTENCES):
+            torch.manual_seed(SEED + i)
+            t0 = time.perf_counter()
+            wav, sr = synth(text)
+            elapsed = time.perf_counter() - t0
+            duration = wav.shape[0] / float(sr)
+            rtfs.append(elapsed / duration if duration > 0 else float("inf"))
+            total_synth += elapsed
+            total_audio += duration
+            np.save(Path(out_dir) / f"{name}_{i}.npy", wav.astype(np.float32))
+    results.put({
+        "name": name,
+        "sample_rate": int(sr),
+        "load_s": round(load_s, 1),
+        "rtf_median": round(float(np.median(rtfs)), 3),
+        "rtf_total": round(total_synth / total_audio, 3) if total_audio else None,
+        # ru_maxrss: Ko sous Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1),
+        "torch_threads": torch.get_num_threads(),
+    })
+
+
+def _log_spectrum(wav: np.ndarray, n_fft: int = 1024, hop: int = 256) -> np.ndarray:
+    if wav.shape[0] < n_fft:
+        wav = np.pad(wav, (0, n_fft - wav.shape[0]))
+    frames = np.lib.stride_tricks.sliding_window_view(wav, n_fft)[::hop] * np.hanning(n_fft)
+    return 10.0 * np.log10(np.abs(np.fft.rfft(frames, axis=-1)) ** 2 + 1e-10)
+
+
+def _quality(ref_dir: Path, ref: str, cand: str) -> Dict[str, float]:
+    """Distance log-spectrale (spectres moyens, insensible au léger décalage temporel) et rapport de durée."""
+    distances: List[float] = []
+    ratios: List[float] = []
+    for i in range(len(SENTENCES)):
+        a = np.load(ref_dir / f"{ref}_{i}.npy")
+        b = np.load(ref_dir / f"{cand}_{i}.npy")
+        sa = _log_spectrum(a).mean(axis=0)
+        sb = _log_spectrum(b).mean(axis=0)
+        distances.append(float(np.sqrt(np.mean((sa - sb) ** 2))))
+        ratios.append(b.shape[0] / max(1, a.shape[0]))
+    return {
+        "log_spectral_distance_db": round(float(np.mean(distances)), 2),
+        "duration_ratio": round(float(np.mean(ratios)), 3),
+    }
+
+
+def run(threads: Optional[int], quantize: bool, repeat: int) -> Dict[str, dict]:
+    profile_env = {"XTTS_CPU_PROFILE": "1", "XTTS_QUANTIZE": "1" if quantize else "0"}
+    if threads:
+        profile_env["XTTS_NUM_THREADS"] = str(threads)
+    configs = {"default": {"XTTS_CPU_PROFILE": "0"}, "cpu_profile": profile_env}
+    ctx = mp.get_context("spawn")
+    report: Dict[str, dict] = {}
+    with tempfile.TemporaryDirectory(prefix="bench_xtts_") as tmp:
+        for name, env in configs.items():
+            results = ctx.Queue()
+            proc = ctx.Process(target=_run_config, args=(name, env, tmp, repeat, results))
+            proc.start()
+            proc.join()
+            if proc.exitcode != 0:
+                raise SystemExit(f"Configuration '{name}' en échec (code {proc.exitcode}).")
+            res = results.get()
+            report[res.pop("name")] = res
+        report["cpu_profile"]["quality_vs_default"] = _quality(Path(tmp), "default", "cpu_profile")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark XTTS v2 CPU: défaut vs profil CPU (quantification, threads)")
+    parser.add_argument("--threads", type=int, default=None, help="XTTS_NUM_THREADS du profil (def: nombre de CPU - 1)")
+    parser.add_argument("--no-quantize", action="store_true", help="Profil sans quantification int8")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes sur le jeu de phrases")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON")
+    args = parser.parse_args()
+
+    report = run(args.threads, not args.no_quantize, max(1, args.repeat))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for name, values in report.items():
+        print(f"[{name}]")
+        for k, v in values.items():
+            print(f"    {k}: {v}")
+
+
+if __name__ == "__main__":
+    main()
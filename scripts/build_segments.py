@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Compile les segments du manifest en un bundle PCM int16 48 kHz mono normalisé (segment_bundle).
+
+Seuls les enregistrements dont la source a changé (taille/mtime, puis sha256) sont décodés;
+les autres sont recopiés depuis le bundle existant. L'écriture est atomique: un agent en
+cours d'exécution recharge le nouveau bundle à chaud.
+
+Utilisation:
+  python scripts/build_segments.py [--manifest segments/manifest.json] [--out segments/segments.bundle]
+                                   [--target-lufs -20] [--force] [--watch 2]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from segment_bundle import DEFAULT_TARGET_LUFS, build_bundle, manifest_records, read_header  # noqa: E402
+
+
+def _build(manifest: Path, out: Path, target_lufs: float, force: bool) -> None:
+    t0 = time.perf_counter()
+    summary = build_bundle(manifest, out, target_lufs=target_lufs, force=force)
+    elapsed = time.perf_counter() - t0
+    print(
+        f"[BUNDLE] {summary['path']}: {len(summary['built'])} décodés, {len(summary['reused'])} réutilisés, "
+        f"{len(summary['missing'])} manquants ({elapsed:.2f} s)"
+    )
+    for rec_id in summary["missing"]:
+        print(f"[BUNDLE]   manquant: {rec_id}")
+    header, _ = read_header(out)
+    for rec in header["records"]:
+        print(
+            f"[BUNDLE]   {rec['id']:<24} {rec['length'] / header['sample_rate']:6.2f} s "
+            f"{rec['lufs']:7.2f} LUFS crête {rec['peak']:.3f}"
+        )
+
+
+def _sources_stamp(manifest: Path) -> tuple:
+    stamp = [manifest.stat().st_mtime_ns]
+    for rec in manifest_records(manifest):
+        try:
+            st = rec["path"].stat()
+            stamp.append((st.st_size, st.st_mtime_ns))
+        except OSError:
+            stamp.append(None)
+    return tuple(stamp)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compile le bundle de segments")
+    parser.add_argument("--manifest", type=str, default=str(ROOT / "segments" / "manifest.json"))
+    parser.add_argument("--out", type=str, default=None, help="Chemin du bundle (def: segments.bundle à côté du manifest)")
+    parser.add_argument("--target-lufs", type=float, default=DEFAULT_TARGET_LUFS, help="Sonie cible (LUFS)")
+    parser.add_argument("--force", action="store_true", help="Tout décoder, sans réutiliser le bundle existant")
+    parser.add_argument("--watch", type=float, default=0.0, help="Surveille les sources et reconstruit (période en s)")
+    args = parser.parse_args()
+
+    manifest = Path(args.manifest).resolve()
+    out = Path(args.out).resolve() if args.out else manifest.parent / "segments.bundle"
+    _build(manifest, out, args.target_lufs, args.force)
+    if args.watch <= 0:
+        return
+    stamp = _sources_stamp(manifest)
+    try:
+        while True:
+            time.sleep(args.watch)
+            current = _sources_stamp(manifest)
+            if current != stamp:
+                stamp = current
+                _build(manifest, out, args.target_lufs, False)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
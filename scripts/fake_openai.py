@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Serveur HTTP local imitant l'API OpenAI pour les benchmarks hors ligne (OPENAI_BASE_URL).
+
+Points d'entrée servis:
+  - POST /v1/audio/transcriptions: retourne la transcription courante (fixée par POST /_bench/transcript),
+    ou la plus ancienne des transcriptions mises en file ({"text": ..., "enqueue": true}, sessions simultanées)
+  - POST /v1/chat/completions: décision JSON de talk_segments (premier enregistrement autorisé,
+    do_tool si un email est présent) ou réponse française de talk.py; stream=True en SSE
+  - GET  /v1/models/<id>: préchauffage de openai_client.warm_up
+
+Latences tirées d'une loi log-normale définie par médiane et p95 (ms), graine fixe:
+  --stt-latency 450,900  --llm-latency 350,800 (délai avant le premier token)  --token-ms 15
+
+Utilisation autonome:
+  python scripts/fake_openai.py [--port 8099] [--stt-latency 450,900] [--llm-latency 350,800]
+  OPENAI_BASE_URL=http://127.0.0.1:8099/v1 OPENAI_API_KEY=bench python talk_segments.py
+"""
+
+import argparse
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Optional, Tuple
+
+# Transcription en file non consommée au-delà de ce délai: tour sans requête STT, ignorée
+PENDING_TTL_S = 15.0
+DEFAULT_REPLIES = (
+    "Bien sûr. Je peux vous aider avec cela, dites-moi simplement ce dont vous avez besoin.",
+    "D'accord, c'est noté. Le rendez-vous est confirmé pour demain matin à dix heures.",
+    "Très bonne question. En résumé, la démarche prend quelques minutes et se fait en ligne.",
+)
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+
+
+class LatencyModel:
+    """Loi log-normale paramétrée par médiane et p95 (ms)."""
+
+    def __init__(self, median_ms: float, p95_ms: float, rng: random.Random):
+        self.median_ms = max(0.0, float(median_ms))
+        self.sigma = math.log(max(p95_ms, median_ms + 1e-6) / max(median_ms, 1e-6)) / 1.645 if median_ms > 0 else 0.0
+        self.rng = rng
+
+    @classmethod
+    def parse(cls, spec: str, rng: random.Random) -> "LatencyModel":
+        parts = [float(p) for p in str(spec).split(",") if p.strip()]
+        median = parts[0] if parts else 0.0
+        return cls(median, parts[1] if len(parts) > 1 else median, rng)
+
+    def sample_s(self) -> float:
+        if self.median_ms <= 0.0:
+            return 0.0
+        return self.rng.lognormvariate(math.log(self.median_ms), self.sigma) / 1000.0
+
+    def describe(self) -> dict:
+        return {"median_ms": self.median_ms, "p95_ms": round(self.median_ms * math.exp(1.645 * self.sigma), 1)}
+
+
+class FakeOpenAIServer:
+    """Serveur de substitution (thread daemon); url = base à passer dans OPENAI_BASE_URL."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        stt_latency: str = "450,900",
+        llm_latency: str = "350,800",
+        token_ms: float = 15.0,
+        replies: Tuple[str, ...] = DEFAULT_REPLIES,
+        seed: int = 1234,
+    ):
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stt = LatencyModel.parse(stt_latency, self._rng)
+        self.llm = LatencyModel.parse(llm_latency, self._rng)
+        self.token_s = max(0.0, float(token_ms)) / 1000.0
+        self.replies = tuple(replies) or DEFAULT_REPLIES
+        self.transcript = ""
+        self.pending = deque()
+        self.calls = {"transcriptions": 0, "chat": 0, "models": 0}
+        self._reply_index = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self.url = f"http://{host}:{self._httpd.server_address[1]}/v1"
+
+    def start(self) -> "FakeOpenAIServer":
+        threading.Thread(target=self._httpd.serve_forever, name="fake-openai", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def describe(self) -> dict:
+        return {"stt": self.stt.describe(), "llm": self.llm.describe(), "token_ms": self.token_s * 1000.0}
+
+    # --- réponses ---
+
+    def next_transcript(self) -> str:
+        with self._lock:
+            while self.pending:
+                text, queued_at = self.pending.popleft()
+                if time.monotonic() - queued_at <= PENDING_TTL_S:
+                    return text
+            return self.transcript
+
+    def _delay(self, model: LatencyModel) -> None:
+        with self._rng_lock:
+            delay = model.sample_s()
+        if delay > 0:
+            time.sleep(delay)
+
+    def _next_reply(self) -> str:
+        with self._lock:
+            reply = self.replies[self._reply_index % len(self.replies)]
+            self._reply_index += 1
+        return reply
+
+    def chat_content(self, body: dict) -> str:
+        """Décision talk_segments (JSON) si la requête en suit le schéma, sinon réponse libre."""
+        messages = body.get("messages") or []
+        content = str(messages[-1].get("content", "")) if messages else ""
+        try:
+            payload = json.loads(content)
+        except Exception:
+            payload = None
+        if isinstance(payload, dict) and "allowed_record_ids" in payload:
+            email = EMAIL_RE.search(str(payload.get("last_user_text") or ""))
+            allowed: List[str] = list(payload.get("allowed_record_ids") or [])
+            if email:
+                decision = {"action": "do_tool", "record_id": None, "variables": {"email": email.group(0)}}
+            elif allowed:
+                decision = {"action": "play_record", "record_id": allowed[0], "variables": {}}
+            else:
+                decision = {"action": "ask_clarification", "record_id": None, "variables": {}}
+            decision["reason"] = "bench"
+            return json.dumps(decision, ensure_ascii=False)
+        return self._next_reply()
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, format, *args):
+                pass
+
+            def handle(self):
+                # Requête abandonnée par le client (timeout, requête dupliquée annulée)
+                try:
+                    super().handle()
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _body(self) -> bytes:
+                length = int(self.headers.get("Content-Length") or 0)
+                return self.rfile.read(length) if length else b""
+
+            def _json(self, obj, status: int = 200) -> None:
+                data = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, data: bytes) -> None:
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def do_GET(self):
+                if self.path.startswith("/v1/models/"):
+                    server.calls["models"] += 1
+                    model = self.path.rsplit("/", 1)[-1]
+                    self._json({"id": model, "object": "model", "created": 0, "owned_by": "bench"})
+                    return
+                self._json({"error": {"message": "not found"}}, 404)
+
+            def do_POST(self):
+                body = self._body()
+                if self.path == "/_bench/transcript":
+                    req = json.loads(body or b"{}")
+                    if req.get("enqueue"):
+                        with server._lock:
+                            server.pending.append((str(req.get("text", "")), time.monotonic()))
+                    else:
+                        server.transcript = str(req.get("text", ""))
+                    self._json({"ok": True})
+                elif self.path == "/v1/audio/transcriptions":
+                    server.calls["transcriptions"] += 1
+                    # Transcription attribuée à l'arrivée de la requête (ordre des fins de parole)
+                    text = server.next_transcript()
+                    server._delay(server.stt)
+                    self._json({"text": text})
+                elif self.path == "/v1/chat/completions":
+                    server.calls["chat"] += 1
+                    self._chat(json.loads(body or b"{}"))
+                else:
+                    self._json({"error": {"message": "not found"}}, 404)
+
+            def _chat(self, req: dict) -> None:
+                content = server.chat_content(req)
+                model = req.get("model", "bench")
+                cid = "chatcmpl-" + uuid.uuid4().hex[:12]
+                server._delay(server.llm)
+                if not req.get("stream"):
+                    self._json({
+                        "id": cid,
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+                    })
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                tokens = re.findall(r"\S+\s*", content)
+                for i, token in enumerate(tokens):
+                    if i and server.token_s:
+                        time.sleep(server.token_s)
+                    event = {
+                        "id": cid,
+                        "object": "chat.completion.chunk",
+                        "created": int(time.time()),
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+                    }
+                    self._chunk(b"data: " + json.dumps(event, ensure_ascii=False).encode("utf-8") + b"\n\n")
+                self._chunk(b"data: [DONE]\n\n")
+                self._chunk(b"")
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serveur OpenAI de substitution pour les benchmarks")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8099)
+    parser.add_argument("--stt-latency", type=str, default="450,900", help="médiane,p95 (ms) des transcriptions")
+    parser.add_argument("--llm-latency", type=str, default="350,800", help="médiane,p95 (ms) avant le premier token")
+    parser.add_argument("--token-ms", type=float, default=15.0, help="intervalle entre tokens en streaming (ms)")
+    parser.add_argument("--transcript", type=str, default="Bonjour, je m'appelle Paul.", help="transcription renvoyée")
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    server = FakeOpenAIServer(args.host, args.port, args.stt_latency, args.llm_latency, args.token_ms, seed=args.seed)
+    server.transcript = args.transcript
+    server.start()
+    print(f"[FAKE-OPENAI] {server.url} {json.dumps(server.describe())}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Évaluation hors ligne de la détection de fin de tour (vad.py) sur un dossier de WAV.
+
+Chaque fichier est rejoué bloc par bloc comme en capture réelle, suivi de --tail-ms de
+silence. La fin de parole de référence provient d'un fichier voisin <nom>.json
+({"speech": [[début_s, fin_s], ...]}) ou, à défaut, d'une détection hors ligne par énergie.
+
+Mesures par mode de VAD:
+  - latence de fin de tour: fin détectée − fin de parole de référence (ms)
+  - coupures prématurées: fin détectée alors qu'il reste de la parole (au-delà de --tolerance-ms)
+  - ratés: aucune fin de tour détectée
+
+Utilisation:
+  python scripts/vad_eval.py DOSSIER_WAV [--vad adaptive,rms] [--json]
+"""
+
+import argparse
+import json
+import sys
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from vad import create_vad, frame_features  # noqa: E402
+
+
+def read_wav_mono(path: Path, target_sr: int) -> np.ndarray:
+    """Lit un WAV PCM 16 bits, mixe en mono et rééchantillonne (linéaire) vers target_sr."""
+    with wave.open(str(path), "rb") as wf:
+        sr = wf.getframerate()
+        channels = wf.getnchannels()
+        width = wf.getsampwidth()
+        raw = wf.readframes(wf.getnframes())
+    if width != 2:
+        raise ValueError(f"{path.name}: seuls les WAV 16 bits sont pris en charge")
+    audio = np.frombuffer(raw, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        audio = audio.reshape(-1, channels).mean(axis=1)
+    if sr != target_sr and audio.size:
+        new_len = int(round(audio.shape[0] * target_sr / sr))
+        audio = np.interp(
+            np.arange(new_len) * (sr / target_sr), np.arange(audio.shape[0]), audio
+        ).astype(np.float32)
+    return audio
+
+
+def reference_speech_end(path: Path, audio: np.ndarray, sr: int) -> Optional[float]:
+    """Fin de parole de référence (s): annotations JSON si présentes, sinon énergie hors ligne."""
+    label = path.with_suffix(".json")
+    if label.exists():
+        data = json.loads(label.read_text(encoding="utf-8"))
+        segments = data.get("speech") or []
+        return max(float(end) for _, end in segments) if segments else None
+    frame = int(0.02 * sr)
+    n = audio.shape[0] // frame
+    if n == 0:
+        return None
+    energy_db, _, _ = frame_features(audio[: n * frame].reshape(n, frame))
+    noise = float(np.percentile(energy_db, 10))
+    threshold = max(noise + 12.0, float(np.max(energy_db)) - 35.0)
+    active = np.nonzero(energy_db > threshold)[0]
+    return float((active[-1] + 1) * frame / sr) if active.size else None
+
+
+def run_file(audio: np.ndarray, sr: int, kind: str, tail_ms: float) -> Tuple[Optional[float], Optional[float]]:
+    """Rejoue audio + silence dans (vad, endpointer); retourne (début_s, fin_s) détectés."""
+    vad, endpointer = create_vad(kind, sr)
+    tail = np.zeros(int(sr * tail_ms / 1000.0), dtype=np.float32)
+    stream = np.concatenate((audio, tail))
+    block = vad.frame_len
+    for pos in range(0, stream.shape[0], block):
+        endpointer.update(vad.process(stream[pos:pos + block]))
+        if endpointer.ended:
+            break
+    frame_s = vad.frame_ms / 1000.0
+    start = endpointer.start_frame * frame_s if endpointer.start_frame is not None else None
+    end = endpointer.end_frame * frame_s if endpointer.end_frame is not None else None
+    return start, end
+
+
+def evaluate(folder: Path, kinds: List[str], sr: int, tail_ms: float, tolerance_ms: float) -> Dict[str, dict]:
+    files = sorted(folder.glob("*.wav"))
+    report: Dict[str, dict] = {}
+    for kind in kinds:
+        rows = []
+        for path in files:
+            audio = read_wav_mono(path, sr)
+            ref_end = reference_speech_end(path, audio, sr)
+            start, end = run_file(audio, sr, kind, tail_ms)
+            row = {
+                "file": path.name,
+                "ref_end_s": None if ref_end is None else round(ref_end, 3),
+                "start_s": None if start is None else round(start, 3),
+                "end_s": None if end is None else round(end, 3),
+            }
+            if ref_end is not None and end is not None:
+                row["latency_ms"] = round((end - ref_end) * 1000.0, 1)
+                row["false_cutoff"] = (ref_end - end) * 1000.0 > tolerance_ms
+            rows.append(row)
+        latencies = np.array(
+            [r["latency_ms"] for r in rows if "latency_ms" in r and not r["false_cutoff"]], dtype=np.float64
+        )
+        report[kind] = {
+            "files": len(rows),
+            "missed": sum(1 for r in rows if r["end_s"] is None),
+            "false_cutoffs": sum(1 for r in rows if r.get("false_cutoff")),
+            "latency_ms_mean": round(float(latencies.mean()), 1) if latencies.size else None,
+            "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1) if latencies.size else None,
+            "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1) if latencies.size else None,
+            "rows": rows,
+        }
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Évaluation hors ligne de la fin de tour (VAD) sur des WAV")
+    parser.add_argument("folder", type=Path, help="Dossier contenant les fichiers .wav (+ .json optionnels)")
+    parser.add_argument("--vad", default="adaptive,rms", help="Modes à comparer, séparés par des virgules")
+    parser.add_argument("--sample-rate", type=int, default=16000, help="Taux de capture simulé (def: 16000)")
+    parser.add_argument("--tail-ms", type=float, default=2500.0, help="Silence ajouté après chaque fichier")
+    parser.add_argument("--tolerance-ms", type=float, default=50.0, help="Tolérance avant de compter une coupure prématurée")
+    parser.add_argument("--json", action="store_true", help="Sortie JSON complète (détail par fichier)")
+    args = parser.parse_args()
+
+    if not args.folder.is_dir():
+        print(f"Erreur: dossier introuvable: {args.folder}")
+        sys.exit(1)
+
+    kinds = [k.strip() for k in args.vad.split(",") if k.strip()]
+    report = evaluate(args.folder, kinds, args.sample_rate, args.tail_ms, args.tolerance_ms)
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+        return
+
+    for kind, res in report.items():
+        print(
+            f"[{kind}] fichiers={res['files']} ratés={res['missed']} coupures={res['false_cutoffs']} "
+            f"latence moy={res['latency_ms_mean']} ms p50={res['latency_ms_p50']} ms p95={res['latency_ms_p95']} ms"
+        )
+        for row in res["rows"]:
+            flag = " COUPURE" if row.get("false_cutoff") else ""
+            print(f"    {row['file']}: fin réf={row['ref_end_s']} fin détectée={row['end_s']} latence={row.get('latency_ms')} ms{flag}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""
+Bundle compilé des segments de talk_segments.py.
+
+Un seul fichier (segments/segments.bundle) contient tous les enregistrements du manifest,
+décodés une fois en PCM int16 48 kHz mono et normalisés en sonie (LUFS, ITU-R BS.1770):
+
+    b"SEGB" | version u32 | taille de l'en-tête u32 | en-tête JSON | PCM int16 (alignés sur 64 octets)
+
+L'en-tête indexe chaque enregistrement: id → offset, longueur, intent, crête, LUFS mesurés
+et empreinte de la source (taille, mtime, sha256) pour la reconstruction incrémentale.
+
+- build_bundle(manifest): (re)construit le bundle; seules les sources modifiées sont décodées
+- write_bundle(path, records): écriture atomique d'un bundle à partir de PCM int16 déjà prêts
+- SegmentBundle(path): bundle en memory-map, lookup O(1), rechargé à chaud s'il change
+- integrated_loudness(pcm, sr): sonie intégrée (LUFS) avec pondération K et double seuil
+"""
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b"SEGB"
+VERSION = 1
+ALIGN = 64
+BUNDLE_SAMPLE_RATE_HZ = 48000
+DEFAULT_TARGET_LUFS = -20.0
+# Crête maximale après normalisation (dBFS)
+PEAK_CEILING_DB = -1.0
+DEFAULT_BUNDLE_NAME = "segments.bundle"
+
+# Filtres de pondération K (BS.1770) à 48 kHz: pré-filtre en plateau puis passe-haut RLB
+_K_STAGES = (
+    ((1.53512485958697, -2.69169618940638, 1.19839281085285), (1.0, -1.69065929318241, 0.73248077421585)),
+    ((1.0, -2.0, 1.0), (1.0, -1.99004745483398, 0.99007225036621)),
+)
+
+
+def _k_weighting_gain(n: int, sample_rate_hz: int) -> np.ndarray:
+    """|H(f)| de la pondération K sur la grille rfft (coefficients donnés à 48 kHz)."""
+    w = 2.0 * np.pi * np.fft.rfftfreq(n, 1.0 / sample_rate_hz) / BUNDLE_SAMPLE_RATE_HZ
+    z1 = np.exp(-1j * w)
+    z2 = z1 * z1
+    gain = np.ones_like(w)
+    for b, a in _K_STAGES:
+        gain *= np.abs((b[0] + b[1] * z1 + b[2] * z2) / (a[0] + a[1] * z1 + a[2] * z2))
+    return gain
+
+
+def integrated_loudness(pcm: np.ndarray, sample_rate_hz: int = BUNDLE_SAMPLE_RATE_HZ) -> float:
+    """Sonie intégrée (LUFS) d'un signal mono float32.
+
+    La pondération K est appliquée en fréquence (module seulement: l'énergie par bloc ne
+    dépend pas de la phase); blocs de 400 ms au pas de 100 ms, seuils -70 LUFS et -10 LU.
+    """
+    x = np.asarray(pcm, dtype=np.float32).reshape(-1)
+    if x.size == 0:
+        return -70.0
+    y = np.fft.irfft(np.fft.rfft(x) * _k_weighting_gain(x.shape[0], sample_rate_hz), n=x.shape[0])
+    block = int(0.4 * sample_rate_hz)
+    hop = int(0.1 * sample_rate_hz)
+    if y.shape[0] < block:
+        power = np.array([np.mean(y * y)])
+    else:
+        sq = np.concatenate(([0.0], np.cumsum(y * y)))
+        starts = np.arange(0, y.shape[0] - block + 1, hop)
+        power = (sq[starts + block] - sq[starts]) / block
+    loudness = -0.691 + 10.0 * np.log10(power + 1e-12)
+    gated = power[loudness > -70.0]
+    if gated.size == 0:
+        return -70.0
+    relative = -0.691 + 10.0 * np.log10(np.mean(gated)) - 10.0
+    gated = power[(loudness > -70.0) & (loudness > relative)]
+    if gated.size == 0:
+        return -70.0
+    return float(-0.691 + 10.0 * np.log10(np.mean(gated)))
+
+
+def normalize_loudness(pcm: np.ndarray, target_lufs: float = DEFAULT_TARGET_LUFS) -> Tuple[np.ndarray, float, float]:
+    """Applique le gain vers target_lufs (borné par PEAK_CEILING_DB); retourne (pcm, LUFS final, crête)."""
+    lufs = integrated_loudness(pcm)
+    peak = float(np.max(np.abs(pcm))) if pcm.size else 0.0
+    gain_db = target_lufs - lufs if lufs > -70.0 else 0.0
+    if peak > 0.0:
+        gain_db = min(gain_db, PEAK_CEILING_DB - 20.0 * np.log10(peak))
+    gain = 10.0 ** (gain_db / 20.0)
+    out = (pcm * gain).astype(np.float32)
+    return out, lufs + gain_db, peak * gain
+
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_records(manifest_path: Path) -> List[Dict[str, Any]]:
+    """Enregistrements du manifest avec chemin absolu (même résolution que talk_segments.load_manifest)."""
+    data = json.loads(Path(manifest_path).read_text(encoding="utf-8"))
+    records = []
+    for rec in data.get("records", []):
+        rec_id, rel = rec.get("id"), rec.get("path")
+        if rec_id and rel:
+            records.append({
+                "id": rec_id,
+                "intent": rec.get("intent", ""),
+                "path": (Path(manifest_path).parent.parent / Path(rel)).resolve(),
+            })
+    return records
+
+
+def read_header(path: Path) -> Tuple[Dict[str, Any], int]:
+    """(en-tête JSON, offset du début des données PCM) d'un bundle."""
+    with open(path, "rb") as f:
+        prefix = f.read(12)
+        if len(prefix) < 12 or prefix[:4] != MAGIC:
+            raise ValueError(f"Bundle invalide: {path}")
+        version, header_len = struct.unpack("<II", prefix[4:])
+        if version != VERSION:
+            raise ValueError(f"Version de bundle non supportée: {version}")
+        header = json.loads(f.read(header_len).decode("utf-8"))
+    data_start = -(-(12 + header_len) // ALIGN) * ALIGN
+    return header, data_start
+
+
+def build_bundle(
+    manifest_path: Path,
+    bundle_path: Optional[Path] = None,
+    target_lufs: float = DEFAULT_TARGET_LUFS,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Construit le bundle (écriture atomique); retourne un résumé {built, reused, missing, path}.
+
+    Une source est réutilisée depuis l'ancien bundle si sa taille et son mtime sont inchangés,
+    ou si son sha256 l'est (fichier touché sans modification) et que la cible LUFS est la même.
+    """
+    from segment_player import decode_segment
+
+    manifest_path = Path(manifest_path)
+    bundle_path = Path(bundle_path) if bundle_path else manifest_path.parent / DEFAULT_BUNDLE_NAME
+    previous: Dict[str, Dict[str, Any]] = {}
+    old_pcm: Optional[np.ndarray] = None
+    if bundle_path.exists() and not force:
+        try:
+            header, data_start = read_header(bundle_path)
+            if header.get("target_lufs") == target_lufs and header.get("sample_rate") == BUNDLE_SAMPLE_RATE_HZ:
+                previous = {r["id"]: r for r in header.get("records", [])}
+                old_pcm = np.memmap(bundle_path, dtype=np.int16, mode="r", offset=data_start)
+        except Exception as e:
+            print(f"[BUNDLE] Ancien bundle illisible ({e}); reconstruction complète.")
+
+    records: List[Tuple[Dict[str, Any], np.ndarray]] = []
+    summary: Dict[str, Any] = {"built": [], "reused": [], "missing": [], "path": str(bundle_path)}
+    for rec in manifest_records(manifest_path):
+        src: Path = rec["path"]
+        if not src.exists():
+            summary["missing"].append(rec["id"])
+            continue
+        st = src.stat()
+        source = {"path": str(src), "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+        prev = previous.get(rec["id"])
+        pcm16: Optional[np.ndarray] = None
+        if prev is not None and old_pcm is not None:
+            old_src = prev.get("source", {})
+            same = old_src.get("size") == st.st_size and old_src.get("mtime_ns") == st.st_mtime_ns
+            if not same and old_src.get("size") == st.st_size:
+                source["sha256"] = _sha256(src)
+                same = old_src.get("sha256") == source["sha256"]
+            if same:
+                start = prev["offset"] // 2
+                pcm16 = np.array(old_pcm[start:start + prev["length"]])
+                source.setdefault("sha256", old_src.get("sha256"))
+                entry = dict(prev, source=source)
+                summary["reused"].append(rec["id"])
+        if pcm16 is None:
+            pcm = decode_segment(src, BUNDLE_SAMPLE_RATE_HZ)
+            if pcm is None:
+                print(f"[BUNDLE] Décodage impossible: {src}")
+                summary["missing"].append(rec["id"])
+                continue
+            pcm, lufs, peak = normalize_loudness(pcm, target_lufs)
+            pcm16 = np.round(np.clip(pcm, -1.0, 1.0) * 32767.0).astype(np.int16)
+            source.setdefault("sha256", _sha256(src))
+            entry = {
+                "id": rec["id"],
+                "intent": rec["intent"],
+                "length": int(pcm16.shape[0]),
+                "lufs": round(lufs, 2),
+                "peak": round(peak, 4),
+                "source": source,
+            }
+            summary["built"].append(rec["id"])
+        entry["intent"] = rec["intent"]
+        records.append((entry, pcm16))
+
+    del old_pcm
+    write_bundle(bundle_path, records, target_lufs)
+    return summary
+
+
+def write_bundle(
+    bundle_path: Path,
+    records: List[Tuple[Dict[str, Any], np.ndarray]],
+    target_lufs: float = DEFAULT_TARGET_LUFS,
+) -> None:
+    """Écrit atomiquement un bundle à partir de (entrée d'index, PCM int16 48 kHz mono).
+
+    Les offsets et longueurs sont calculés ici; les autres champs de l'entrée sont conservés.
+    """
+    bundle_path = Path(bundle_path)
+    entries: List[Dict[str, Any]] = []
+    offset = 0
+    for entry, pcm16 in records:
+        entry = dict(entry, offset=offset, length=int(pcm16.shape[0]))
+        entries.append(entry)
+        offset += pcm16.nbytes + (-pcm16.nbytes) % ALIGN
+    header = {
+        "sample_rate": BUNDLE_SAMPLE_RATE_HZ,
+        "dtype": "int16",
+        "target_lufs": target_lufs,
+        "created": time.time(),
+        "records": entries,
+    }
+    header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+    data_start = -(-(12 + len(header_bytes)) // ALIGN) * ALIGN
+    tmp = bundle_path.with_name(f"{bundle_path.name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(MAGIC + struct.pack("<II", VERSION, len(header_bytes)) + header_bytes)
+        f.write(b"\0" * (data_start - 12 - len(header_bytes)))
+        for _, pcm16 in records:
+            f.write(np.ascontiguousarray(pcm16, dtype=np.int16).tobytes())
+            f.write(b"\0" * ((-pcm16.nbytes) % ALIGN))
+    os.replace(tmp, bundle_path)
+
+
+class SegmentBundle:
+    """Bundle en memory-map: get(id) retourne une vue int16 sans copie ni décodage.
+
+    Le fichier est re-stat au plus une fois par reload_interval_s; s'il a été remplacé
+    (build_bundle écrit atomiquement), il est rouvert: les vues déjà rendues restent valides.
+    """
+
+    def __init__(self, path: Path, reload_interval_s: float = 1.0):
+        self.path = Path(path)
+        self.reload_interval_s = float(reload_interval_s)
+        self.sample_rate_hz = BUNDLE_SAMPLE_RATE_HZ
+        self._lock = threading.Lock()
+        self._index: Dict[str, Tuple[int, int]] = {}
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._pcm = np.zeros((0,), dtype=np.int16)
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._load()
+
+    def _load(self) -> None:
+        st = os.stat(self.path)
+        header, data_start = read_header(self.path)
+        with open(self.path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        pcm = np.frombuffer(mm, dtype=np.int16, offset=data_start)
+        index = {r["id"]: (r["offset"] // 2, r["length"]) for r in header.get("records", [])}
+        with self._lock:
+            self._pcm = pcm
+            self._index = index
+            self._records = {r["id"]: r for r in header.get("records", [])}
+            self.sample_rate_hz = int(header.get("sample_rate", BUNDLE_SAMPLE_RATE_HZ))
+            self._stamp = (st.st_ino, st.st_mtime_ns)
+
+    def maybe_reload(self) -> bool:
+        """Recharge le bundle s'il a changé sur disque; retourne True si rechargé."""
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval_s:
+            return False
+        self._checked = now
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return False
+        if (st.st_ino, st.st_mtime_ns) == self._stamp:
+            return False
+        try:
+            self._load()
+        except Exception as e:
+            print(f"[BUNDLE] Rechargement échoué: {e}")
+            return False
+        print(f"[BUNDLE] Rechargé: {len(self._index)} segments.")
+        return True
+
+    def __contains__(self, record_id: str) -> bool:
+        return record_id in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def record(self, record_id: str) -> Optional[Dict[str, Any]]:
+        return self._records.get(record_id)
+
+    def get(self, record_id: str) -> Optional[np.ndarray]:
+        self.maybe_reload()
+        with self._lock:
+            entry = self._index.get(record_id)
+            if entry is None:
+                return None
+            start, length = entry
+            return self._pcm[start:start + length]
+
+
+def open_bundle(segments_dir: Path) -> Optional[SegmentBundle]:
+    """Bundle de SEGMENT_BUNDLE (def: segments/segments.bundle) s'il existe; SEGMENT_BUNDLE=0 pour l'ignorer."""
+    setting = (os.getenv("SEGMENT_BUNDLE") or "").strip()
+    if setting == "0":
+        return None
+    path = Path(setting) if setting else Path(segments_dir) / DEFAULT_BUNDLE_NAME
+    if not path.exists():
+        return None
+    try:
+        return SegmentBundle(path)
+    except Exception as e:
+        print(f"[BUNDLE] Bundle ignoré ({e}).")
+        return None
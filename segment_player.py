@@ -0,0 +1,226 @@
+"""
+Lecteur de segments en mémoire pour talk_segments.py.
+
+Fonctions principales:
+- decode_segment(path): décode un fichier audio (m4a/mp3/wav) en PCM float32 48 kHz mono via ffmpeg
+- SegmentPlayer: cache PCM des segments du manifest joué via le moteur de sortie partagé
+  (audio_output), ffplay restant le fallback si le décodage ou la sortie échoue; avec un
+  bundle compilé (segment_bundle), les segments sont lus en memory-map sans décodeur
+- SegmentPlayer.play_sequence(ids): plusieurs segments rendus en un seul flux continu
+  (fondus enchaînés SEGMENT_CROSSFADE_MS ou silences SEGMENT_GAP_MS), mis en file en un appel
+- SegmentPlayer.for_engine(engine): lecteur d'une autre session sur le même cache (host.py)
+"""
+
+import os
+import shutil
+import subprocess
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from audio_output import OutputEngine, get_output_engine
+
+if TYPE_CHECKING:
+    from barge_in import BargeIn
+    from segment_bundle import SegmentBundle
+
+SEGMENT_SAMPLE_RATE_HZ = 48000
+
+
+def _env_ms(name: str, default: float) -> float:
+    try:
+        return max(0.0, float(os.getenv(name, str(default))))
+    except Exception:
+        return default
+
+
+def render_sequence(
+    pcms: Sequence[np.ndarray],
+    sample_rate_hz: int,
+    crossfade_ms: float = 30.0,
+    gap_ms: float = 0.0,
+) -> Tuple[np.ndarray, List[int]]:
+    """Concatène des extraits en un flux float32 unique; retourne (flux, début de chaque extrait).
+
+    gap_ms > 0 insère un silence entre extraits; sinon les jonctions sont fondues à puissance
+    constante sur crossfade_ms (borné à la moitié de l'extrait le plus court de la jonction).
+    """
+    gap = int(sample_rate_hz * gap_ms / 1000.0)
+    fade = 0 if gap > 0 else int(sample_rate_hz * crossfade_ms / 1000.0)
+    parts = [np.asarray(p).reshape(-1) for p in pcms]
+    overlaps = [
+        min(fade, parts[i].shape[0] // 2, parts[i + 1].shape[0] // 2) for i in range(len(parts) - 1)
+    ]
+    total = sum(p.shape[0] for p in parts) + gap * (len(parts) - 1) - sum(overlaps)
+    out = np.zeros(max(total, 0), dtype=np.float32)
+    starts: List[int] = []
+    pos = 0
+    for i, part in enumerate(parts):
+        x = part.astype(np.float32) / 32768.0 if part.dtype == np.int16 else part.astype(np.float32, copy=False)
+        head = overlaps[i - 1] if i > 0 else 0
+        tail = overlaps[i] if i < len(overlaps) else 0
+        starts.append(pos)
+        if head:
+            w = np.linspace(0.0, 0.5 * np.pi, head, dtype=np.float32)
+            out[pos:pos + head] = out[pos:pos + head] * np.cos(w) + x[:head] * np.sin(w)
+        out[pos + head:pos + x.shape[0]] = x[head:]
+        pos += x.shape[0] - tail
+        if tail == 0 and i < len(parts) - 1:
+            pos += gap
+    return out, starts
+
+
+def decode_segment(path: Path, sample_rate_hz: int = SEGMENT_SAMPLE_RATE_HZ) -> Optional[np.ndarray]:
+    """Décode un fichier audio en float32 mono au taux demandé (ffmpeg requis).
+
+    Retourne None si ffmpeg est absent ou si le décodage échoue.
+    """
+    if not shutil.which("ffmpeg"):
+        return None
+    cmd = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+        "-i", str(path),
+        "-f", "f32le", "-ac", "1", "-ar", str(sample_rate_hz),
+        "-",
+    ]
+    try:
+        proc = subprocess.run(cmd, check=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    except Exception:
+        return None
+    pcm = np.frombuffer(proc.stdout, dtype=np.float32)
+    return pcm if pcm.size else None
+
+
+class SegmentPlayer:
+    """Joue les segments depuis un cache PCM 48 kHz mono via le moteur de sortie persistant.
+
+    Le flux de sortie (SD_OUTPUT_DEVICE ou PULSE_SINK) est partagé par le processus: un
+    segment démarre dès sa mise en file, sans processus ni décodeur à lancer.
+    Les segments présents dans le bundle (int16, memory-map) sont prioritaires; les autres
+    sont décodés via ffmpeg.
+    """
+
+    def __init__(
+        self,
+        id_to_path: Dict[str, str],
+        engine: Optional[OutputEngine] = None,
+        bundle: Optional["SegmentBundle"] = None,
+    ):
+        self.id_to_path = id_to_path
+        self.engine = engine or get_output_engine()
+        self.sample_rate_hz = self.engine.sample_rate_hz
+        if bundle is not None and bundle.sample_rate_hz != self.sample_rate_hz:
+            print(f"[AUDIO] Bundle à {bundle.sample_rate_hz} Hz ≠ sortie {self.sample_rate_hz} Hz; ignoré.")
+            bundle = None
+        self.bundle = bundle
+        self._cache: Dict[str, np.ndarray] = {}
+        # Flux préparé par stage(): (record_ids, échantillons, débuts des segments)
+        self._staged: Optional[Tuple[Tuple[str, ...], np.ndarray, List[int]]] = None
+        self._staged_lock = threading.Lock()
+
+    def for_engine(self, engine: OutputEngine) -> "SegmentPlayer":
+        """Lecteur sur un autre moteur (session de host.py) partageant bundle et cache PCM."""
+        player = SegmentPlayer(self.id_to_path, engine=engine, bundle=self.bundle)
+        player._cache = self._cache
+        return player
+
+    def preload(self) -> int:
+        """Décode les segments du manifest absents du bundle; retourne le nombre de segments prêts."""
+        ready = 0
+        for record_id in self.id_to_path:
+            if self.get_pcm(record_id) is not None:
+                ready += 1
+        return ready
+
+    def get_pcm(self, record_id: str) -> Optional[np.ndarray]:
+        """PCM du segment: vue int16 du bundle, sinon float32 décodé au premier usage."""
+        if self.bundle is not None:
+            pcm = self.bundle.get(record_id)
+            if pcm is not None:
+                return pcm
+        pcm = self._cache.get(record_id)
+        if pcm is not None:
+            return pcm
+        path_str = self.id_to_path.get(record_id)
+        if not path_str or not Path(path_str).exists():
+            return None
+        pcm = decode_segment(Path(path_str), self.sample_rate_hz)
+        if pcm is not None:
+            self._cache[record_id] = pcm
+        return pcm
+
+    def _render(self, record_ids: Sequence[str]) -> Optional[Tuple[np.ndarray, List[int]]]:
+        pcms = [self.get_pcm(record_id) for record_id in record_ids]
+        if not pcms or any(pcm is None for pcm in pcms):
+            return None
+        if len(pcms) == 1:
+            # Un seul extrait: joué tel quel (vue int16 du bundle sans copie)
+            return pcms[0], [0]
+        return render_sequence(
+            pcms,
+            self.sample_rate_hz,
+            crossfade_ms=_env_ms("SEGMENT_CROSSFADE_MS", 30.0),
+            gap_ms=_env_ms("SEGMENT_GAP_MS", 0.0),
+        )
+
+    def stage(self, record_ids: Sequence[str]) -> bool:
+        """Prépare la prochaine lecture probable: flux rendu et pages du bundle chargées.
+
+        play_sequence() réutilise ce flux si les record_ids correspondent; tout autre appel l'oublie.
+        """
+        rendered = self._render(record_ids)
+        if rendered is None:
+            return False
+        samples, starts = rendered
+        if samples.dtype == np.int16:
+            # Une lecture par page de 4 Kio: pas de défaut de page sur le memory-map au démarrage
+            int(samples[::2048].sum())
+        with self._staged_lock:
+            self._staged = (tuple(record_ids), samples, starts)
+        return True
+
+    def _take_staged(self, record_ids: Sequence[str]) -> Optional[Tuple[np.ndarray, List[int]]]:
+        with self._staged_lock:
+            staged, self._staged = self._staged, None
+        if staged is None or staged[0] != tuple(record_ids):
+            return None
+        return staged[1], staged[2]
+
+    def play(self, record_id: str, barge_in: Optional["BargeIn"] = None) -> bool:
+        """Joue le segment depuis le cache. Retourne False si le chemin mémoire est indisponible.
+
+        Avec barge_in, la lecture est coupée dès que l'interlocuteur parle (retourne True).
+        """
+        return self.play_sequence([record_id], barge_in) is not None
+
+    def play_sequence(self, record_ids: Sequence[str], barge_in: Optional["BargeIn"] = None) -> Optional[int]:
+        """Joue les segments à la suite en un seul flux, sans pause entre eux.
+
+        Retourne le nombre de segments commencés (tous, sauf interruption par barge_in), ou
+        None si le chemin mémoire est indisponible (segment non décodable, sortie en erreur).
+        """
+        rendered = self._take_staged(record_ids) or self._render(record_ids)
+        if rendered is None:
+            return None
+        samples, starts = rendered
+        if barge_in is not None:
+            start = self.engine.write_position
+            try:
+                if barge_in.play(samples):
+                    return len(starts)
+            except Exception as e:
+                print(f"[AUDIO] Erreur de sortie ({e}); fallback ffplay.")
+                return None
+            # Segments commencés avant la coupure
+            played = len(starts)
+            if barge_in.played_until is not None:
+                offset = barge_in.played_until - start
+                played = max(1, sum(1 for start in starts if start < offset))
+            print(f"[AUDIO] Segment '{record_ids[played - 1]}' interrompu.")
+            return played
+        if not self.engine.play(samples):
+            print("[AUDIO] Sortie mémoire indisponible; fallback ffplay.")
+            return None
+        return len(starts)
@@ -0,0 +1,527 @@
+"""
+Enregistrement et rejeu déterministe d'une session (talk.py, talk_segments.py).
+
+--record-session PATH (ou RECORD_SESSION=PATH; dossier → session-<date>.zip): archive zip écrite
+en fin de session:
+  - capture.pcm: PCM int16 mono brut de la capture (taux dans meta.json)
+  - capture_blocks.npy: (instant de fin en s depuis le début, nombre d'échantillons) par bloc
+  - events.jsonl: événements horodatés (t, s depuis le début):
+      vad (début/fin de parole en positions de capture, retard d'endpointing, auto-écho ignoré),
+      stt (latence, transcription), chat (message envoyé, latence, réponse ou tokens horodatés),
+      decision (chemin et décision de talk_segments), played (record_ids joués),
+      turn (enregistrement de tracing.py: étapes et intervalles)
+  - meta.json: script, arguments, taux de capture, date
+
+--replay PATH: la capture enregistrée est rejouée en temps réel dans le pipeline (FedCaptureService),
+la sortie est une horloge sans périphérique (NullOutputEngine) et le client OpenAI sert les réponses
+enregistrées après la latence enregistrée × --replay-latency-scale (REPLAY_LATENCY_SCALE, def: 1;
+0 = instantané). En fin de rejeu, les tours rejoués sont comparés aux tours enregistrés
+(endpointing, STT, LLM, premier son); REPLAY_REPORT=fichier.json écrit le détail.
+"""
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+ARCHIVE_VERSION = 1
+# Silence (s) sans tour en cours ni appel en attente avant d'arrêter un rejeu terminé
+REPLAY_IDLE_S = 2.0
+# Champs des tours comparés en fin de rejeu: nom affiché → (clé de l'enregistrement, intervalle?)
+COMPARED = {
+    "endpoint": ("endpoint_ms", False),
+    "stt": ("stt", True),
+    "llm": ("llm", True),
+    "response": ("response", True),
+    "total": ("total", True),
+}
+
+_active = None
+
+
+def event(kind: str, **fields: Any) -> None:
+    """Ajoute un événement à la session enregistrée ou rejouée (sans effet sinon)."""
+    session = _active
+    if session is not None:
+        session.event(kind, **fields)
+
+
+def vad(speech_start: int, speech_end: Optional[int], endpoint_ms: Optional[float] = None, echo: bool = False) -> None:
+    """Décision de fin de tour (positions absolues de capture, ramenées au début de la session)."""
+    session = _active
+    if session is not None:
+        base = session.capture_base
+        session.event(
+            "vad",
+            start=speech_start - base,
+            end=None if speech_end is None else speech_end - base,
+            endpoint_ms=endpoint_ms,
+            echo=echo,
+        )
+
+
+def _chat_request(kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    messages = kwargs.get("messages") or []
+    response_format = kwargs.get("response_format") or {}
+    return {
+        "model": kwargs.get("model"),
+        "json": response_format.get("type") == "json_object",
+        "stream": bool(kwargs.get("stream")),
+        "content": str(messages[-1].get("content", "")) if messages else "",
+    }
+
+
+# --- enregistrement ---
+
+class RecordingClient:
+    """Client OpenAI enregistrant chaque transcription et chat.completions (requête, latence, réponse)."""
+
+    def __init__(self, session: "SessionRecorder"):
+        self._session = session
+        self._client = None
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai_client import create_client
+
+            self._client = create_client()
+        return self._client
+
+    @property
+    def models(self):
+        return self.client.models
+
+    def _transcribe(self, **kwargs):
+        t0 = time.monotonic()
+        payload = kwargs.get("file")
+        fields = {"t_request": self._session.rel(t0), "bytes": len(payload[1]) if isinstance(payload, tuple) else None}
+        try:
+            tr = self.client.audio.transcriptions.create(**kwargs)
+        except Exception as e:
+            self._session.event("stt", latency_ms=_ms_since(t0), error=type(e).__name__, message=str(e)[:200], **fields)
+            raise
+        self._session.event("stt", latency_ms=_ms_since(t0), text=tr.text or "", **fields)
+        return tr
+
+    def _chat(self, **kwargs):
+        t0 = time.monotonic()
+        request = dict(_chat_request(kwargs), t_request=self._session.rel(t0))
+        if kwargs.get("stream"):
+            return self._chat_stream(kwargs, t0, request)
+        try:
+            resp = self.client.chat.completions.create(**kwargs)
+        except Exception as e:
+            self._session.event("chat", latency_ms=_ms_since(t0), error=type(e).__name__, message=str(e)[:200], **request)
+            raise
+        content = resp.choices[0].message.content if resp.choices else None
+        self._session.event("chat", latency_ms=_ms_since(t0), content=content, **request)
+        return resp
+
+    def _chat_stream(self, kwargs, t0: float, request: Dict[str, Any]):
+        tokens: List[Tuple[float, str]] = []
+        error = None
+        try:
+            for ev in self.client.chat.completions.create(**kwargs):
+                if ev.choices and ev.choices[0].delta.content:
+                    tokens.append((_ms_since(t0), ev.choices[0].delta.content))
+                yield ev
+        except Exception as e:
+            error = type(e).__name__
+            raise
+        finally:
+            latency = tokens[0][0] if tokens else _ms_since(t0)
+            self._session.event("chat", latency_ms=latency, tokens=tokens, error=error, **request)
+
+
+def _ms_since(t0: float) -> float:
+    return round((time.monotonic() - t0) * 1000.0, 1)
+
+
+class SessionRecorder:
+    """Écrit capture et événements dans un dossier temporaire, assemblés en zip par close()."""
+
+    def __init__(self, path: Path, script: str, capture):
+        path = Path(path).expanduser()
+        if path.is_dir() or str(path).endswith(os.sep):
+            path = path / time.strftime("session-%Y%m%d-%H%M%S.zip")
+        self.path = path
+        self.script = script
+        self.t0 = time.monotonic()
+        self.capture_base = capture.position
+        self.sample_rate_hz = capture.sample_rate_hz
+        self._tmp = tempfile.TemporaryDirectory(prefix="tts-session-")
+        tmp = Path(self._tmp.name)
+        self._pcm = open(tmp / "capture.pcm", "wb")
+        self._events = open(tmp / "events.jsonl", "w", encoding="utf-8")
+        self._blocks: List[Tuple[float, int]] = []
+        self._turns = 0
+        self._lock = threading.Lock()
+        self._closed = False
+        self.meta = {
+            "version": ARCHIVE_VERSION,
+            "script": script,
+            "argv": sys.argv[1:],
+            "sample_rate": self.sample_rate_hz,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+        capture.add_tap(self._on_capture)
+
+    def rel(self, t: float) -> float:
+        return round(t - self.t0, 4)
+
+    def _on_capture(self, block: np.ndarray, end_time: float) -> None:
+        pcm = (np.clip(block, -1.0, 1.0) * 32767.0).astype(np.int16)
+        with self._lock:
+            if self._closed:
+                return
+            self._pcm.write(pcm.tobytes())
+            self._blocks.append((end_time - self.t0, pcm.shape[0]))
+
+    def event(self, kind: str, **fields: Any) -> None:
+        record = {"t": self.rel(time.monotonic()), "kind": kind, **fields}
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            if self._closed:
+                return
+            self._events.write(line + "\n")
+            self._turns += kind == "turn"
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._pcm.close()
+            self._events.close()
+            blocks = np.asarray(self._blocks, dtype=np.float64).reshape(-1, 2)
+        tmp = Path(self._tmp.name)
+        self.meta["duration_s"] = round(time.monotonic() - self.t0, 3)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            buf = io.BytesIO()
+            np.save(buf, blocks)
+            with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr("meta.json", json.dumps(self.meta, ensure_ascii=False, indent=2))
+                zf.writestr("capture_blocks.npy", buf.getvalue())
+                zf.write(tmp / "capture.pcm", "capture.pcm")
+                zf.write(tmp / "events.jsonl", "events.jsonl")
+            seconds = blocks[:, 1].sum() / float(self.sample_rate_hz) if blocks.size else 0.0
+            print(
+                f"[SESSION] Archive {self.path}: {self._turns} tours, {seconds:.0f} s de capture, "
+                f"{self.path.stat().st_size // 1024} Ko."
+            )
+        except Exception as e:
+            print(f"[SESSION] Écriture de l'archive impossible ({e}).")
+        finally:
+            self._tmp.cleanup()
+
+
+# --- rejeu ---
+
+def load_archive(path: Path) -> Dict[str, Any]:
+    """Lit une archive de session: meta, événements, PCM float32 et blocs de capture."""
+    with zipfile.ZipFile(Path(path).expanduser()) as zf:
+        meta = json.loads(zf.read("meta.json"))
+        events = [json.loads(line) for line in zf.read("events.jsonl").decode("utf-8").splitlines() if line.strip()]
+        pcm = np.frombuffer(zf.read("capture.pcm"), dtype=np.int16).astype(np.float32) / 32768.0
+        blocks = np.load(io.BytesIO(zf.read("capture_blocks.npy")))
+    return {"meta": meta, "events": events, "pcm": pcm, "blocks": blocks}
+
+
+class ReplayClient:
+    """Client OpenAI servant les réponses enregistrées (latence enregistrée × latency_scale).
+
+    Transcriptions: réponse enregistrée la plus proche dans le temps (robuste à un découpage
+    différent des tours); chat: même message envoyé, sinon la suivante dans l'ordre.
+    """
+
+    def __init__(self, session: "SessionReplay", events: List[Dict[str, Any]], latency_scale: float):
+        self._session = session
+        self.latency_scale = max(0.0, float(latency_scale))
+        self._stt_records = [e for e in events if e.get("kind") == "stt"]
+        self._chat_records = [e for e in events if e.get("kind") == "chat"]
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.misses = 0
+        self.audio = SimpleNamespace(transcriptions=SimpleNamespace(create=self._transcribe))
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.models = SimpleNamespace(retrieve=lambda model, **kwargs: SimpleNamespace(id=model, object="model"))
+
+    def _sleep(self, ms: Optional[float]) -> None:
+        delay = (ms or 0.0) * self.latency_scale / 1000.0
+        if delay > 0:
+            time.sleep(delay)
+
+    def _take_stt(self, t: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if not self._stt_records:
+                return None
+            best = min(range(len(self._stt_records)), key=lambda i: abs(self._stt_records[i].get("t_request", 0.0) - t))
+            return self._stt_records.pop(best)
+
+    def _take_chat(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            same_kind = [i for i, e in enumerate(self._chat_records) if bool(e.get("json")) == request["json"]]
+            for i in same_kind:
+                if self._chat_records[i].get("content") == request["content"]:
+                    return self._chat_records.pop(i)
+            return self._chat_records.pop(same_kind[0]) if same_kind else None
+
+    def _miss(self, what: str):
+        self.misses += 1
+        return RuntimeError(f"rejeu: aucune réponse {what} enregistrée")
+
+    def _transcribe(self, **kwargs):
+        rec = self._take_stt(self._session.rel(time.monotonic()))
+        if rec is None:
+            raise self._miss("STT")
+        with self._lock:
+            self.in_flight += 1
+        try:
+            self._sleep(rec.get("latency_ms"))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        error = rec.get("error")
+        if error and error != "BadRequestError":
+            raise RuntimeError(f"rejeu: {error}: {rec.get('message', '')}")
+        # Audio refusé (trop court): transcribe_wave retournait "", même issue ici
+        return SimpleNamespace(text=rec.get("text") or "")
+
+    def _chat(self, **kwargs):
+        rec = self._take_chat(_chat_request(kwargs))
+        if rec is None:
+            raise self._miss("chat")
+        if kwargs.get("stream"):
+            return self._chat_stream(rec)
+        with self._lock:
+            self.in_flight += 1
+        try:
+            self._sleep(rec.get("latency_ms"))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+        if rec.get("error"):
+            raise RuntimeError(f"rejeu: {rec['error']}: {rec.get('message', '')}")
+        message = SimpleNamespace(role="assistant", content=rec.get("content"))
+        return SimpleNamespace(choices=[SimpleNamespace(index=0, message=message, finish_reason="stop")])
+
+    def _chat_stream(self, rec: Dict[str, Any]):
+        t0 = time.monotonic()
+        with self._lock:
+            self.in_flight += 1
+        try:
+            for offset_ms, token in rec.get("tokens") or []:
+                delay = t0 + offset_ms * self.latency_scale / 1000.0 - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                delta = SimpleNamespace(content=token, role=None)
+                yield SimpleNamespace(choices=[SimpleNamespace(index=0, delta=delta, finish_reason=None)])
+            if rec.get("error"):
+                raise RuntimeError(f"rejeu: {rec['error']}: {rec.get('message', '')}")
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+
+class SessionReplay:
+    """Rejoue une archive: capture alimentée en temps réel, sortie sans périphérique, réponses enregistrées."""
+
+    def __init__(self, path: Path, script: str, latency_scale: float = 1.0):
+        import audio_output
+        import capture
+        import openai_client
+
+        self.path = Path(path).expanduser()
+        self.script = script
+        archive = load_archive(self.path)
+        self.meta = archive["meta"]
+        self.recorded = archive["events"]
+        self._pcm = archive["pcm"]
+        self._blocks = archive["blocks"]
+        if self.meta.get("script") not in (None, script):
+            print(f"[REPLAY] Archive enregistrée avec {self.meta.get('script')}.py, rejouée avec {script}.py.")
+        self.capture_base = 0
+        self.replayed: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._stopped = False
+        self.client = ReplayClient(self, self.recorded, latency_scale)
+        self.capture = capture._service = capture.FedCaptureService(int(self.meta.get("sample_rate", 16000)))
+        self.engine = audio_output._engine = audio_output.NullOutputEngine()
+        openai_client.set_client(self.client)
+        os.environ.setdefault("OPENAI_API_KEY", "replay")
+        # Une requête dupliquée consommerait une réponse enregistrée d'un autre appel
+        os.environ["HEDGE"] = "0"
+        # Les tours rejoués ne vont pas dans les traces de production (sauf TRACE_PATH explicite)
+        if not os.getenv("TRACE_PATH"):
+            os.environ["TRACE"] = "0"
+        self.t0 = time.monotonic()
+        duration = self._blocks[-1, 0] if self._blocks.size else 0.0
+        print(
+            f"[REPLAY] {self.path.name}: {duration:.0f} s de capture, "
+            f"{sum(e.get('kind') == 'turn' for e in self.recorded)} tours, latences × {self.client.latency_scale:g}."
+        )
+        threading.Thread(target=self._feed, name="session-replay", daemon=True).start()
+
+    def rel(self, t: float) -> float:
+        return round(t - self.t0, 4)
+
+    def event(self, kind: str, **fields: Any) -> None:
+        if kind in ("turn", "vad", "decision", "played"):
+            with self._lock:
+                self.replayed.append({"t": self.rel(time.monotonic()), "kind": kind, **fields})
+
+    def _feed(self) -> None:
+        offset = 0
+        for end_t, n in self._blocks:
+            n = int(n)
+            delay = self.t0 + end_t - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            if self._stopped:
+                return
+            self.capture.push(self._pcm[offset:offset + n], self.t0 + end_t)
+            offset += n
+        # Fin de l'enregistrement: silence jusqu'à ce que le pipeline soit au repos
+        import tracing
+
+        block = np.zeros(self.capture.blocksize, dtype=np.float32)
+        period = block.shape[0] / float(self.capture.sample_rate_hz)
+        last_busy = time.monotonic()
+        while not self._stopped:
+            time.sleep(period)
+            self.capture.push(block)
+            turn = tracing.current()
+            busy = (
+                self.client.in_flight > 0
+                or self.engine.pending_frames > 0
+                or (turn is not None and "speech_end" in turn.marks)
+            )
+            now = time.monotonic()
+            if busy:
+                last_busy = now
+            elif now - last_busy >= REPLAY_IDLE_S:
+                break
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        import _thread
+
+        print("[REPLAY] Fin de l'enregistrement.")
+        _thread.interrupt_main()
+
+    def close(self) -> None:
+        with self._lock:
+            self._stopped = True
+        report = self.report()
+        out = os.getenv("REPLAY_REPORT")
+        if out:
+            try:
+                Path(out).expanduser().write_text(json.dumps(report, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
+                print(f"[REPLAY] Rapport: {out}")
+            except OSError as e:
+                print(f"[REPLAY] Écriture du rapport impossible ({e}).")
+
+    def report(self) -> Dict[str, Any]:
+        """Compare tours enregistrés et rejoués (par ordre) et affiche le résumé."""
+        recorded = [e for e in self.recorded if e.get("kind") == "turn"]
+        with self._lock:
+            replayed = [e for e in self.replayed if e.get("kind") == "turn"]
+        rows = []
+        for i in range(max(len(recorded), len(replayed))):
+            before = recorded[i] if i < len(recorded) else {}
+            after = replayed[i] if i < len(replayed) else {}
+            row: Dict[str, Any] = {"turn": i + 1}
+            for name, (key, is_span) in COMPARED.items():
+                row[name] = [_turn_value(before, key, is_span), _turn_value(after, key, is_span)]
+            for key in ("decision_path", "played"):
+                if before.get(key) != after.get(key):
+                    row.setdefault("diverged", {})[key] = [before.get(key), after.get(key)]
+            rows.append(row)
+        summary: Dict[str, Any] = {}
+        for name in COMPARED:
+            pair = []
+            for side in (0, 1):
+                values = [r[name][side] for r in rows if r[name][side] is not None]
+                pair.append(round(float(np.median(values)), 1) if values else None)
+            summary[name] = {"recorded_p50": pair[0], "replayed_p50": pair[1]}
+        print(f"[REPLAY] Tours: {len(recorded)} enregistrés, {len(replayed)} rejoués; réponses manquantes: {self.client.misses}.")
+        for name, values in summary.items():
+            before, after = values["recorded_p50"], values["replayed_p50"]
+            if before is None and after is None:
+                continue
+            delta = f" ({(after - before) / before * 100:+.0f}%)" if before and after is not None else ""
+            print(f"[REPLAY] {name:<9} p50 {_fmt(before)} → {_fmt(after)} ms{delta}")
+        for row in rows:
+            if "diverged" in row:
+                print(f"[REPLAY] Tour {row['turn']} divergent: {row['diverged']}")
+        return {
+            "archive": str(self.path),
+            "script": self.script,
+            "latency_scale": self.client.latency_scale,
+            "summary": summary,
+            "turns": rows,
+            "missing_responses": self.client.misses,
+        }
+
+
+def _turn_value(record: Dict[str, Any], key: str, is_span: bool) -> Optional[float]:
+    value = (record.get("spans") or {}).get(key) if is_span else record.get(key)
+    return float(value) if isinstance(value, (int, float)) else None
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "—" if value is None else f"{value:.0f}"
+
+
+# --- intégration aux scripts ---
+
+def add_arguments(parser) -> None:
+    parser.add_argument("--record-session", type=str, default=None, help="Enregistre la session dans une archive zip (équivaut à RECORD_SESSION=chemin)")
+    parser.add_argument("--replay", type=str, default=None, help="Rejoue une archive de session (capture, réponses OpenAI) sans micro ni réseau")
+    parser.add_argument("--replay-latency-scale", type=float, default=None, help="Facteur appliqué aux latences enregistrées (équivaut à REPLAY_LATENCY_SCALE, def: 1; 0 = instantané)")
+
+
+def start(args, script: str):
+    """Démarre l'enregistrement ou le rejeu demandé (à appeler avant warm_up); retourne la session ou None."""
+    global _active
+    if getattr(args, "replay", None):
+        scale = args.replay_latency_scale
+        if scale is None:
+            try:
+                scale = float(os.getenv("REPLAY_LATENCY_SCALE", "1") or 1.0)
+            except Exception:
+                scale = 1.0
+        _active = SessionReplay(Path(args.replay), script, scale)
+        return _active
+    path = getattr(args, "record_session", None) or os.getenv("RECORD_SESSION") or ""
+    if not path:
+        return None
+    from openai_client import set_client
+    from stt_openai import input_capture
+
+    _active = SessionRecorder(Path(path), script, input_capture())
+    set_client(RecordingClient(_active))
+    print(f"[SESSION] Enregistrement de la session → {_active.path}")
+    return _active
+
+
+def finish() -> None:
+    """Termine la session active (archive écrite ou rapport de rejeu)."""
+    global _active
+    session, _active = _active, None
+    if session is not None:
+        session.close()
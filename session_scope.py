@@ -0,0 +1,101 @@
+"""
+Portée de session: isole l'état « par conversation » quand un processus en héberge plusieurs (host.py).
+
+Hors hôte aucune portée n'est active et les singletons du processus restent inchangés.
+Dans une portée (activate), les accesseurs partagés rendent l'instance de la session:
+- capture.get_capture_service(): un CaptureService par session, ouvert sur scope.source
+- audio_output.get_output_engine(): un OutputEngine par session, ouvert sur scope.sink
+- echo_gate.get_echo_gate(): une porte sur la référence du moteur de la session
+- tracing: un tour en cours par session; l'enregistrement porte le champ session
+- tts_scheduler: file de synthèse de la session (ordonnancement équitable)
+
+La portée suit le contexte (contextvars): un thread auxiliaire doit être lancé avec wrap(fn)
+pour hériter de la portée de l'appelant.
+"""
+
+import contextlib
+import contextvars
+import os
+import threading
+from typing import Any, Callable, Dict, Iterator, Optional
+
+
+class SessionScope:
+    """État d'une session: nom, périphériques PulseAudio et emplacements créés à la demande."""
+
+    def __init__(self, name: str, sink: Optional[str] = None, source: Optional[str] = None):
+        self.name = name
+        self.sink = sink or None
+        self.source = source or None
+        self._slots: Dict[str, Any] = {}
+        # Réentrant: une fabrique peut demander un autre emplacement (porte anti-écho → moteur)
+        self._lock = threading.RLock()
+
+    def get(self, key: str, factory: Callable[[], Any]) -> Any:
+        """Instance key de la session, créée par factory() au premier accès."""
+        with self._lock:
+            if key not in self._slots:
+                self._slots[key] = factory()
+            return self._slots[key]
+
+    def set(self, key: str, value: Any) -> None:
+        """Fixe l'instance key (capture ou sortie de substitution des benchmarks)."""
+        with self._lock:
+            self._slots[key] = value
+
+    def __repr__(self) -> str:
+        return f"SessionScope({self.name!r}, sink={self.sink!r}, source={self.source!r})"
+
+
+_scope: "contextvars.ContextVar[Optional[SessionScope]]" = contextvars.ContextVar("session_scope", default=None)
+
+
+def current() -> Optional[SessionScope]:
+    """Portée active dans ce contexte, ou None (processus à session unique)."""
+    return _scope.get()
+
+
+@contextlib.contextmanager
+def activate(scope: Optional[SessionScope]) -> Iterator[Optional[SessionScope]]:
+    """Rend scope active pour le bloc (et les threads lancés via wrap)."""
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def wrap(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """fn exécutée dans le contexte de l'appelant (portée de session), depuis n'importe quel thread."""
+    ctx = contextvars.copy_context()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        # Copie par appel: un même Context ne peut être entré par deux threads à la fois
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+_env_lock = threading.Lock()
+
+
+@contextlib.contextmanager
+def pulse_env(var: str, value: Optional[str]) -> Iterator[None]:
+    """Fixe temporairement var (PULSE_SINK, PULSE_SOURCE) pendant l'ouverture d'un flux.
+
+    Le client PulseAudio lit la variable à la connexion: les ouvertures des sessions sont
+    sérialisées pour que chacune voie son propre périphérique. Sans valeur, rien n'est modifié.
+    """
+    if not value:
+        yield
+        return
+    with _env_lock:
+        previous = os.environ.get(var)
+        os.environ[var] = value
+        try:
+            yield
+        finally:
+            if previous is None:
+                os.environ.pop(var, None)
+            else:
+                os.environ[var] = previous
@@ -0,0 +1,262 @@
+"""
+Spéculation pour talk_segments.py (--speculate ou SPECULATE=1): anticiper le tour suivant.
+
+La séquence d'étapes (compute_allowed_records) rend le prochain segment très prévisible:
+
+- pré-chargement: au début de chaque tour, la lecture la plus probable (règles locales sur
+  la mémoire courante) est préparée dans le lecteur (SegmentPlayer.stage: flux rendu,
+  pages du bundle chargées)
+- décision anticipée: dès SPEC_PAUSE_MS de pause dans la parole, l'audio capturé jusque-là
+  est transcrit et choose_next_action tourne sur une copie de la mémoire, en tâche de fond
+- validation: si aucune parole n'a suivi la pause, la transcription partielle est la
+  transcription finale: décision engagée sans nouvel appel STT ni LLM. Sinon la transcription
+  finale est faite; la décision anticipée n'est gardée que si la mémoire et les
+  enregistrements autorisés sont identiques et que le texte normalisé l'est aussi (ou que la
+  décision venait d'une règle locale, indépendante du texte). Autrement: retour arrière,
+  décision normale.
+
+Par étape (premier enregistrement autorisé): taux de succès, retours arrière, latence
+économisée (metrics: spec_<étape>_<issue>, spec_saved_ms) et succès du pré-chargement.
+"""
+
+import copy
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+import session_scope
+import tracing
+from decision_cache import DecisionCache
+from decision_rules import decide_locally
+from segment_player import SegmentPlayer
+from stt_openai import UtteranceDetector, _write_wav_bytes, input_capture, transcribe_wave
+from talk_segments import (
+    choose_next_action,
+    compute_allowed_records,
+    decision_record_ids,
+    normalize_text,
+    plan_sequence,
+    update_memory,
+)
+
+
+@dataclass
+class _Partial:
+    """Résultat d'une décision anticipée sur transcription partielle."""
+
+    text: str
+    memory: Dict[str, Any]
+    allowed: List[str]
+    decision: Dict[str, Any]
+    stt_ms: float
+    decide_ms: float
+    ready_at: float
+
+
+class _StepStats:
+    def __init__(self) -> None:
+        self.turns = 0
+        self.outcomes: Dict[str, int] = {}
+        self.saved_ms = 0.0
+        self.prefetch_hits = 0
+        self.prefetches = 0
+
+    def line(self, step: str) -> str:
+        hits = self.outcomes.get("hit", 0) + self.outcomes.get("commit", 0)
+        rate = 100.0 * hits / self.turns if self.turns else 0.0
+        prefetch = 100.0 * self.prefetch_hits / self.prefetches if self.prefetches else 0.0
+        outcomes = " ".join(f"{k}={v}" for k, v in sorted(self.outcomes.items()))
+        return (
+            f"{step}: tours={self.turns} succès={rate:.0f}% ({outcomes}) "
+            f"gain moy={self.saved_ms / max(1, self.turns):.0f} ms pré-chargement={prefetch:.0f}%"
+        )
+
+
+class Speculator:
+    """Tour de conversation avec pré-chargement et décision anticipée (voir module)."""
+
+    def __init__(
+        self,
+        id_to_path: Dict[str, str],
+        records_for_prompt: List[Dict[str, str]],
+        player: Optional[SegmentPlayer] = None,
+        decision_cache: Optional[DecisionCache] = None,
+        pause_ms: Optional[float] = None,
+    ):
+        if pause_ms is None:
+            try:
+                pause_ms = float(os.getenv("SPEC_PAUSE_MS", "200"))
+            except Exception:
+                pause_ms = 200.0
+        self.id_to_path = id_to_path
+        self.records_for_prompt = records_for_prompt
+        self.player = player
+        self.decision_cache = decision_cache
+        self.pause_ms = float(pause_ms)
+        self.capture = input_capture()
+        self.stats: Dict[str, _StepStats] = {}
+        self._pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="spec")
+
+    # --- pré-chargement ---
+
+    def predict(self, memory: Dict[str, Any]) -> List[str]:
+        """Lecture la plus probable au prochain tour (règles locales sur la mémoire courante)."""
+        allowed = compute_allowed_records(memory, self.id_to_path)
+        decision = decide_locally("", memory, allowed)
+        if decision is None:
+            return plan_sequence(allowed[:1], memory, self.id_to_path) if allowed else []
+        return self.sequence_for(decision, memory, allowed)
+
+    def sequence_for(self, decision: Dict[str, Any], memory: Dict[str, Any], allowed: List[str]) -> List[str]:
+        """Segments que execute_decision jouera pour cette décision."""
+        action = (decision.get("action") or "").strip()
+        record_ids = decision_record_ids(decision)
+        if action == "play_record" and record_ids:
+            if allowed and record_ids[0] not in allowed:
+                record_ids = [allowed[0]]
+            return plan_sequence(record_ids, memory, self.id_to_path)
+        if action == "do_tool" and "Invitation_done" in self.id_to_path:
+            return list(dict.fromkeys(["Invitation_done"] + [r for r in record_ids if r in self.id_to_path]))
+        return []
+
+    def _stage(self, record_ids: List[str]) -> bool:
+        if self.player is None or not record_ids:
+            return False
+        try:
+            return self.player.stage(record_ids)
+        except Exception as e:
+            print(f"[SPEC] Pré-chargement impossible: {e}")
+            return False
+
+    # --- décision anticipée ---
+
+    def _decide_partial(self, audio: np.ndarray, memory: Dict[str, Any]) -> _Partial:
+        t0 = time.monotonic()
+        text = transcribe_wave(_write_wav_bytes(audio, self.capture.sample_rate_hz))
+        t1 = time.monotonic()
+        mem = copy.deepcopy(memory)
+        update_memory(text, mem)
+        allowed = compute_allowed_records(mem, self.id_to_path)
+        decision = choose_next_action(text, mem, self.records_for_prompt, allowed, None, self.decision_cache)
+        t2 = time.monotonic()
+        # La lecture décidée remplace la prédiction de début de tour
+        self._stage(self.sequence_for(decision, mem, allowed))
+        return _Partial(text, mem, allowed, decision, (t1 - t0) * 1000.0, (t2 - t1) * 1000.0, t2)
+
+    def _listen(self, memory: Dict[str, Any], start_position: Optional[int]) -> Tuple[np.ndarray, Optional[Future], bool]:
+        """Capture un tour; lance une décision anticipée à chaque pause. Retourne (audio, future, valide)."""
+        detector = UtteranceDetector(self.capture, start_position=start_position)
+        pos = detector.pos
+        future: Optional[Future] = None
+        fired_at: Optional[int] = None
+        audio: Optional[np.ndarray] = None
+        while not detector.timed_out:
+            _, pos = self.capture.wait_read(pos, timeout=1.0)
+            audio = detector.advance(pos)
+            if audio is not None:
+                break
+            end = detector.speech_end
+            if end is not None and end != fired_at and detector.pause_ms >= self.pause_ms:
+                fired_at = end
+                partial = detector.partial()
+                if partial is not None and partial.size:
+                    future = self._pool.submit(session_scope.wrap(self._decide_partial), partial, memory)
+                    metrics.incr("spec_partial_count")
+        else:
+            audio = detector.flush()
+        # Valide si aucune parole n'a suivi la pause de la dernière décision anticipée
+        return audio, future, future is not None and detector.speech_end == fired_at
+
+    # --- tour complet ---
+
+    def turn(self, memory: Dict[str, Any], start_position: Optional[int] = None) -> Tuple[str, Dict[str, Any], List[str]]:
+        """Capture, transcription et décision d'un tour; met memory à jour. Retourne (texte, décision, autorisés)."""
+        allowed_now = compute_allowed_records(memory, self.id_to_path)
+        step = allowed_now[0] if allowed_now else ("invite" if memory.get("email_captured") else "open")
+        stats = self.stats.setdefault(step, _StepStats())
+        predicted = self.predict(memory)
+        staged = self._stage(predicted)
+        if staged:
+            stats.prefetches += 1
+
+        audio, future, valid = self._listen(memory, start_position)
+        t_end = time.monotonic()
+        result: Optional[_Partial] = None
+        saved_ms = 0.0
+        if valid and future.exception() is None:
+            result = future.result()
+            # Décision prête avant la fin de tour: gain = STT + décision, moins l'attente restante
+            saved_ms = result.stt_ms + result.decide_ms - max(0.0, result.ready_at - t_end) * 1000.0
+            outcome = "hit"
+            text, decision, allowed = result.text, result.decision, result.allowed
+            memory.clear()
+            memory.update(result.memory)
+            self._print_text(text)
+        else:
+            text = transcribe_wave(_write_wav_bytes(audio, self.capture.sample_rate_hz)) if audio.size else ""
+            self._print_text(text)
+            update_memory(text, memory)
+            allowed = compute_allowed_records(memory, self.id_to_path)
+            if future is not None and future.done() and future.exception() is None:
+                result = future.result()
+            if result is not None and self._same_decision(result, text, memory, allowed):
+                outcome, decision = "commit", result.decision
+                saved_ms = result.decide_ms
+            else:
+                outcome = "rollback" if future is not None else "none"
+                if future is not None and not future.done():
+                    outcome = "late"
+                decision = choose_next_action(text, memory, self.records_for_prompt, allowed, None, self.decision_cache)
+
+        stats.turns += 1
+        stats.outcomes[outcome] = stats.outcomes.get(outcome, 0) + 1
+        stats.saved_ms += saved_ms
+        if staged and predicted == self.sequence_for(decision, memory, allowed):
+            stats.prefetch_hits += 1
+            metrics.incr(f"spec_{step}_prefetch_hit")
+        metrics.incr(f"spec_{step}_{outcome}")
+        metrics.observe("spec_saved_ms", saved_ms)
+        tracing.annotate(spec=outcome, spec_saved_ms=round(saved_ms, 1))
+        print(f"[SPEC] étape={step} issue={outcome} gain={saved_ms:.0f} ms")
+        return text, decision, allowed
+
+    @staticmethod
+    def _print_text(text: str) -> None:
+        if text:
+            print(f"Reconnu (STT): {text}")
+        else:
+            print("(STT) silence ou inaudible.")
+
+    @staticmethod
+    def _same_decision(result: _Partial, text: str, memory: Dict[str, Any], allowed: List[str]) -> bool:
+        """Vrai si la transcription finale ne peut pas changer la décision anticipée."""
+        if result.memory != memory or result.allowed != allowed:
+            return False
+        if str(result.decision.get("reason", "")).startswith("rule:"):
+            # Les règles locales ne dépendent que de la mémoire et des enregistrements autorisés
+            return True
+        return normalize_text(result.text) == normalize_text(text)
+
+    def report(self) -> str:
+        return "\n".join("[SPEC] " + stats.line(step) for step, stats in self.stats.items())
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False)
+
+
+def create_speculator(
+    enabled: bool,
+    id_to_path: Dict[str, str],
+    records_for_prompt: List[Dict[str, str]],
+    player: Optional[SegmentPlayer] = None,
+    decision_cache: Optional[DecisionCache] = None,
+) -> Optional[Speculator]:
+    """Speculator si activé (option --speculate ou SPECULATE=1), sinon None."""
+    if not enabled and (os.getenv("SPECULATE", "0") or "0").strip() != "1":
+        return None
+    return Speculator(id_to_path, records_for_prompt, player, decision_cache)
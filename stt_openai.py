@@ -1,16 +1,24 @@
 import io
 import os
+import shutil
+import subprocess
 import time
 import wave
-import queue
-import tempfile
 from typing import Optional
 
 import numpy as np
-import sounddevice as sd
 from openai import OpenAI
 import openai
 
+import hedging
+import metrics
+import session_recorder
+import tracing
+from capture import CaptureService, get_capture_service
+from echo_gate import EchoGate, get_echo_gate
+from openai_client import get_client, stt_timeout
+from vad import AdaptiveVAD, create_vad
+
 
 def _float_to_int16(samples: np.ndarray) -> np.ndarray:
     samples = np.clip(samples, -1.0, 1.0)
@@ -28,122 +36,313 @@ def _write_wav_bytes(samples: np.ndarray, sample_rate_hz: int) -> bytes:
     return buf.getvalue()
 
 
-def record_until_silence(
+class UtteranceDetector:
+    """Découpage en tours sur la capture persistante, position par position.
+
+    advance(end) analyse la capture jusqu'à la position end et retourne un tour terminé
+    (vue avec pré-roll, ou copie si echo_gate a retiré des trames), sinon None. Un tour fait
+    uniquement d'auto-écho est compté (stt_calls_avoided) et l'analyse continue. Utilisé par
+    record_utterance (boucle bloquante) et par le runtime asyncio de talk_segments.
+    """
+
+    def __init__(
+        self,
+        capture: CaptureService,
+        threshold_rms: float = 0.010,
+        min_speech_ms: int = 800,
+        silence_ms: int = 1800,
+        max_record_ms: int = 15000,
+        min_duration_s: float = 2.0,
+        vad_kind: Optional[str] = None,
+        preroll_ms: Optional[int] = None,
+        start_position: Optional[int] = None,
+        echo_gate: Optional[EchoGate] = None,
+    ):
+        self.capture = capture
+        self.sample_rate_hz = sample_rate_hz = capture.sample_rate_hz
+        if preroll_ms is None:
+            try:
+                preroll_ms = int(os.getenv("STT_PREROLL_MS", "300"))
+            except Exception:
+                preroll_ms = 300
+        self.vad, self.endpointer = create_vad(
+            vad_kind,
+            sample_rate_hz,
+            max_utterance_ms=max_record_ms,
+            threshold_rms=threshold_rms,
+            min_speech_ms=min_speech_ms,
+            silence_ms=silence_ms,
+            min_duration_s=min_duration_s,
+        )
+        self.frame_len = self.vad.frame_len
+        self.preroll = int(sample_rate_hz * max(0, preroll_ms) / 1000)
+        self.max_samples = max(self.frame_len, int((max_record_ms / 1000) * sample_rate_hz))
+        self.gate = echo_gate if echo_gate is not None else get_echo_gate()
+        self.base = capture.position if start_position is None else max(start_position, capture.oldest_position)
+        self.pos = self.base
+        self._speech_end: Optional[int] = None
+
+    @property
+    def timed_out(self) -> bool:
+        """Vrai si max_record_ms s'est écoulé depuis le début de l'analyse sans fin de tour."""
+        return self.pos - self.base >= self.max_samples
+
+    @property
+    def speech_end(self) -> Optional[int]:
+        """Position de fin de la dernière trame de parole du tour en cours (ou du dernier tour rendu)."""
+        return self._speech_end
+
+    @property
+    def pause_ms(self) -> float:
+        """Durée de non-parole depuis speech_end dans le tour en cours."""
+        return self.endpointer.silence_frames * self.vad.frame_ms
+
+    def advance(self, end: int) -> Optional[np.ndarray]:
+        if end <= self.pos:
+            return None
+        chunk = self.capture.view(self.pos, end)
+        self.pos = end
+        if chunk.size:
+            self.endpointer.update(self.vad.process(chunk))
+        endpointer = self.endpointer
+        if endpointer.started:
+            last = endpointer.end_frame if endpointer.ended else endpointer.frame_index
+            self._speech_end = self.base + (last - endpointer.silence_frames) * self.frame_len
+        else:
+            self._speech_end = None
+        if not endpointer.ended:
+            return None
+        return self._complete()
+
+    def partial(self) -> Optional[np.ndarray]:
+        """Copie du tour en cours jusqu'à speech_end (pré-roll compris, écho retiré), ou None."""
+        if self._speech_end is None or self.endpointer.start_frame is None:
+            return None
+        speech_start = self.base + self.endpointer.start_frame * self.frame_len
+        start = max(speech_start - self.preroll, self.capture.oldest_position)
+        audio = self.capture.view(start, self._speech_end)
+        if self.gate is not None:
+            audio = self.gate.filter(audio, self.capture.time_at(start), self.sample_rate_hz)
+            if audio is None:
+                return None
+        return np.array(audio, dtype=np.float32, copy=True)
+
+    def flush(self) -> np.ndarray:
+        """Termine l'analyse en cours: tour partiel si la parole a commencé, sinon tableau vide."""
+        audio = self._complete()
+        return audio if audio is not None else np.zeros((0,), dtype=np.float32)
+
+    def _rebase(self) -> None:
+        self.base += self.endpointer.frame_index * self.frame_len
+        self.endpointer.reset()
+
+    def _complete(self) -> Optional[np.ndarray]:
+        endpointer = self.endpointer
+        if endpointer.start_frame is None:
+            self._rebase()
+            return np.zeros((0,), dtype=np.float32)
+        speech_start = self.base + endpointer.start_frame * self.frame_len
+        end = self.base + endpointer.end_frame * self.frame_len if endpointer.end_frame is not None else self.pos
+        self._rebase()
+        audio = self.capture.view(speech_start - self.preroll, end)
+        if self.gate is None:
+            self._trace(speech_start)
+            return audio
+        start = max(speech_start - self.preroll, self.capture.oldest_position)
+        kept = self.gate.filter(audio, self.capture.time_at(start), self.sample_rate_hz)
+        if kept is not None:
+            self._trace(speech_start)
+            return kept
+        # Tour fait de notre propre voix (écho Meet): pas de STT, on continue d'écouter
+        session_recorder.vad(speech_start, end, echo=True)
+        metrics.incr("stt_calls_avoided")
+        metrics.incr("stt_seconds_avoided", audio.shape[0] / float(self.sample_rate_hz))
+        print(f"[ECHO] Tour ignoré: {audio.shape[0] / self.sample_rate_hz:.1f} s d'auto-écho.")
+        return None
+
+    def _trace(self, speech_start: int) -> None:
+        """Début de parole (horloge de capture), fin de parole détectée et retard d'endpointing."""
+        now = time.monotonic()
+        tracing.mark("speech_start", self.capture.time_at(speech_start))
+        tracing.mark("speech_end", now)
+        endpoint_ms = None
+        if self._speech_end is not None:
+            endpoint_ms = round((now - self.capture.time_at(self._speech_end)) * 1000.0, 1)
+            tracing.annotate(endpoint_ms=endpoint_ms)
+        session_recorder.vad(speech_start, self._speech_end, endpoint_ms)
+
+
+def record_utterance(
     sample_rate_hz: int = 16000,
     threshold_rms: float = 0.010,
     min_speech_ms: int = 800,
     silence_ms: int = 1800,
     max_record_ms: int = 15000,
     min_duration_s: float = 2.0,
-) -> bytes:
-    """Capture micro jusqu'à silence et retourne un WAV (bytes) mono 16k.
+    vad_kind: Optional[str] = None,
+    preroll_ms: Optional[int] = None,
+    capture: Optional[CaptureService] = None,
+    start_position: Optional[int] = None,
+    echo_gate: Optional[EchoGate] = None,
+) -> np.ndarray:
+    """Attend un tour de parole sur le flux de capture persistant et le retourne (float32 mono).
 
-    Heuristique simple: démarre quand le niveau RMS dépasse le seuil,
-    s'arrête après un certain temps de silence.
+    Le résultat est une vue sans copie sur le tampon circulaire de capture: elle inclut
+    preroll_ms (STT_PREROLL_MS, def: 300) avant le début détecté pour ne pas couper l'attaque
+    des mots. La vue doit être consommée (WAV, copie...) avant que le tampon ne reboucle.
+    start_position: analyse à partir d'une position de capture passée (p.ex. début de parole
+    détecté par barge_in pendant la lecture) au lieu de la position courante.
+    echo_gate (défaut: echo_gate.get_echo_gate(), ECHO_GATE=0 pour désactiver): les trames
+    dominées par notre propre lecture sont retirées (le résultat est alors une copie); un tour
+    fait uniquement d'écho est ignoré sans appel STT et l'écoute continue.
     """
-    # Paramètres dynamiques via env: INPUT_SAMPLE_RATE_HZ et périphérique d'entrée
+    capture = capture or get_capture_service(sample_rate_hz)
+    detector = UtteranceDetector(
+        capture,
+        threshold_rms=threshold_rms,
+        min_speech_ms=min_speech_ms,
+        silence_ms=silence_ms,
+        max_record_ms=max_record_ms,
+        min_duration_s=min_duration_s,
+        vad_kind=vad_kind,
+        preroll_ms=preroll_ms,
+        start_position=start_position,
+        echo_gate=echo_gate,
+    )
+    pos = detector.pos
+    while not detector.timed_out:
+        _, pos = capture.wait_read(pos, timeout=1.0)
+        audio = detector.advance(pos)
+        if audio is not None:
+            return audio
+    return detector.flush()
+
+
+def input_capture(sample_rate_hz: int = 16000) -> CaptureService:
+    """Service de capture du processus au taux INPUT_SAMPLE_RATE_HZ (sinon sample_rate_hz)."""
+    # Paramètres dynamiques via env: INPUT_SAMPLE_RATE_HZ (le périphérique est résolu par capture.py)
     try:
         env_sr = int(os.getenv("INPUT_SAMPLE_RATE_HZ", ""))
         if env_sr > 0:
             sample_rate_hz = env_sr
     except Exception:
         pass
+    return get_capture_service(sample_rate_hz)
 
-    channels = 1
-    block_size = 1024
-    started = False
-    below_count = 0
-    above_count = 0
-    buf = []
 
-    silence_blocks = max(1, int((silence_ms / 1000) * sample_rate_hz / block_size))
-    min_speech_blocks = max(1, int((min_speech_ms / 1000) * sample_rate_hz / block_size))
-    max_blocks = max(1, int((max_record_ms / 1000) * sample_rate_hz / block_size))
-    min_blocks = max(1, int((min_duration_s) * sample_rate_hz / block_size))
-
-    q: "queue.Queue[np.ndarray]" = queue.Queue()
+def record_until_silence(
+    sample_rate_hz: int = 16000,
+    threshold_rms: float = 0.010,
+    min_speech_ms: int = 800,
+    silence_ms: int = 1800,
+    max_record_ms: int = 15000,
+    min_duration_s: float = 2.0,
+    vad_kind: Optional[str] = None,
+    start_position: Optional[int] = None,
+) -> bytes:
+    """Capture micro jusqu'à silence et retourne un WAV (bytes) mono 16k.
 
-    def cb(indata, frames, time_info, status):
-        if status:
-            # print(status)
-            pass
-        mono = indata[:, 0] if indata.ndim == 2 else indata
-        q.put_nowait(mono.copy())
-
-    # Résolution optionnelle du périphérique d'entrée depuis env
-    # Essaye dans l'ordre: SD_INPUT_DEVICE, PULSE_SOURCE, PULSE_SOURCE_NAME
-    input_device_name = (
-        os.getenv("SD_INPUT_DEVICE")
-        or os.getenv("PULSE_SOURCE")
-        or os.getenv("PULSE_SOURCE_NAME")
-        or ""
+    La décision parole/silence est déléguée au module vad (STT_VAD=adaptive|rms):
+    - adaptive (défaut): trames de 20 ms, plancher de bruit adaptatif, fin de tour ~300–600 ms
+    - rms: ancienne heuristique (seuil RMS fixe, threshold_rms/min_speech_ms/silence_ms/min_duration_s)
+    La capture reste ouverte entre deux appels (capture.CaptureService) avec pré-roll;
+    start_position reprend un tour déjà commencé (barge-in).
+    """
+    capture = input_capture(sample_rate_hz)
+    audio = record_utterance(
+        capture.sample_rate_hz,
+        threshold_rms=threshold_rms,
+        min_speech_ms=min_speech_ms,
+        silence_ms=silence_ms,
+        max_record_ms=max_record_ms,
+        min_duration_s=min_duration_s,
+        vad_kind=vad_kind,
+        capture=capture,
+        start_position=start_position,
     )
+    return _write_wav_bytes(audio, capture.sample_rate_hz)
+
+
+def _read_wav_samples(wav_bytes: bytes) -> "tuple[np.ndarray, int]":
+    """Décode un WAV mono 16 bits en float32; retourne (échantillons, taux)."""
+    with wave.open(io.BytesIO(wav_bytes), "rb") as wf:
+        sr = wf.getframerate()
+        pcm = np.frombuffer(wf.readframes(wf.getnframes()), dtype=np.int16)
+    return pcm.astype(np.float32) / 32768.0, sr
 
-    device_arg = None
-    try:
-        if input_device_name:
-            devices = sd.query_devices()
-            name_lc = input_device_name.lower()
-            # On privilégie les devices avec canaux d'entrée > 0
-            for idx, dev in enumerate(devices):
-                try:
-                    if dev.get("max_input_channels", 0) <= 0:
-                        continue
-                    dev_name = str(dev.get("name", "")).lower()
-                    if name_lc in dev_name:
-                        device_arg = idx
-                        break
-                except Exception:
-                    continue
-    except Exception:
-        device_arg = None
-
-    with sd.InputStream(
-        samplerate=sample_rate_hz,
-        channels=channels,
-        dtype="float32",
-        blocksize=block_size,
-        callback=cb,
-        device=device_arg,
-    ):
-        blocks_seen = 0
-        start_time = time.time()
-        while blocks_seen < max_blocks:
-            try:
-                block = q.get(timeout=1.0)
-            except queue.Empty:
-                continue
-            blocks_seen += 1
-            rms = float(np.sqrt(np.mean(np.square(block)))) if block.size else 0.0
-            if not started:
-                if rms >= threshold_rms:
-                    above_count += 1
-                else:
-                    above_count = 0
-                if above_count >= min_speech_blocks:
-                    started = True
-                    buf.append(block)
-            else:
-                buf.append(block)
-                if rms < threshold_rms:
-                    below_count += 1
-                else:
-                    below_count = 0
-                total_blocks = len(buf)
-                if below_count >= silence_blocks and total_blocks >= min_blocks:
-                    break
 
-    if not buf:
-        return _write_wav_bytes(np.zeros((0,), dtype=np.float32), sample_rate_hz)
+def trim_silence(samples: np.ndarray, sample_rate_hz: int, margin_ms: int = 150) -> np.ndarray:
+    """Retire le silence de début/fin selon les trames de parole du VAD adaptatif (marge incluse)."""
+    if samples.size == 0:
+        return samples
+    vad = AdaptiveVAD(sample_rate_hz)
+    flags = vad.process(samples)
+    speech = np.nonzero(flags)[0]
+    if speech.size == 0:
+        return samples
+    margin = int(sample_rate_hz * margin_ms / 1000)
+    start = max(0, int(speech[0]) * vad.frame_len - margin)
+    end = min(samples.shape[0], (int(speech[-1]) + 1) * vad.frame_len + margin)
+    return samples[start:end]
 
-    audio = np.concatenate(buf, axis=0).astype(np.float32, copy=False)
-    return _write_wav_bytes(audio, sample_rate_hz)
 
+def encode_audio(samples: np.ndarray, sample_rate_hz: int, codec: str = "flac", bitrate: str = "24k") -> "tuple[bytes, str]":
+    """Encode en mémoire pour l'upload: wav | flac (sans perte) | opus (OGG, débit configurable).
 
-def transcribe_wave(wav_bytes: bytes, client: Optional[OpenAI] = None) -> str:
+    Utilise soundfile si installé, sinon ffmpeg en pipe; repli sur WAV si l'encodage échoue.
+    Retourne (octets, nom de fichier avec l'extension attendue par l'API).
+    """
+    codec = (codec or "wav").lower()
+    if codec in ("flac", "opus"):
+        ext = "flac" if codec == "flac" else "ogg"
+        try:
+            import soundfile as sf
+
+            if codec == "flac":
+                buf = io.BytesIO()
+                sf.write(buf, samples, sample_rate_hz, format="FLAC", subtype="PCM_16")
+                return buf.getvalue(), f"audio.{ext}"
+        except Exception:
+            pass
+        if shutil.which("ffmpeg"):
+            cmd = [
+                "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin",
+                "-f", "s16le", "-ar", str(sample_rate_hz), "-ac", "1", "-i", "pipe:0",
+            ]
+            if codec == "flac":
+                cmd += ["-c:a", "flac", "-f", "flac", "pipe:1"]
+            else:
+                cmd += ["-c:a", "libopus", "-b:a", bitrate, "-application", "voip", "-f", "ogg", "pipe:1"]
+            try:
+                proc = subprocess.run(
+                    cmd,
+                    input=_float_to_int16(samples).tobytes(),
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                    check=True,
+                )
+                if proc.stdout:
+                    return proc.stdout, f"audio.{ext}"
+            except Exception as e:
+                print(f"[STT] Encodage {codec} impossible ({e}); envoi en WAV.")
+    return _write_wav_bytes(samples, sample_rate_hz), "audio.wav"
+
+
+def transcribe_wave(
+    wav_bytes: bytes,
+    client: Optional[OpenAI] = None,
+    codec: Optional[str] = None,
+    trim: Optional[bool] = None,
+) -> str:
     """Envoie un WAV mono 16k à OpenAI Whisper et retourne le texte.
 
+    L'upload part d'un tampon mémoire (pas de fichier temporaire):
+    - codec: wav | flac | opus (STT_UPLOAD_CODEC, def: flac; débit opus STT_OPUS_BITRATE, def: 24k)
+    - trim: retire le silence de début/fin d'après le VAD (STT_TRIM_SILENCE, def: 1)
+    Octets économisés et latence STT sont enregistrés dans metrics.
+
     Garde-fous:
+    - Budget de latence du tour et hedging (hedging.py): hors budget, retourne "".
     - Si l'audio est trop court (< ~0.1s), ne pas appeler l'API et retourner "".
     - Intercepte l'erreur BadRequestError (audio trop court) et retourne "".
     """
@@ -152,19 +351,49 @@ def transcribe_wave(wav_bytes: bytes, client: Optional[OpenAI] = None) -> str:
     if not wav_bytes or len(wav_bytes) < MIN_WAV_BYTES_FOR_100MS:
         return ""
 
-    client = client or OpenAI()
+    if codec is None:
+        codec = os.getenv("STT_UPLOAD_CODEC", "flac") or "flac"
+    if trim is None:
+        trim = (os.getenv("STT_TRIM_SILENCE", "1") or "1").strip() != "0"
+
+    samples, sr = _read_wav_samples(wav_bytes)
+    if trim:
+        samples = trim_silence(samples, sr)
+        if samples.shape[0] < sr // 10:
+            return ""
+    payload, filename = encode_audio(samples, sr, codec, os.getenv("STT_OPUS_BITRATE", "24k") or "24k")
+
+    client = client or get_client()
+    t0 = time.monotonic()
+    tracing.mark("stt_request", t0)
     try:
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=True) as tmp:
-            tmp.write(wav_bytes)
-            tmp.flush()
-            tmp.seek(0)
-            with open(tmp.name, "rb") as f:
-                tr = client.audio.transcriptions.create(model="whisper-1", file=f)
+        # Budget du tour et requête dupliquée au-delà du percentile de latence (hedging.py)
+        tr = hedging.call(
+            "stt",
+            lambda timeout: hedging.no_retry(client).audio.transcriptions.create(
+                model="whisper-1",
+                file=(filename, payload),
+                timeout=timeout,
+            ),
+            stt_timeout(),
+        )
         text = (tr.text or "").strip()
-        return text
+    except hedging.BudgetExceeded:
+        # Hors budget: le tour est traité comme inaudible (repli de l'appelant)
+        return ""
     except openai.BadRequestError as e:  # p.ex. audio_too_short
         # Optionnel: afficher une info de debug non bloquante
         print("[STT] Requête ignorée (audio trop court).")
         return ""
-
-
+    finally:
+        t1 = time.monotonic()
+        tracing.mark("stt_response", t1)
+        latency_ms = (t1 - t0) * 1000.0
+        metrics.incr("stt_upload_bytes", len(payload))
+        metrics.incr("stt_upload_bytes_saved", len(wav_bytes) - len(payload))
+        metrics.observe("stt_latency_ms", latency_ms)
+        print(
+            f"[STT] Upload {len(wav_bytes) // 1024} Ko → {len(payload) // 1024} Ko ({filename}), "
+            f"{latency_ms:.0f} ms"
+        )
+    return text
@@ -3,12 +3,21 @@ import os
 import sys
 import multiprocessing as mp
 from pathlib import Path
-from typing import Tuple
+from typing import Callable, Iterator, Optional, Tuple
 
 import numpy as np
 
 import agent
-from tts_engine import create_coqui_synth
+import metrics
+import session_recorder
+import tracing
+from audio_output import OutputEngine, get_output_engine
+from barge_in import BargeIn, create_barge_in
+from openai_client import warm_up
+from resample import to_48k_mono
+from tts_cache import TtsCache, create_cached_synth, prewarm_phrases
+from tts_engine import create_coqui_stream_synth, create_coqui_synth
+from tts_pipeline import speak_stream
 from stt_openai import record_until_silence, transcribe_wave
 
 
@@ -20,6 +29,12 @@ def main():
 
     parser = argparse.ArgumentParser(description="Agent vocal (Whisper + GPT-4o-mini → FR TTS)")
     parser.add_argument("--device-index", type=int, default=None, help="Index du périphérique de sortie audio (fallback si SD_OUTPUT_DEVICE non défini)")
+    parser.add_argument("--no-stream", action="store_true", help="Désactive le streaming LLM → TTS phrase par phrase (réponse complète puis synthèse)")
+    parser.add_argument("--tts-worker", action="store_true", help="Synthèse XTTS dans un processus dédié (équivaut à TTS_WORKER=1)")
+    parser.add_argument("--no-tts-stream", action="store_true", help="Désactive l'inférence XTTS en flux (phrase synthétisée entièrement avant lecture; équivaut à XTTS_STREAM=0)")
+    parser.add_argument("--barge-in", action="store_true", help="Écoute pendant la réponse et la coupe quand l'interlocuteur parle (équivaut à BARGE_IN=1)")
+    parser.add_argument("--first-chunk-min-chars", type=int, default=None, help="Longueur minimale du premier morceau synthétisé (def: TTS_FIRST_CHUNK_MIN_CHARS ou 24)")
+    session_recorder.add_arguments(parser)
     args = parser.parse_args()
 
     # Charger .env si présent (sans rendre python-dotenv obligatoire)
@@ -33,108 +48,118 @@ def main():
     # Accepter les TOS Coqui XTTS v2 si non défini (CPML)
     os.environ.setdefault("COQUI_TOS_AGREED", "1")
 
+    # Enregistrement (--record-session) ou rejeu (--replay, sans clé ni réseau) de la session
+    session_recorder.start(args, "talk")
+
     if not os.getenv("OPENAI_API_KEY"):
         print("Erreur: OPENAI_API_KEY n'est pas défini dans l'environnement.")
         sys.exit(1)
 
-    synth = create_coqui_synth()
+    # Connexion OpenAI préchauffée pendant le chargement du modèle TTS
+    warm_up()
+    # Endpoint Prometheus local (METRICS_PORT, désactivé par défaut)
+    metrics.start_http_server()
+    use_worker = args.tts_worker or (os.getenv("TTS_WORKER", "0") or "0").strip() == "1"
+    base_synth = create_coqui_synth(use_worker=use_worker)
+    stream_synth = None
+    # Inférence en flux dans le processus principal (modèle partagé avec base_synth)
+    if not use_worker and not args.no_tts_stream and (os.getenv("XTTS_STREAM", "1") or "1").strip() != "0":
+        try:
+            stream_synth = create_coqui_stream_synth()
+        except Exception as e:
+            print(f"[TTS] Inférence en flux indisponible ({e}); synthèse par phrase.")
+    synth = create_cached_synth(base_synth, _to_48k_mono, stream_synth=stream_synth)
+    if isinstance(synth, TtsCache):
+        if stream_synth is not None:
+            stream_synth = synth.stream
+        added = synth.prewarm(prewarm_phrases([agent.NOTHING_HEARD_REPLY]))
+        print(f"[TTS-CACHE] {len(synth)} phrases en cache ({added} nouvelles).")
+    # Sortie persistante: un seul OutputStream pour le bip et les réponses
+    engine = get_output_engine(fallback_device=args.device_index)
+    barge_in = create_barge_in(args.barge_in, engine)
+
     print("Parlez après le bip. Pausez pour terminer la tournure. Ctrl+C pour quitter.")
 
     try:
-        while True:
+        run_conversation(
+            synth,
+            engine,
+            barge_in,
+            stream_synth=stream_synth,
+            stream_llm=not args.no_stream,
+            first_chunk_min_chars=args.first_chunk_min_chars,
+        )
+    except KeyboardInterrupt:
+        print("Au revoir !")
+    finally:
+        session_recorder.finish()
+
+
+def run_conversation(
+    synth: Callable[[str], Tuple[np.ndarray, int]],
+    engine: OutputEngine,
+    barge_in: Optional[BargeIn] = None,
+    stream_synth: Optional[Callable[[str], Iterator[Tuple[np.ndarray, int]]]] = None,
+    stream_llm: bool = True,
+    first_chunk_min_chars: Optional[int] = None,
+) -> None:
+    """Boucle des tours (bip, capture, STT, réponse, synthèse et lecture) jusqu'à Ctrl+C."""
+
+    def play(samples: np.ndarray) -> None:
+        if barge_in is not None:
+            barge_in.play(samples)
+        else:
+            engine.play(samples)
+        tracing.mark("playback_end")
+
+    while True:
+        # Après une interruption, l'interlocuteur parle déjà: pas de bip, capture reprise au début de parole
+        start_position = barge_in.consume() if barge_in is not None else None
+        if start_position is None:
             # Petit bip (440 Hz) pour indiquer l'écoute
-            try:
-                import sounddevice as sd
-
-                out_sr = int(os.getenv("OUTPUT_SAMPLE_RATE_HZ", "48000") or 48000)
-                t = np.linspace(0, 0.1, int(out_sr * 0.1), False)
-                tone = (0.2 * np.sin(2 * np.pi * 440 * t)).astype("float32")
-
-                # Sélection du périphérique via env si disponible
-                device_idx = _resolve_output_device_index(os.getenv("SD_OUTPUT_DEVICE", ""))
-                if device_idx is None:
-                    device_idx = args.device_index
+            engine.beep(440.0, 0.1)
+        tracing.begin_turn("talk")
 
-                sd.play(tone, out_sr, device=device_idx)
-                sd.wait()
-            except Exception:
-                pass
-
-            wav_bytes = record_until_silence()
+        try:
+            wav_bytes = record_until_silence(start_position=start_position)
             text = transcribe_wave(wav_bytes)
+            tracing.annotate(text_chars=len(text))
             if not text:
                 # réponse immédiate
-                reply = "Je n'ai rien entendu. Peux-tu répéter ?"
+                reply = agent.NOTHING_HEARD_REPLY
                 wav, sr = synth(reply)
-                wav_48k = _to_48k_mono(wav, sr)
-                import sounddevice as sd
-                device_idx = _resolve_output_device_index(os.getenv("SD_OUTPUT_DEVICE", ""))
-                if device_idx is None:
-                    device_idx = args.device_index
-                sd.play(wav_48k, 48000, device=device_idx)
-                sd.wait()
+                play(_to_48k_mono(wav, sr))
                 continue
 
-            reply = agent.respond(text)
-            wav, sr = synth(reply)
-            wav_48k = _to_48k_mono(wav, sr)
-            import sounddevice as sd
-            device_idx = _resolve_output_device_index(os.getenv("SD_OUTPUT_DEVICE", ""))
-            if device_idx is None:
-                device_idx = args.device_index
-            sd.play(wav_48k, 48000, device=device_idx)
-            sd.wait()
-
-    except KeyboardInterrupt:
-        print("Au revoir !")
+            if not stream_llm:
+                reply = agent.respond(text)
+                wav, sr = synth(reply)
+                play(_to_48k_mono(wav, sr))
+                continue
 
+            # Streaming: la première phrase est jouée pendant la génération / synthèse des suivantes
+            spoken = speak_stream(
+                agent.respond_stream(text),
+                synth,
+                engine,
+                _to_48k_mono,
+                min_first_chars=first_chunk_min_chars,
+                on_chunk=lambda piece: print(f"[TTS] → {piece}"),
+                stream_synth=stream_synth,
+                barge_in=barge_in,
+            )
+            tracing.mark("playback_end")
+            tracing.annotate(reply_chars=len(spoken))
+        finally:
+            tracing.end_turn()
 
-if __name__ == "__main__":
-    main()
 
 # --- helpers audio output ---
 
-def _resolve_output_device_index(name_or_substr: str) -> "int | None":
-    """Retourne l'index du périphérique de sortie dont le nom contient name_or_substr (insensible à la casse).
-    Si vide ou introuvable, retourne None.
-    """
-    try:
-        if not name_or_substr:
-            return None
-        import sounddevice as sd
-
-        devices = sd.query_devices()
-        target = name_or_substr.lower()
-        for idx, dev in enumerate(devices):
-            try:
-                if dev.get("max_output_channels", 0) <= 0:
-                    continue
-                dev_name = str(dev.get("name", "")).lower()
-                if target in dev_name:
-                    return idx
-            except Exception:
-                continue
-        return None
-    except Exception:
-        return None
-
-
 def _to_48k_mono(wav: np.ndarray, sr: int) -> np.ndarray:
-    """Convertit en mono float32 et rééchantillonne à 48 kHz via interpolation linéaire."""
-    if wav.ndim > 1:
-        wav = np.mean(wav, axis=-1)
-    wav = wav.astype("float32", copy=False)
-    if sr == 48000:
-        return wav
-    if sr <= 0 or wav.size == 0:
-        return wav
-    duration = wav.shape[0] / float(sr)
-    new_len = max(1, int(round(duration * 48000)))
-    # Interpolation linéaire simple
-    x_old = np.linspace(0.0, 1.0, wav.shape[0], endpoint=False)
-    x_new = np.linspace(0.0, 1.0, new_len, endpoint=False)
-    wav_48k = np.interp(x_new, x_old, wav).astype("float32", copy=False)
-    return wav_48k
-
+    """Convertit en mono float32 et rééchantillonne à 48 kHz (polyphase à sinc fenêtré, voir resample.py)."""
+    return to_48k_mono(wav, sr)
 
 
+if __name__ == "__main__":
+    main()
@@ -5,13 +5,24 @@ import subprocess
 import unicodedata
 import re
 import json
+import time
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Sequence, Union
 import os
 import shutil
 
+import hedging
+import metrics
+import session_recorder
+import tracing
+from decision_cache import DecisionCache, create_decision_cache, make_key
+from decision_rules import decide_locally
 from stt_openai import record_until_silence, transcribe_wave
+from segment_player import SegmentPlayer
+from segment_bundle import open_bundle
+from barge_in import BargeIn, create_barge_in
 from openai import OpenAI
+from openai_client import get_client, llm_timeout, warm_up
 
 
 def normalize_text(text: str) -> str:
@@ -99,18 +110,70 @@ def play_audio(filepath: Path) -> None:
     print("Erreur: aucun lecteur audio disponible (afplay/ffplay/play). Installez ffmpeg ou sox.")
 
 
-def play_record(record_id: str, id_to_path: Dict[str, str]) -> bool:
-    path_str = id_to_path.get(record_id)
-    if not path_str:
-        print(f"[AUDIO] Introuvable pour record_id='{record_id}'.")
-        return False
-    path = Path(path_str)
-    if not path.exists():
-        print(f"[AUDIO] Fichier manquant: {path}")
-        return False
-    print(f"Lecture du segment: {path.name}")
-    play_audio(path)
-    return True
+def play_record(
+    record_id: Union[str, Sequence[str]],
+    id_to_path: Dict[str, str],
+    player: Optional[SegmentPlayer] = None,
+    barge_in: Optional[BargeIn] = None,
+) -> List[str]:
+    """Joue un segment ou une liste ordonnée de segments; retourne les record_id effectivement joués.
+
+    Une liste est rendue en un seul flux continu (SegmentPlayer.play_sequence, fondus
+    SEGMENT_CROSSFADE_MS ou silences SEGMENT_GAP_MS) et mise en file en un appel. Un segment
+    introuvable tronque la liste; une interruption (barge_in) ne garde que les segments commencés.
+    """
+    record_ids = [record_id] if isinstance(record_id, str) else list(record_id)
+    paths: List[Path] = []
+    for rid in record_ids:
+        path_str = id_to_path.get(rid)
+        if not path_str:
+            print(f"[AUDIO] Introuvable pour record_id='{rid}'.")
+            break
+        path = Path(path_str)
+        if not path.exists():
+            print(f"[AUDIO] Fichier manquant: {path}")
+            break
+        paths.append(path)
+    record_ids = record_ids[:len(paths)]
+    if not record_ids:
+        return []
+    print(f"Lecture du segment: {' + '.join(path.name for path in paths)}")
+    # Chemin rapide: PCM en mémoire + flux de sortie persistant; ffplay en fallback
+    # (seul le chemin mémoire est interruptible par barge_in)
+    if player is not None:
+        played = player.play_sequence(record_ids, barge_in)
+        if played is not None:
+            tracing.mark("playback_end")
+            tracing.annotate(played=record_ids[:played])
+            session_recorder.event("played", record_ids=record_ids[:played])
+            return record_ids[:played]
+    tracing.mark("first_audio")
+    for path in paths:
+        play_audio(path)
+    tracing.mark("playback_end")
+    tracing.annotate(played=record_ids)
+    session_recorder.event("played", record_ids=record_ids)
+    return record_ids
+
+
+def create_segment_player(id_to_path: Dict[str, str]) -> Optional[SegmentPlayer]:
+    """Crée le lecteur mémoire selon SEGMENT_PLAYER (memory|ffplay, def: memory).
+
+    SEGMENT_PRELOAD=1 (défaut) décode tous les segments au démarrage; 0 = décodage paresseux.
+    Le bundle compilé (SEGMENT_BUNDLE, def: segments/segments.bundle) est mappé s'il existe:
+    les segments qu'il contient ne sont pas décodés.
+    """
+    mode = (os.getenv("SEGMENT_PLAYER", "memory") or "memory").strip().lower()
+    if mode != "memory":
+        return None
+    bundle = open_bundle(Path(__file__).parent / "segments")
+    player = SegmentPlayer(id_to_path, bundle=bundle)
+    if player.bundle is not None:
+        print(f"[AUDIO] Bundle {player.bundle.path.name}: {len(player.bundle)} segments mappés.")
+    if (os.getenv("SEGMENT_PRELOAD", "1") or "1").strip() != "0":
+        count = player.preload()
+        print(f"[AUDIO] {count}/{len(id_to_path)} segments prêts en mémoire.")
+    return player
 
 
 def extract_email(text: str) -> Optional[str]:
@@ -136,10 +199,11 @@ def decide_next_action(
     client: Optional[OpenAI] = None,
 ) -> Dict[str, Any]:
     """
-    Appelle gpt-5-nano et renvoie un dict {action, record_id, variables:{email}, reason}.
+    Appelle gpt-5-nano et renvoie un dict {action, record_id, record_ids, variables:{email}, reason}.
     Utilise JSON strict si possible; fallback à parsing tolérant sinon.
+    Budget du tour épuisé (TURN_BUDGET_MS): décision par défaut du gating (gating_default).
     """
-    client = client or OpenAI()
+    client = client or get_client()
 
     system_prompt = (
         "Tu es un agent de rendez-vous. Objectif: inviter l’interlocuteur au dashboard. "
@@ -147,7 +211,9 @@ def decide_next_action(
         "Si un email complet est détecté, propose action=do_tool avec variables.email. "
         "Si aucun enregistrement ne convient, propose ask_clarification. "
         "Réponds STRICTEMENT en JSON suivant le schéma demandé. "
-        "IMPORTANT: ne propose qu'un record_id appartenant à allowed_record_ids. Si la liste est vide, propose ask_clarification."
+        "IMPORTANT: ne propose qu'un record_id appartenant à allowed_record_ids. Si la liste est vide, propose ask_clarification. "
+        "Pour enchaîner plusieurs enregistrements sans attendre de réponse, donne-les dans l'ordre dans record_ids "
+        "(le premier doit être autorisé)."
     )
 
     user_payload = {
@@ -163,46 +229,218 @@ def decide_next_action(
         "schema": {
             "action": "play_record | do_tool | ask_clarification | end",
             "record_id": "string | null",
+            "record_ids": "[string] | null (optionnel: enchaînement ordonné, joué sans pause)",
             "variables": {"email": "string | null"},
             "reason": "string"
         },
     }
 
     try:
-        resp = client.chat.completions.create(
-            model="gpt-5-nano",
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
-            ],
+        tracing.mark("llm_request")
+        # Budget du tour et hedging (hedging.py); hors budget: décision par défaut du gating
+        resp = hedging.call(
+            "decision",
+            lambda timeout: hedging.no_retry(client).chat.completions.create(
+                model="gpt-5-nano",
+                response_format={"type": "json_object"},
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": json.dumps(user_payload, ensure_ascii=False)},
+                ],
+                timeout=timeout,
+            ),
+            llm_timeout(),
         )
+        tracing.mark("llm_response")
         content = resp.choices[0].message.content or "{}"
         data = json.loads(content)
         # Normalisation minimale
         data.setdefault("action", "ask_clarification")
         data.setdefault("record_id", None)
+        data.setdefault("record_ids", None)
         data.setdefault("variables", {})
         data.setdefault("reason", "")
         if not isinstance(data.get("variables"), dict):
             data["variables"] = {}
         return data
+    except hedging.BudgetExceeded:
+        return gating_default(allowed_record_ids)
     except Exception as e:
         print(f"[LLM] Erreur JSON/LLM: {e}")
         return {"action": "ask_clarification", "record_id": None, "variables": {}, "reason": "fallback"}
 
 
+def gating_default(allowed_record_ids: List[str]) -> Dict[str, Any]:
+    """Décision sans LLM: premier enregistrement autorisé (comme la correction du gating), sinon clarification."""
+    if allowed_record_ids:
+        return {"action": "play_record", "record_id": allowed_record_ids[0], "variables": {}, "reason": "budget"}
+    return {"action": "ask_clarification", "record_id": None, "variables": {}, "reason": "budget"}
+
+
+def play_filler(
+    id_to_path: Dict[str, str],
+    player: Optional[SegmentPlayer] = None,
+    barge_in: Optional[BargeIn] = None,
+) -> bool:
+    """Joue le segment de remplissage (BUDGET_FILLER_SEGMENT, p.ex. « pouvez-vous répéter ? ») s'il existe."""
+    filler = (os.getenv("BUDGET_FILLER_SEGMENT", "") or "").strip()
+    if not filler or filler not in id_to_path:
+        return False
+    return bool(play_record(filler, id_to_path, player, barge_in))
+
+
+def compute_allowed_records(mem: Dict[str, Any], id_to_path: Dict[str, str]) -> List[str]:
+    # Gating simple par état
+    if not mem.get("greeted"):
+        # On commence par Bonjour si disponible, sinon Test_son
+        return [rid for rid in ["Bonjour", "Test_son"] if rid in id_to_path]
+    # Étape 1: Test_son
+    if not mem.get("test_son_done") and "Test_son" in id_to_path:
+        return ["Test_son"]
+    # Étape 2: Raison_rdv
+    if not mem.get("raison_done") and "Raison_rdv" in id_to_path:
+        return ["Raison_rdv"]
+    # Étape 3: Presentez_vous
+    if not mem.get("presentation_received") and "Presentez_vous" in id_to_path:
+        return ["Presentez_vous"]
+    # Étape 4: Merci_presentation (une fois présentation reçue)
+    if mem.get("presentation_received") and not mem.get("merci_done") and "Merci_presentation" in id_to_path:
+        return ["Merci_presentation"]
+    # Étape 5: Demande_email
+    if not mem.get("email_captured") and "Demande_email" in id_to_path:
+        return ["Demande_email"]
+    # Si email capturé: do_tool puis Invitation_done
+    if mem.get("email_captured"):
+        return []  # Le modèle doit proposer do_tool
+    return []
+
+
+# Enchaînements joués dans le même tour que leur prédécesseur (SEGMENT_CHAINS les remplace)
+DEFAULT_SEGMENT_CHAINS = "Merci_presentation>Demande_email"
+# Longueur maximale d'une séquence jouée en un tour
+MAX_SEQUENCE = 6
+
+
+def load_segment_chains() -> Dict[str, List[str]]:
+    """Enchaînements SEGMENT_CHAINS ("A>B>C,D>E"; "0" pour désactiver): record_id → suivants."""
+    spec = (os.getenv("SEGMENT_CHAINS", DEFAULT_SEGMENT_CHAINS) or "").strip()
+    chains: Dict[str, List[str]] = {}
+    if spec == "0":
+        return chains
+    for item in spec.split(","):
+        ids = [rid.strip() for rid in item.split(">") if rid.strip()]
+        for prev, nxt in zip(ids, ids[1:]):
+            chains.setdefault(prev, []).append(nxt)
+    return chains
+
+
+def decision_record_ids(decision: Dict[str, Any]) -> List[str]:
+    """record_id (chaîne ou liste) puis record_ids de la décision, dans l'ordre et sans doublon."""
+    ids: List[str] = []
+    for value in (decision.get("record_id"), decision.get("record_ids")):
+        for rid in [value] if isinstance(value, str) else (value if isinstance(value, list) else []):
+            if isinstance(rid, str) and rid and rid not in ids:
+                ids.append(rid)
+    return ids
+
+
+def mark_played(record_id: str, memory: Dict[str, Any]) -> None:
+    """Met à jour la mémoire après lecture d'un segment."""
+    if record_id == "Test_son":
+        memory["test_son_done"] = True
+    elif record_id == "Raison_rdv":
+        memory["raison_done"] = True
+    elif record_id == "Merci_presentation":
+        memory["presentation_received"] = True
+        memory["merci_done"] = True
+    # Demande_email: en attente de l'email utilisateur
+
+
+def plan_sequence(
+    record_ids: List[str],
+    memory: Dict[str, Any],
+    id_to_path: Dict[str, str],
+    chains: Optional[Dict[str, List[str]]] = None,
+) -> List[str]:
+    """Séquence jouable en un tour à partir de record_ids (premier id déjà validé par le gating).
+
+    Chaque id suivant doit être autorisé par le gating une fois les précédents joués (mémoire
+    simulée); la séquence est prolongée par les enchaînements du dernier id et s'arrête au
+    premier id refusé.
+    """
+    chains = load_segment_chains() if chains is None else chains
+    sim = dict(memory)
+    queue = list(record_ids)
+    planned: List[str] = []
+    i = 0
+    while i < len(queue) and len(planned) < MAX_SEQUENCE:
+        rid = queue[i]
+        if planned:
+            allowed = compute_allowed_records(sim, id_to_path)
+            if rid in planned or rid not in id_to_path or rid not in allowed:
+                break
+        planned.append(rid)
+        mark_played(rid, sim)
+        if i == len(queue) - 1:
+            queue.extend(chains.get(rid, []))
+        i += 1
+    return planned
+
+
+def passes_gating(decision: Dict[str, Any], allowed_record_ids: List[str]) -> bool:
+    """Vrai si la décision respecte le gating (premier record_id autorisé pour play_record)."""
+    if (decision.get("action") or "") != "play_record":
+        return True
+    record_ids = decision_record_ids(decision)
+    if not record_ids:
+        return False
+    return not allowed_record_ids or record_ids[0] in allowed_record_ids
+
+
+def choose_next_action(
+    last_user_text: str,
+    memory: Dict[str, Any],
+    records_for_prompt: List[Dict[str, str]],
+    allowed_record_ids: List[str],
+    client: Optional[OpenAI] = None,
+    cache: Optional[DecisionCache] = None,
+) -> Dict[str, Any]:
+    """Décision du tour: règles locales si l'issue est imposée, puis cache, sinon decide_next_action (LLM).
+
+    Une décision servie par le cache doit passer le gating; seules les décisions LLM valides
+    (hors fallback) y sont stockées. Le chemin emprunté est journalisé ([DECISION]) et compté.
+    """
+    t0 = time.monotonic()
+    decision = decide_locally(last_user_text, memory, allowed_record_ids)
+    path = decision["reason"] if decision else "llm"
+    key = None
+    if decision is None and cache is not None:
+        key = make_key(normalize_text(last_user_text), memory, allowed_record_ids, records_for_prompt)
+        cached = cache.get(key)
+        if cached is not None and passes_gating(cached, allowed_record_ids):
+            decision, path = cached, "cache"
+    if decision is None:
+        decision = decide_next_action(last_user_text, memory, records_for_prompt, allowed_record_ids, client)
+        llm_ms = (time.monotonic() - t0) * 1000.0
+        if key is not None and decision.get("reason") not in ("fallback", "budget") and passes_gating(decision, allowed_record_ids):
+            cache.put(key, decision, llm_ms)
+    elapsed_ms = (time.monotonic() - t0) * 1000.0
+    metrics.incr("decision_path_" + path.split(":")[0])
+    metrics.observe("decision_ms", elapsed_ms)
+    tracing.annotate(decision_path=path, action=decision.get("action"))
+    session_recorder.event("decision", path=path, decision=decision, ms=round(elapsed_ms, 1))
+    print(f"[DECISION] chemin={path} action={decision.get('action')} record_id={decision.get('record_id')} ({elapsed_ms:.0f} ms)")
+    if path == "cache":
+        print(f"[CACHE] {cache.stats_line()}")
+    return decision
+
+
 def beep_short():
-    # Bip simple avec sounddevice si dispo; sinon ignore
+    # Bip simple via le moteur de sortie persistant (tonalité précalculée); sinon ignore
     try:
-        import numpy as np
-        import sounddevice as sd
-
-        fs = 44100
-        t = np.linspace(0, 0.1, int(fs * 0.1), False)
-        tone = (0.2 * np.sin(2 * np.pi * 880 * t)).astype("float32")
-        sd.play(tone, fs)
-        sd.wait()
+        from audio_output import get_output_engine
+
+        get_output_engine().beep(880.0, 0.1)
     except Exception:
         pass
 
@@ -213,6 +451,141 @@ def send_invite(email: str, memory: Dict[str, Any]) -> None:
     memory["invite_sent"] = True
 
 
+def update_memory(text: str, memory: Dict[str, Any]) -> None:
+    """Heuristiques mémoire sur la transcription (présentation, email)."""
+    if not memory.get("presentation_received") and detect_presentation(text):
+        memory["presentation_received"] = True
+
+    if not memory.get("email_captured"):
+        email_fb = extract_email(text)
+        if email_fb:
+            memory["email"] = email_fb
+            memory["email_captured"] = True
+
+
+def execute_decision(
+    decision: Dict[str, Any],
+    allowed: List[str],
+    memory: Dict[str, Any],
+    id_to_path: Dict[str, str],
+    player: Optional[SegmentPlayer] = None,
+    barge_in: Optional[BargeIn] = None,
+) -> bool:
+    """Exécute la décision du tour (lecture, outil...); retourne False si la session se termine."""
+    action = (decision.get("action") or "").strip()
+    record_ids = decision_record_ids(decision)
+    variables = decision.get("variables") or {}
+
+    if action == "play_record":
+        if record_ids:
+            # Enforcement: ne jouer que si autorisé par gating
+            if allowed and record_ids[0] not in allowed:
+                print(f"[GATE] '{record_ids[0]}' non autorisé à cette étape. Autorisés: {allowed}")
+                # forcer le premier autorisé si possible
+                record_ids = [allowed[0]]
+            # Suite de la séquence (record_ids, enchaînements) validée étape par étape
+            sequence = plan_sequence(record_ids, memory, id_to_path)
+            if sequence[:len(record_ids)] != record_ids:
+                print(f"[GATE] Séquence tronquée: {record_ids} → {sequence}")
+            for rid in play_record(sequence, id_to_path, player, barge_in):
+                mark_played(rid, memory)
+        else:
+            print("[LLM] 'play_record' sans record_id valide.")
+
+    elif action == "do_tool":
+        email = variables.get("email") or memory.get("email")
+        if email:
+            send_invite(email, memory)
+            # Confirmation (et éventuels segments demandés) dans le même appel de lecture
+            confirmation = [rid for rid in ["Invitation_done"] + record_ids if rid in id_to_path]
+            if confirmation:
+                play_record(list(dict.fromkeys(confirmation)), id_to_path, player, barge_in)
+            # Arrêt propre après invitation
+            return False
+        else:
+            print("[TOOL] Email manquant pour l'invitation. Demande de clarification.")
+
+    elif action == "ask_clarification":
+        # Pas de TTS ni fillers: on log simplement
+        print("[CLARIF] L'agent demande une clarification (aucun audio dédié).")
+
+    elif action == "end":
+        print("[AGENT] Fin de la session demandée par l'agent.")
+        return False
+
+    else:
+        print(f"[LLM] Action inconnue ou vide: '{action}'.")
+    return True
+
+
+def new_memory() -> Dict[str, Any]:
+    """Mémoire légère d'une nouvelle conversation."""
+    return {
+        "greeted": False,
+        "presentation_received": False,
+        "email_captured": False,
+        "invite_sent": False,
+        "email": None,
+    }
+
+
+def greet(
+    memory: Dict[str, Any],
+    id_to_path: Dict[str, str],
+    player: Optional[SegmentPlayer] = None,
+    barge_in: Optional[BargeIn] = None,
+) -> None:
+    """Début de conversation: joue Bonjour si disponible."""
+    if "Bonjour" in id_to_path:
+        print("[INIT] Lecture de 'Bonjour'.")
+        play_record("Bonjour", id_to_path, player, barge_in)
+        memory["greeted"] = True
+
+
+def run_conversation(
+    memory: Dict[str, Any],
+    id_to_path: Dict[str, str],
+    records_for_prompt: List[Dict[str, str]],
+    player: Optional[SegmentPlayer] = None,
+    decision_cache: Optional[DecisionCache] = None,
+    barge_in: Optional[BargeIn] = None,
+    speculator=None,
+) -> None:
+    """Boucle séquentielle des tours jusqu'à la fin de la conversation (invitation envoyée, action end)."""
+    while True:
+        # Après une interruption, le tour a déjà commencé: pas de bip, capture reprise au début de parole
+        start_position = barge_in.consume() if barge_in is not None else None
+        if start_position is None:
+            beep_short()
+        tracing.begin_turn("talk_segments")
+
+        if speculator is not None:
+            # Capture, STT et décision (anticipée si possible) en un tour; mémoire mise à jour
+            text, decision, allowed = speculator.turn(memory, start_position)
+        else:
+            wav_bytes = record_until_silence(start_position=start_position)
+            text = transcribe_wave(wav_bytes)
+
+            if text:
+                print(f"Reconnu (STT): {text}")
+            else:
+                print("(STT) silence ou inaudible.")
+                # Transcription hors budget: segment de remplissage plutôt qu'une décision à l'aveugle
+                if hedging.missed("stt") and play_filler(id_to_path, player, barge_in):
+                    tracing.end_turn()
+                    continue
+
+            update_memory(text, memory)
+
+            # Décision (règles locales ou LLM) avec gating
+            allowed = compute_allowed_records(memory, id_to_path)
+            decision = choose_next_action(text, memory, records_for_prompt, allowed, cache=decision_cache)
+        keep = execute_decision(decision, allowed, memory, id_to_path, player, barge_in)
+        tracing.end_turn()
+        if not keep:
+            break
+
+
 def main():
     parser = argparse.ArgumentParser(
         description=(
@@ -220,6 +593,19 @@ def main():
         )
     )
     # Plus d'arguments superflus: on utilise les valeurs par défaut plus longues dans stt_openai.record_until_silence
+    parser.add_argument("--barge-in", action="store_true", help="Écoute pendant la lecture et coupe le segment quand l'interlocuteur parle (équivaut à BARGE_IN=1)")
+    parser.add_argument(
+        "--runtime",
+        choices=("sync", "async"),
+        default="sync",
+        help="sync: boucle séquentielle historique; async: étapes asyncio reliées par des files (async_runtime.py)",
+    )
+    parser.add_argument(
+        "--speculate",
+        action="store_true",
+        help="Pré-charge le segment probable et décide sur transcription partielle (speculation.py, équivaut à SPECULATE=1; runtime sync)",
+    )
+    session_recorder.add_arguments(parser)
     args = parser.parse_args()
 
     # Charger .env si présent (sans dépendre de python-dotenv)
@@ -231,10 +617,18 @@ def main():
     except Exception:
         pass
 
+    # Enregistrement (--record-session) ou rejeu (--replay, sans clé ni réseau) de la session
+    session_recorder.start(args, "talk_segments")
+
     if not os.getenv("OPENAI_API_KEY"):
         print("Erreur: OPENAI_API_KEY n'est pas défini dans l'environnement.")
         sys.exit(1)
 
+    # Connexion OpenAI ouverte pendant le chargement des segments (TLS hors du premier tour)
+    warm_up()
+    # Endpoint Prometheus local (METRICS_PORT, désactivé par défaut)
+    metrics.start_http_server()
+
     # Plus de device-index: afplay utilise la sortie système par défaut
 
     segments_dir = Path(__file__).resolve().parent / "segments"
@@ -252,15 +646,14 @@ def main():
 
     id_to_path: Dict[str, str] = manifest["id_to_path"]
     records_for_prompt: List[Dict[str, str]] = manifest["records"]
+    player = create_segment_player(id_to_path)
+    decision_cache = create_decision_cache()
+    barge_in = create_barge_in(args.barge_in, player.engine) if player is not None else None
+    if args.barge_in and player is None:
+        print("[BARGE-IN] Nécessite SEGMENT_PLAYER=memory; désactivé.")
 
     # Mémoire légère
-    memory: Dict[str, Any] = {
-        "greeted": False,
-        "presentation_received": False,
-        "email_captured": False,
-        "invite_sent": False,
-        "email": None,
-    }
+    memory = new_memory()
 
     # Définition de la séquence stricte d'étapes (record_id)
     STEP_ORDER: List[str] = [
@@ -272,113 +665,35 @@ def main():
         # Puis action do_tool (invitation)
     ]
 
-    def compute_allowed_records(mem: Dict[str, Any]) -> List[str]:
-        # Gating simple par état
-        if not mem.get("greeted"):
-            # On commence par Bonjour si disponible, sinon Test_son
-            return [rid for rid in ["Bonjour", "Test_son"] if rid in id_to_path]
-        # Étape 1: Test_son
-        if not mem.get("test_son_done") and "Test_son" in id_to_path:
-            return ["Test_son"]
-        # Étape 2: Raison_rdv
-        if not mem.get("raison_done") and "Raison_rdv" in id_to_path:
-            return ["Raison_rdv"]
-        # Étape 3: Presentez_vous
-        if not mem.get("presentation_received") and "Presentez_vous" in id_to_path:
-            return ["Presentez_vous"]
-        # Étape 4: Merci_presentation (une fois présentation reçue)
-        if mem.get("presentation_received") and not mem.get("merci_done") and "Merci_presentation" in id_to_path:
-            return ["Merci_presentation"]
-        # Étape 5: Demande_email
-        if not mem.get("email_captured") and "Demande_email" in id_to_path:
-            return ["Demande_email"]
-        # Si email capturé: do_tool puis Invitation_done
-        if mem.get("email_captured"):
-            return []  # Le modèle doit proposer do_tool
-        return []
-
     # Début: jouer Bonjour si dispo
-    if "Bonjour" in id_to_path:
-        print("[INIT] Lecture de 'Bonjour'.")
-        play_record("Bonjour", id_to_path)
-        memory["greeted"] = True
+    greet(memory, id_to_path, player, barge_in)
 
     print("Parlez après le bip. Pausez pour terminer votre phrase. Ctrl+C pour quitter.")
 
-    try:
-        while True:
-            beep_short()
-
-            wav_bytes = record_until_silence()
-            text = transcribe_wave(wav_bytes)
+    if args.runtime == "async":
+        from async_runtime import run_async
 
-            if text:
-                print(f"Reconnu (STT): {text}")
-            else:
-                print("(STT) silence ou inaudible.")
+        try:
+            run_async(memory, id_to_path, records_for_prompt, player, decision_cache, barge_in)
+        except KeyboardInterrupt:
+            print("Au revoir !")
+        finally:
+            session_recorder.finish()
+        return
 
-            # Heuristiques mémoire
-            if not memory.get("presentation_received") and detect_presentation(text):
-                memory["presentation_received"] = True
-
-            if not memory.get("email_captured"):
-                email_fb = extract_email(text)
-                if email_fb:
-                    memory["email"] = email_fb
-                    memory["email_captured"] = True
-
-            # Décision LLM avec gating
-            allowed = compute_allowed_records(memory)
-            decision = decide_next_action(text, memory, records_for_prompt, allowed)
-            action = (decision.get("action") or "").strip()
-            record_id = decision.get("record_id")
-            variables = decision.get("variables") or {}
-
-            if action == "play_record":
-                if isinstance(record_id, str) and record_id:
-                    # Enforcement: ne jouer que si autorisé par gating
-                    if allowed and record_id not in allowed:
-                        print(f"[GATE] '{record_id}' non autorisé à cette étape. Autorisés: {allowed}")
-                        # forcer le premier autorisé si possible
-                        record_id = allowed[0]
-                    played = play_record(record_id, id_to_path)
-                    # Mise à jour mémoire simple
-                    if played and record_id == "Test_son":
-                        memory["test_son_done"] = True
-                    if played and record_id == "Raison_rdv":
-                        memory["raison_done"] = True
-                    if played and record_id == "Demande_email":
-                        pass  # en attente email utilisateur
-                    if played and record_id == "Merci_presentation":
-                        memory["presentation_received"] = True
-                else:
-                    print("[LLM] 'play_record' sans record_id valide.")
-
-            elif action == "do_tool":
-                email = variables.get("email") or memory.get("email")
-                if email:
-                    send_invite(email, memory)
-                    # Lecture de confirmation si dispo
-                    if "Invitation_done" in id_to_path:
-                        play_record("Invitation_done", id_to_path)
-                    # Arrêt propre après invitation
-                    break
-                else:
-                    print("[TOOL] Email manquant pour l'invitation. Demande de clarification.")
-
-            elif action == "ask_clarification":
-                # Pas de TTS ni fillers: on log simplement
-                print("[CLARIF] L'agent demande une clarification (aucun audio dédié).")
-
-            elif action == "end":
-                print("[AGENT] Fin de la session demandée par l'agent.")
-                break
+    from speculation import create_speculator
 
-            else:
-                print(f"[LLM] Action inconnue ou vide: '{action}'.")
+    speculator = create_speculator(args.speculate, id_to_path, records_for_prompt, player, decision_cache)
 
+    try:
+        run_conversation(memory, id_to_path, records_for_prompt, player, decision_cache, barge_in, speculator)
     except KeyboardInterrupt:
         print("Au revoir !")
+    finally:
+        if speculator is not None:
+            print(speculator.report())
+            speculator.close()
+        session_recorder.finish()
 
 
 if __name__ == "__main__":
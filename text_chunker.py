@@ -0,0 +1,130 @@
+"""
+Découpage incrémental (FR) d'un flux de tokens LLM en phrases / propositions à synthétiser.
+
+- SentenceChunker.feed(token): accumule et renvoie les morceaux prêts
+- SentenceChunker.flush(): renvoie le reste en fin de flux
+- split_text(text): découpe un texte complet avec les mêmes règles
+"""
+
+import os
+import re
+from typing import Iterable, List, Optional
+
+# Abréviations courantes suivies d'un point qui ne terminent pas une phrase
+ABBREVIATIONS = {
+    "m", "mm", "mme", "mmes", "mlle", "mlles", "dr", "pr", "me", "st", "ste",
+    "etc", "cf", "ex", "env", "av", "apr", "bd", "n", "no", "p", "vol", "tel", "tél",
+    "ca", "càd", "c-a-d", "vs", "min", "max", "h",
+}
+
+# Fin de phrase: ponctuation forte (., !, ?, …) éventuellement suivie de guillemets/parenthèses
+# (espace insécable/typographique français admis avant »), puis un blanc: on ne coupe pas tant
+# que le caractère suivant n'est pas connu ("3.5", "M.Dupont")
+_SENTENCE_END = re.compile(r"(?:\.{3}|[.!?…])+(?:\s?[»\"”’)\]])*(?=\s)")
+# Fin de proposition: virgule, point-virgule, deux-points, tiret long
+_CLAUSE_END = re.compile(r"(?:[,;:]|\s[—–])(?=\s)")
+_WORD_BEFORE = re.compile(r"([\w'’-]+)\.?$", re.UNICODE)
+
+
+def _is_abbreviation(text: str, dot_index: int) -> bool:
+    """Vrai si le point à dot_index termine une abréviation (M., Mme., etc.) ou une initiale (J.)."""
+    if text[dot_index] != ".":
+        return False
+    if dot_index >= 1 and text[dot_index - 1] == ".":
+        return False  # points de suspension
+    m = _WORD_BEFORE.search(text[:dot_index])
+    if not m:
+        return False
+    word = m.group(1)
+    if len(word) == 1 and word.isalpha() and word.isupper():
+        return True
+    return word.lower() in ABBREVIATIONS
+
+
+class SentenceChunker:
+    """Découpe un flux de texte en morceaux synthétisables.
+
+    - Coupe sur les fins de phrase (hors abréviations/initiales).
+    - Coupe sur les fins de proposition si le morceau dépasse clause_min_chars.
+    - Le premier morceau fait au moins min_first_chars caractères (prosodie), sauf fin de flux.
+    - Au-delà de max_chars sans ponctuation, coupe au dernier espace.
+    """
+
+    def __init__(
+        self,
+        min_first_chars: Optional[int] = None,
+        clause_min_chars: int = 40,
+        max_chars: int = 220,
+    ):
+        if min_first_chars is None:
+            try:
+                min_first_chars = int(os.getenv("TTS_FIRST_CHUNK_MIN_CHARS", "24"))
+            except Exception:
+                min_first_chars = 24
+        self.min_first_chars = max(0, int(min_first_chars))
+        self.clause_min_chars = clause_min_chars
+        self.max_chars = max_chars
+        self._buf = ""
+        self._emitted = 0
+
+    def _min_len(self) -> int:
+        return self.min_first_chars if self._emitted == 0 else 1
+
+    def _next_cut(self) -> int:
+        """Position de coupe dans le tampon, ou -1 si aucun morceau n'est prêt."""
+        buf = self._buf
+        min_len = self._min_len()
+        candidates = []
+        for m in _SENTENCE_END.finditer(buf):
+            dot = m.group(0).rfind(".")
+            if dot >= 0 and _is_abbreviation(buf, m.start() + dot):
+                continue
+            candidates.append((m.end(), min_len))
+        for m in _CLAUSE_END.finditer(buf):
+            candidates.append((m.end(), max(min_len, self.clause_min_chars)))
+        for end, needed in sorted(candidates):
+            if len(buf[:end].strip()) >= needed:
+                return end
+        if len(buf) > self.max_chars:
+            cut = buf.rfind(" ", 0, self.max_chars)
+            return cut if cut > 0 else self.max_chars
+        return -1
+
+    def feed(self, token: str) -> List[str]:
+        """Ajoute un token; retourne les morceaux complets (éventuellement aucun)."""
+        if token:
+            self._buf += token
+        out: List[str] = []
+        while True:
+            cut = self._next_cut()
+            if cut < 0:
+                break
+            piece = self._buf[:cut].strip()
+            self._buf = self._buf[cut:]
+            if piece:
+                out.append(piece)
+                self._emitted += 1
+        return out
+
+    def flush(self) -> List[str]:
+        """Fin de flux: retourne le texte restant."""
+        piece = self._buf.strip()
+        self._buf = ""
+        if not piece:
+            return []
+        self._emitted += 1
+        return [piece]
+
+
+def split_text(text: str, min_first_chars: Optional[int] = None) -> List[str]:
+    """Découpe un texte complet en morceaux (mêmes règles que le flux)."""
+    chunker = SentenceChunker(min_first_chars=min_first_chars)
+    return chunker.feed(text) + chunker.flush()
+
+
+def iter_chunks(tokens: Iterable[str], min_first_chars: Optional[int] = None):
+    """Générateur: tokens LLM → morceaux de phrases."""
+    chunker = SentenceChunker(min_first_chars=min_first_chars)
+    for token in tokens:
+        yield from chunker.feed(token)
+    yield from chunker.flush()
@@ -0,0 +1,175 @@
+"""
+Traces de latence par tour de conversation (talk.py, talk_segments.py).
+
+Chaque tour horodate ses étapes (horloge time.monotonic, celle de capture.time_at):
+
+    speech_start → speech_end (fin de parole détectée) → stt_request → stt_response
+    → llm_request → llm_response → first_audio (premier échantillon mis en file) → playback_end
+
+Les modules profonds marquent les étapes sans paramètre supplémentaire (mark(), sans effet
+hors d'un tour); une étape déjà marquée garde son premier horodatage (sauf playback_end).
+end_turn() écrit un enregistrement JSONL compact (TRACE_PATH, def: ~/.cache/tts-agent/turns.jsonl;
+TRACE=0 pour ne rien écrire) et alimente les histogrammes de metrics (turn_<intervalle>_ms);
+l'enregistrement est aussi ajouté à la session enregistrée ou rejouée (session_recorder).
+
+Un seul tour est actif à la fois: le runtime asyncio de talk_segments, où les tours se
+chevauchent, n'ouvre pas de tour (marques ignorées). Sous host.py, chaque session (portée
+session_scope) a son propre tour en cours et l'enregistrement porte le champ session.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+import metrics
+import session_recorder
+import session_scope
+
+STAGES = (
+    "speech_start",
+    "speech_end",
+    "stt_request",
+    "stt_response",
+    "llm_request",
+    "llm_response",
+    "first_audio",
+    "playback_end",
+)
+# Étapes dont on garde le dernier horodatage (les autres gardent le premier)
+_LAST_WINS = {"playback_end"}
+
+# Intervalles publiés dans metrics: nom → (début, fin); le premier début présent est utilisé
+SPANS = {
+    "stt": (("stt_request",), "stt_response"),
+    "llm": (("llm_request",), "llm_response"),
+    "audio": (("llm_response", "stt_response", "speech_end"), "first_audio"),
+    "response": (("speech_end",), "first_audio"),
+    "playback": (("first_audio",), "playback_end"),
+    "total": (("speech_start", "speech_end"), "playback_end"),
+}
+
+
+class TurnTrace:
+    """Horodatages et attributs d'un tour."""
+
+    def __init__(self, script: str, index: int):
+        self.script = script
+        self.index = index
+        self.wall_start = time.time()
+        self.marks: Dict[str, float] = {}
+        self.fields: Dict[str, Any] = {}
+
+    def mark(self, stage: str, t: Optional[float] = None) -> None:
+        if stage in self.marks and stage not in _LAST_WINS:
+            return
+        self.marks[stage] = time.monotonic() if t is None else float(t)
+
+    def spans(self) -> Dict[str, float]:
+        spans: Dict[str, float] = {}
+        for name, (starts, end) in SPANS.items():
+            start = next((s for s in starts if s in self.marks), None)
+            if start is not None and end in self.marks:
+                spans[name] = (self.marks[end] - self.marks[start]) * 1000.0
+        return spans
+
+    def record(self) -> Dict[str, Any]:
+        origin = min(self.marks.values()) if self.marks else 0.0
+        return {
+            "ts": round(self.wall_start, 3),
+            "script": self.script,
+            "turn": self.index,
+            "marks": {k: round((v - origin) * 1000.0, 1) for k, v in sorted(self.marks.items(), key=lambda kv: kv[1])},
+            "spans": {k: round(v, 1) for k, v in self.spans().items()},
+            **self.fields,
+        }
+
+
+class _TurnSlot:
+    """Tour en cours du processus ou d'une session."""
+
+    turn: Optional[TurnTrace] = None
+
+
+_lock = threading.Lock()
+_process_slot = _TurnSlot()
+_count = 0
+_file = None
+
+
+def _slot() -> _TurnSlot:
+    scope = session_scope.current()
+    return _process_slot if scope is None else scope.get("trace", _TurnSlot)
+
+
+def _trace_file():
+    global _file
+    if _file is None:
+        if (os.getenv("TRACE", "1") or "1").strip() == "0":
+            _file = False
+        else:
+            path = Path(os.getenv("TRACE_PATH") or Path.home() / ".cache" / "tts-agent" / "turns.jsonl").expanduser()
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _file = open(path, "a", encoding="utf-8", buffering=1)
+            except OSError as e:
+                print(f"[TRACE] Écriture impossible ({e}); traces désactivées.")
+                _file = False
+    return _file or None
+
+
+def begin_turn(script: str) -> TurnTrace:
+    """Ouvre un nouveau tour (le tour précédent non terminé est abandonné)."""
+    global _count
+    scope = session_scope.current()
+    slot = _slot()
+    with _lock:
+        _count += 1
+        slot.turn = TurnTrace(script, _count)
+        if scope is not None:
+            slot.turn.fields["session"] = scope.name
+        return slot.turn
+
+
+def current() -> Optional[TurnTrace]:
+    return _slot().turn
+
+
+def mark(stage: str, t: Optional[float] = None) -> None:
+    """Horodate une étape du tour en cours (t: instant time.monotonic, def: maintenant)."""
+    turn = _slot().turn
+    if turn is not None:
+        with _lock:
+            turn.mark(stage, t)
+
+
+def annotate(**fields: Any) -> None:
+    """Ajoute des attributs au tour en cours (chemin de décision, segments joués...)."""
+    turn = _slot().turn
+    if turn is not None:
+        with _lock:
+            turn.fields.update(fields)
+
+
+def end_turn() -> Optional[Dict[str, Any]]:
+    """Termine le tour: enregistrement JSONL et histogrammes turn_<intervalle>_ms."""
+    slot = _slot()
+    with _lock:
+        turn, slot.turn = slot.turn, None
+    if turn is None or not turn.marks:
+        return None
+    record = turn.record()
+    for name, value in record["spans"].items():
+        metrics.observe(f"turn_{name}_ms", value)
+    if isinstance(record.get("endpoint_ms"), (int, float)):
+        metrics.observe("turn_endpoint_ms", record["endpoint_ms"])
+    session_recorder.event("turn", **record)
+    f = _trace_file()
+    if f is not None:
+        try:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+        except Exception as e:
+            print(f"[TRACE] Écriture échouée: {e}")
+    return record
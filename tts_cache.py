@@ -0,0 +1,228 @@
+"""
+Cache de formes d'onde TTS adressé par contenu.
+
+Clé = sha256(texte, modèle, langue, voix). Les entrées sont des .npy 48 kHz mono (float32 ou
+int16, TTS_CACHE_DTYPE) chargés en memory-map; la taille totale est bornée (TTS_CACHE_MAX_MB)
+avec éviction LRU. prewarm() synthétise au démarrage les phrases fréquentes. stream() sert
+les entrées en cache d'un bloc et, sinon, relaie la synthèse en flux tout en l'enregistrant.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import metrics
+from resample import stream_resample
+from tts_engine import DEFAULT_LANGUAGE, DEFAULT_MODEL_NAME, resolve_speaker
+
+Synthesizer = Callable[[str], Tuple[np.ndarray, int]]
+StreamSynthesizer = Callable[[str], Iterator[Tuple[np.ndarray, int]]]
+Resampler = Callable[[np.ndarray, int], np.ndarray]
+
+CACHE_SAMPLE_RATE_HZ = 48000
+
+
+def _voice_id(speaker: Optional[str], speaker_wav: Optional[str]) -> str:
+    """Identité de la voix: nom intégré, ou empreinte du fichier de référence."""
+    if speaker_wav:
+        try:
+            return "wav:" + hashlib.sha256(Path(speaker_wav).read_bytes()).hexdigest()[:16]
+        except Exception:
+            return "wav:" + speaker_wav
+    return speaker or ""
+
+
+class TtsCache:
+    """Enveloppe un synthétiseur: text → (waveform 48 kHz, 48000), avec cache disque."""
+
+    def __init__(
+        self,
+        synth: Synthesizer,
+        to_output: Resampler,
+        cache_dir: Path,
+        model_name: str = DEFAULT_MODEL_NAME,
+        language: str = DEFAULT_LANGUAGE,
+        speaker: Optional[str] = None,
+        speaker_wav: Optional[str] = None,
+        max_bytes: int = 512 * 1024 * 1024,
+        dtype: str = "float32",
+        stream_synth: Optional[StreamSynthesizer] = None,
+    ):
+        self.synth = synth
+        self.stream_synth = stream_synth
+        self.to_output = to_output
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.model_name = model_name
+        self.language = language
+        self.voice = _voice_id(*resolve_speaker(speaker, speaker_wav))
+        self.max_bytes = int(max_bytes)
+        self.dtype = np.int16 if dtype == "int16" else np.float32
+        self._lock = threading.Lock()
+        # clé → taille en octets, du moins récemment utilisé au plus récent
+        self._index: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        entries = []
+        for path in self.cache_dir.glob("*.npy"):
+            try:
+                st = path.stat()
+                entries.append((st.st_mtime, path.stem, st.st_size))
+            except OSError:
+                continue
+        for _, key, size in sorted(entries):
+            self._index[key] = size
+            self._total += size
+        self._evict()
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def key(self, text: str) -> str:
+        ident = [text.strip(), self.model_name, self.language, self.voice]
+        return hashlib.sha256(json.dumps(ident, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npy"
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            try:
+                self._path(key).unlink()
+            except OSError:
+                pass
+
+    def _load(self, key: str) -> Optional[np.ndarray]:
+        path = self._path(key)
+        try:
+            wav = np.load(path, mmap_mode="r")
+        except Exception:
+            return None
+        try:
+            os.utime(path)  # récence persistée pour l'éviction au prochain démarrage
+        except OSError:
+            pass
+        if wav.dtype == np.int16:
+            return wav.astype(np.float32) / 32767.0
+        return wav
+
+    def _store(self, key: str, wav: np.ndarray) -> None:
+        data = (np.clip(wav, -1.0, 1.0) * 32767.0).astype(np.int16) if self.dtype == np.int16 else wav.astype(np.float32, copy=False)
+        path = self._path(key)
+        tmp = path.with_name(f"{key}.{os.getpid()}.tmp.npy")
+        try:
+            np.save(tmp, data)
+            os.replace(tmp, path)
+        except Exception as e:
+            print(f"[TTS-CACHE] Écriture impossible: {e}")
+            return
+        with self._lock:
+            size = path.stat().st_size
+            self._total += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def get(self, text: str) -> Optional[np.ndarray]:
+        key = self.key(text)
+        with self._lock:
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        return self._load(key)
+
+    def __call__(self, text: str) -> Tuple[np.ndarray, int]:
+        wav = self.get(text)
+        if wav is not None:
+            metrics.incr("tts_cache_hits")
+            return wav, CACHE_SAMPLE_RATE_HZ
+        metrics.incr("tts_cache_misses")
+        raw, sr = self.synth(text)
+        wav = self.to_output(raw, sr)
+        self._store(self.key(text), wav)
+        return wav, CACHE_SAMPLE_RATE_HZ
+
+    def stream(self, text: str) -> Iterator[Tuple[np.ndarray, int]]:
+        """Comme __call__, en morceaux 48 kHz: la phrase est enregistrée une fois le flux terminé."""
+        wav = self.get(text)
+        if wav is not None:
+            metrics.incr("tts_cache_hits")
+            yield wav, CACHE_SAMPLE_RATE_HZ
+            return
+        if self.stream_synth is None:
+            yield self(text)
+            return
+        metrics.incr("tts_cache_misses")
+        parts: List[np.ndarray] = []
+        for chunk in stream_resample(self.stream_synth(text), CACHE_SAMPLE_RATE_HZ):
+            parts.append(chunk)
+            yield chunk, CACHE_SAMPLE_RATE_HZ
+        if parts:
+            self._store(self.key(text), np.concatenate(parts))
+
+    def prewarm(self, phrases: Iterable[str]) -> int:
+        """Synthétise les phrases absentes du cache; retourne le nombre de nouvelles entrées."""
+        added = 0
+        for phrase in phrases:
+            phrase = phrase.strip()
+            if not phrase or self.get(phrase) is not None:
+                continue
+            try:
+                self(phrase)
+                added += 1
+            except Exception as e:
+                print(f"[TTS-CACHE] Préchauffage échoué pour '{phrase[:40]}': {e}")
+        return added
+
+
+def prewarm_phrases(defaults: Iterable[str] = ()) -> List[str]:
+    """Phrases à préchauffer: defaults + TTS_CACHE_PREWARM (séparées par |) + TTS_CACHE_PREWARM_FILE (une par ligne)."""
+    phrases = [p for p in defaults if p]
+    phrases += [p.strip() for p in (os.getenv("TTS_CACHE_PREWARM") or "").split("|") if p.strip()]
+    path = os.getenv("TTS_CACHE_PREWARM_FILE")
+    if path:
+        try:
+            phrases += [line.strip() for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+        except Exception as e:
+            print(f"[TTS-CACHE] Fichier de préchauffage illisible: {e}")
+    return list(dict.fromkeys(phrases))
+
+
+def create_cached_synth(
+    synth: Synthesizer,
+    to_output: Resampler,
+    model_name: str = DEFAULT_MODEL_NAME,
+    language: str = DEFAULT_LANGUAGE,
+    stream_synth: Optional[StreamSynthesizer] = None,
+) -> Synthesizer:
+    """Enveloppe synth avec le cache selon l'environnement (TTS_CACHE=0 pour désactiver).
+
+    TTS_CACHE_DIR (def: ~/.cache/tts-agent/tts), TTS_CACHE_MAX_MB (def: 512), TTS_CACHE_DTYPE (float32|int16).
+    """
+    if (os.getenv("TTS_CACHE", "1") or "1").strip() == "0":
+        return synth
+    cache_dir = Path(os.getenv("TTS_CACHE_DIR") or Path.home() / ".cache" / "tts-agent" / "tts")
+    try:
+        max_mb = float(os.getenv("TTS_CACHE_MAX_MB", "512"))
+    except Exception:
+        max_mb = 512.0
+    try:
+        return TtsCache(
+            synth,
+            to_output,
+            cache_dir,
+            model_name=model_name,
+            language=language,
+            max_bytes=int(max_mb * 1024 * 1024),
+            dtype=(os.getenv("TTS_CACHE_DTYPE", "float32") or "float32").strip().lower(),
+            stream_synth=stream_synth,
+        )
+    except Exception as e:
+        print(f"[TTS-CACHE] Cache indisponible ({e}); synthèse directe.")
+        return synth
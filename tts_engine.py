@@ -1,20 +1,296 @@
-from typing import Optional, Callable, Tuple
+"""
+Synthèse Coqui XTTS v2.
+
+- create_coqui_synth(...): text → (waveform, sample_rate), bloquant
+- create_coqui_stream_synth(...): text → itérateur de (morceau, sample_rate) au fil de
+  l'inférence XTTS (inference_stream), pour un premier son avant la fin de la phrase
+- load_tts(model_name): modèle chargé une fois par processus, partagé par les deux API
+- get_conditioning_latents(...): latents de voix calculés une fois, cachés sur disque par
+  empreinte de l'audio de référence (XTTS_LATENTS_DIR)
+- apply_cpu_profile(tts): profil CPU optionnel (XTTS_CPU_PROFILE=1): quantification int8
+  dynamique du décodeur GPT, threads torch fixés, inférence sous torch.inference_mode()
+"""
+
+import hashlib
+import os
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
 import numpy as np
-from TTS.api import TTS
+
+import metrics
+
+DEFAULT_MODEL_NAME = "tts_models/multilingual/multi-dataset/xtts_v2"
+DEFAULT_LANGUAGE = "fr"
+DEFAULT_STREAM_CHUNK_SIZE = 20
+
+_models: Dict[str, Any] = {}
+_models_lock = threading.Lock()
+_latents: Dict[Tuple[str, str], Tuple[Any, Any]] = {}
+_latents_lock = threading.Lock()
+_profiled: Dict[int, bool] = {}
+
+
+def resolve_speaker(speaker: Optional[str] = None, speaker_wav: Optional[str] = None) -> Tuple[Optional[str], Optional[str]]:
+    """Voix XTTS: (nom de locuteur intégré, chemin d'audio de référence), XTTS_SPEAKER / XTTS_SPEAKER_WAV par défaut."""
+    speaker = speaker or os.getenv("XTTS_SPEAKER") or None
+    speaker_wav = speaker_wav or os.getenv("XTTS_SPEAKER_WAV") or None
+    return speaker, speaker_wav
+
+
+def load_tts(model_name: str = DEFAULT_MODEL_NAME) -> Any:
+    """Instance TTS.api.TTS partagée du processus (chargée au premier appel)."""
+    with _models_lock:
+        tts = _models.get(model_name)
+        if tts is None:
+            from TTS.api import TTS
+
+            tts = TTS(model_name)
+            if cpu_profile_enabled():
+                apply_cpu_profile(tts)
+            _models[model_name] = tts
+        return tts
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def cpu_profile_enabled() -> bool:
+    return (os.getenv("XTTS_CPU_PROFILE", "0") or "0").strip() == "1"
+
+
+def _conv1d_to_linear(module: Any) -> int:
+    """Remplace les Conv1D de transformers (GPT-2) par des nn.Linear équivalents; retourne le nombre remplacé.
+
+    Le GPT-2 de XTTS utilise Conv1D (poids (in, out)) pour l'attention et le MLP: sans cette
+    conversion, quantize_dynamic({nn.Linear}) ne toucherait que les têtes du modèle.
+    """
+    import torch
+    from torch import nn
+
+    replaced = 0
+    for name, child in list(module.named_children()):
+        if type(child).__name__ == "Conv1D" and hasattr(child, "nf"):
+            weight = child.weight
+            linear = nn.Linear(weight.shape[0], weight.shape[1], bias=child.bias is not None)
+            with torch.no_grad():
+                linear.weight.copy_(weight.t())
+                if child.bias is not None:
+                    linear.bias.copy_(child.bias)
+            setattr(module, name, linear)
+            replaced += 1
+        else:
+            replaced += _conv1d_to_linear(child)
+    return replaced
+
+
+def apply_cpu_profile(
+    tts: Any,
+    quantize: Optional[bool] = None,
+    num_threads: Optional[int] = None,
+    interop_threads: Optional[int] = None,
+) -> Any:
+    """Profil CPU: threads torch, quantification int8 dynamique des couches linéaires du GPT XTTS.
+
+    XTTS_QUANTIZE (def: 1), XTTS_NUM_THREADS (def: nombre de CPU - 1, un cœur restant aux
+    callbacks audio / réseau), XTTS_INTEROP_THREADS (def: 1). Idempotent par modèle.
+    """
+    import torch
+    from torch import nn
+
+    if quantize is None:
+        quantize = (os.getenv("XTTS_QUANTIZE", "1") or "1").strip() != "0"
+    if num_threads is None:
+        num_threads = _env_int("XTTS_NUM_THREADS", max(1, (os.cpu_count() or 2) - 1))
+    if interop_threads is None:
+        interop_threads = _env_int("XTTS_INTEROP_THREADS", 1)
+    torch.set_num_threads(max(1, num_threads))
+    try:
+        torch.set_num_interop_threads(max(1, interop_threads))
+    except RuntimeError:
+        pass  # déjà fixé (travail parallèle déjà lancé dans ce processus)
+
+    model = tts.synthesizer.tts_model
+    if id(model) in _profiled:
+        return tts
+    model.eval()
+    if quantize and hasattr(model, "gpt"):
+        converted = _conv1d_to_linear(model.gpt)
+        torch.quantization.quantize_dynamic(model.gpt, {nn.Linear}, dtype=torch.qint8, inplace=True)
+        print(f"[TTS] Profil CPU: GPT quantifié int8 ({converted} Conv1D convertis), {num_threads} threads.")
+    else:
+        print(f"[TTS] Profil CPU: {num_threads} threads, sans quantification.")
+    _profiled[id(model)] = True
+    return tts
+
+
+def _inference_context() -> Any:
+    """torch.inference_mode() sous le profil CPU, sinon rien."""
+    if not cpu_profile_enabled():
+        return nullcontext()
+    import torch
+
+    return torch.inference_mode()
+
+
+def _output_sample_rate(tts: Any) -> int:
+    return int(getattr(getattr(tts, "synthesizer", None), "output_sample_rate", 24000))
+
+
+def _latents_dir() -> Path:
+    return Path(os.getenv("XTTS_LATENTS_DIR") or Path.home() / ".cache" / "tts-agent" / "latents")
+
+
+def get_conditioning_latents(
+    tts: Any,
+    model_name: str = DEFAULT_MODEL_NAME,
+    speaker: Optional[str] = None,
+    speaker_wav: Optional[str] = None,
+) -> Tuple[Any, Any]:
+    """(gpt_cond_latent, speaker_embedding) de la voix, calculés une seule fois.
+
+    Audio de référence: clé = sha256(modèle, contenu du fichier), mémoire puis disque
+    (torch.save); sinon locuteur intégré (XTTS_SPEAKER ou premier disponible).
+    """
+    model = tts.synthesizer.tts_model
+    speaker, speaker_wav = resolve_speaker(speaker, speaker_wav)
+    if speaker_wav:
+        digest = hashlib.sha256(model_name.encode("utf-8") + b"\0" + Path(speaker_wav).read_bytes()).hexdigest()[:32]
+        key = ("wav", digest)
+    else:
+        speakers = model.speaker_manager.speakers
+        name = speaker if speaker in speakers else next(iter(speakers))
+        key = ("speaker", name)
+    with _latents_lock:
+        cached = _latents.get(key)
+    if cached is not None:
+        return cached
+
+    if key[0] == "speaker":
+        entry = model.speaker_manager.speakers[key[1]]
+        latents = (entry["gpt_cond_latent"], entry["speaker_embedding"])
+    else:
+        import torch
+
+        path = _latents_dir() / f"{key[1]}.pt"
+        latents = None
+        if path.exists():
+            try:
+                data = torch.load(path, map_location="cpu")
+                latents = (data["gpt_cond_latent"], data["speaker_embedding"])
+            except Exception as e:
+                print(f"[TTS] Latents de voix illisibles ({e}); recalcul.")
+        if latents is None:
+            t0 = time.perf_counter()
+            latents = model.get_conditioning_latents(audio_path=[speaker_wav])
+            print(f"[TTS] Latents de voix calculés en {(time.perf_counter() - t0) * 1000:.0f} ms.")
+            try:
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp")
+                torch.save({"gpt_cond_latent": latents[0], "speaker_embedding": latents[1]}, tmp)
+                os.replace(tmp, path)
+            except Exception as e:
+                print(f"[TTS] Latents de voix non sauvegardés: {e}")
+    with _latents_lock:
+        _latents[key] = latents
+    return latents
 
 
 def create_coqui_synth(
-    model_name: str = "tts_models/multilingual/multi-dataset/xtts_v2",
-    language: str = "fr",
+    model_name: str = DEFAULT_MODEL_NAME,
+    language: str = DEFAULT_LANGUAGE,
+    speaker: Optional[str] = None,
+    speaker_wav: Optional[str] = None,
+    use_worker: Optional[bool] = None,
 ) -> Callable[[str], Tuple[np.ndarray, int]]:
-    """Retourne une fonction de synthèse Coqui XTTS v2 → (waveform, sample_rate)."""
-    tts = TTS(model_name)
+    """Retourne une fonction de synthèse Coqui XTTS v2 → (waveform, sample_rate).
+
+    use_worker (défaut: TTS_WORKER=1): le modèle est chargé dans un processus dédié
+    (tts_worker.TtsWorker) et les formes d'onde reviennent par mémoire partagée.
+    """
+    if use_worker is None:
+        use_worker = (os.getenv("TTS_WORKER", "0") or "0").strip() == "1"
+    if use_worker:
+        from tts_worker import TtsWorker
+
+        return TtsWorker(model_name, language, speaker, speaker_wav)
+
+    tts = load_tts(model_name)
+    speaker, speaker_wav = resolve_speaker(speaker, speaker_wav)
+    voice_kwargs = {}
+    if speaker_wav:
+        voice_kwargs["speaker_wav"] = speaker_wav
+    elif speaker:
+        voice_kwargs["speaker"] = speaker
 
     def synthesize(text: str) -> Tuple[np.ndarray, int]:
-        wav = tts.tts(text=text, language=language)
-        sr = getattr(getattr(tts, "synthesizer", None), "output_sample_rate", 24000)
-        return np.array(wav, dtype=np.float32), int(sr)
+        with _inference_context():
+            wav = tts.tts(text=text, language=language, **voice_kwargs)
+        return np.array(wav, dtype=np.float32), _output_sample_rate(tts)
 
     return synthesize
 
 
+def create_coqui_stream_synth(
+    model_name: str = DEFAULT_MODEL_NAME,
+    language: str = DEFAULT_LANGUAGE,
+    speaker: Optional[str] = None,
+    speaker_wav: Optional[str] = None,
+    stream_chunk_size: Optional[int] = None,
+) -> Callable[[str], Iterator[Tuple[np.ndarray, int]]]:
+    """Retourne un générateur de synthèse XTTS v2: text → morceaux (waveform, sample_rate).
+
+    stream_chunk_size (défaut: XTTS_STREAM_CHUNK_SIZE ou 20): nombre de tokens GPT par
+    morceau décodé; plus petit = premier son plus tôt, plus d'appels au décodeur.
+    Les latents de voix sont calculés au premier appel puis réutilisés.
+    """
+    if stream_chunk_size is None:
+        try:
+            stream_chunk_size = int(os.getenv("XTTS_STREAM_CHUNK_SIZE", str(DEFAULT_STREAM_CHUNK_SIZE)))
+        except Exception:
+            stream_chunk_size = DEFAULT_STREAM_CHUNK_SIZE
+    stream_chunk_size = max(1, stream_chunk_size)
+    tts = load_tts(model_name)
+    model = tts.synthesizer.tts_model
+    sr = _output_sample_rate(tts)
+    if not hasattr(model, "inference_stream"):
+        # Modèle sans inférence en flux: un seul morceau par phrase
+        synthesize = create_coqui_synth(model_name, language, speaker, speaker_wav, use_worker=False)
+
+        def single(text: str) -> Iterator[Tuple[np.ndarray, int]]:
+            yield synthesize(text)
+
+        return single
+
+    gpt_cond_latent, speaker_embedding = get_conditioning_latents(tts, model_name, speaker, speaker_wav)
+
+    def stream(text: str) -> Iterator[Tuple[np.ndarray, int]]:
+        t0 = time.perf_counter()
+        first = True
+        chunks = model.inference_stream(
+            text,
+            language,
+            gpt_cond_latent,
+            speaker_embedding,
+            stream_chunk_size=stream_chunk_size,
+        )
+        while True:
+            # Le mode d'inférence est local au thread: appliqué à chaque pas, pas entre deux yield
+            with _inference_context():
+                chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                wav = chunk.detach().cpu().numpy().astype(np.float32, copy=True).reshape(-1)
+            if first:
+                metrics.observe("tts_first_chunk_ms", (time.perf_counter() - t0) * 1000.0)
+                first = False
+            yield wav, sr
+
+    return stream
@@ -0,0 +1,107 @@
+"""
+Synthèse TTS pipelinée phrase par phrase.
+
+Le flux de tokens LLM est découpé en phrases (text_chunker); chaque phrase est placée dans
+une file servie par un thread de synthèse qui met l'audio en file sur le moteur de sortie.
+La première phrase est jouée pendant que les suivantes sont encore générées / synthétisées.
+Avec un synthétiseur en flux (tts_engine.create_coqui_stream_synth), chaque morceau XTTS est
+mis en file dès sa sortie du décodeur, sans attendre la fin de la phrase.
+Avec barge_in, la réponse est abandonnée (LLM, synthèse, lecture) dès que l'interlocuteur parle.
+"""
+
+import queue
+import threading
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import session_scope
+from audio_output import OutputEngine
+from resample import stream_resample
+from text_chunker import iter_chunks
+
+if TYPE_CHECKING:
+    from barge_in import BargeIn
+
+Synthesizer = Callable[[str], Tuple[np.ndarray, int]]
+StreamSynthesizer = Callable[[str], Iterator[Tuple[np.ndarray, int]]]
+Resampler = Callable[[np.ndarray, int], np.ndarray]
+
+_DONE = object()
+
+
+def speak_stream(
+    tokens: Iterable[str],
+    synth: Synthesizer,
+    engine: OutputEngine,
+    to_output: Resampler,
+    min_first_chars: Optional[int] = None,
+    on_chunk: Optional[Callable[[str], None]] = None,
+    stream_synth: Optional[StreamSynthesizer] = None,
+    output_sample_rate_hz: int = 48000,
+    barge_in: Optional["BargeIn"] = None,
+) -> str:
+    """Synthétise et joue un flux de tokens au fil de l'eau; retourne le texte complet prononcé.
+
+    - tokens: générateur de tokens (p.ex. agent.respond_stream)
+    - synth: fonction text → (waveform, sample_rate)
+    - to_output: conversion vers le format du moteur de sortie (p.ex. _to_48k_mono)
+    - min_first_chars: longueur minimale du premier morceau (TTS_FIRST_CHUNK_MIN_CHARS par défaut)
+    - stream_synth: si fourni, text → morceaux (waveform, sample_rate) utilisé à la place de synth,
+      rééchantillonnés en flux vers output_sample_rate_hz
+    - barge_in: veille pendant la réponse; à l'interruption, le reste n'est ni synthétisé ni joué
+    """
+    jobs: "queue.Queue[object]" = queue.Queue()
+    spoken: List[str] = []
+    last_end = [0]
+
+    def interrupted() -> bool:
+        return barge_in is not None and barge_in.interrupted
+
+    def worker() -> None:
+        while True:
+            item = jobs.get()
+            if item is _DONE:
+                return
+            if interrupted():
+                continue
+            text = str(item)
+            try:
+                if stream_synth is not None:
+                    for wav in stream_resample(stream_synth(text), output_sample_rate_hz):
+                        if interrupted():
+                            break
+                        last_end[0] = engine.enqueue(wav)
+                else:
+                    wav, sr = synth(text)
+                    if interrupted():
+                        continue
+                    last_end[0] = engine.enqueue(to_output(wav, sr))
+                spoken.append(text)
+            except Exception as e:
+                print(f"[TTS] Synthèse échouée pour '{text[:40]}': {e}")
+
+    thread = threading.Thread(target=session_scope.wrap(worker), name="tts-pipeline", daemon=True)
+    thread.start()
+    if barge_in is not None:
+        barge_in.arm()
+    try:
+        try:
+            for piece in iter_chunks(tokens, min_first_chars=min_first_chars):
+                if interrupted():
+                    break
+                if on_chunk is not None:
+                    on_chunk(piece)
+                jobs.put(piece)
+        finally:
+            jobs.put(_DONE)
+            thread.join()
+        if last_end[0]:
+            if barge_in is not None:
+                barge_in.wait(last_end[0])
+            else:
+                engine.wait(until=last_end[0])
+    finally:
+        if barge_in is not None:
+            barge_in.disarm()
+    return " ".join(spoken)
@@ -0,0 +1,124 @@
+"""
+Ordonnancement équitable du modèle XTTS partagé entre les sessions de host.py.
+
+- FairScheduler(workers): au plus `workers` inférences simultanées (TTS_SCHEDULER_WORKERS, def: 1);
+  les demandes en attente sont servies à tour de rôle par session (file FIFO par session),
+  si bien qu'une session qui enchaîne les phrases ne retarde pas le premier son des autres
+- scheduled_synth(synth, scheduler): synthèse par phrase, une demande par appel
+- scheduled_stream_synth(stream_synth, scheduler): inférence en flux, une demande par morceau:
+  les réponses longues sont entrelacées morceau par morceau avec celles des autres sessions
+
+La session est celle de la portée active à l'appel (session_scope), « main » hors hôte.
+Mesure: tts_queue_wait_ms (attente avant l'accès au modèle).
+"""
+
+import contextlib
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, Optional, Tuple
+
+import numpy as np
+
+import metrics
+import session_scope
+
+Synthesizer = Callable[[str], Tuple[np.ndarray, int]]
+StreamSynthesizer = Callable[[str], Iterator[Tuple[np.ndarray, int]]]
+
+
+def _session_key() -> str:
+    scope = session_scope.current()
+    return scope.name if scope is not None else "main"
+
+
+class FairScheduler:
+    """Accès au modèle partagé: round-robin entre sessions, FIFO au sein d'une session."""
+
+    def __init__(self, workers: Optional[int] = None):
+        if workers is None:
+            try:
+                workers = int(os.getenv("TTS_SCHEDULER_WORKERS", "1") or 1)
+            except Exception:
+                workers = 1
+        self.workers = max(1, int(workers))
+        self._cond = threading.Condition()
+        self._queues: Dict[str, Deque[object]] = {}
+        # Sessions ayant au moins une demande en attente, dans l'ordre de service
+        self._order: Deque[str] = deque()
+        self._running = 0
+
+    def _granted(self, key: str, ticket: object) -> bool:
+        return (
+            self._running < self.workers
+            and bool(self._order)
+            and self._order[0] == key
+            and self._queues[key][0] is ticket
+        )
+
+    @contextlib.contextmanager
+    def slot(self, key: Optional[str] = None) -> Iterator[None]:
+        """Bloque jusqu'au tour de la session key (def: session active), puis réserve le modèle."""
+        key = key or _session_key()
+        ticket = object()
+        t0 = time.perf_counter()
+        with self._cond:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(ticket)
+            if key not in self._order:
+                self._order.append(key)
+            while not self._granted(key, ticket):
+                self._cond.wait()
+            queue.popleft()
+            self._order.popleft()
+            if queue:
+                # Demande suivante de la session: après celles des autres sessions
+                self._order.append(key)
+            else:
+                del self._queues[key]
+            self._running += 1
+            self._cond.notify_all()
+        metrics.observe("tts_queue_wait_ms", (time.perf_counter() - t0) * 1000.0)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._cond.notify_all()
+
+    def pending(self) -> int:
+        """Nombre de demandes en attente, toutes sessions confondues."""
+        with self._cond:
+            return sum(len(q) for q in self._queues.values())
+
+
+def scheduled_synth(synth: Synthesizer, scheduler: FairScheduler) -> Synthesizer:
+    """synth exécutée sous le tour de rôle de scheduler."""
+
+    def synthesize(text: str) -> Tuple[np.ndarray, int]:
+        with scheduler.slot():
+            return synth(text)
+
+    return synthesize
+
+
+def scheduled_stream_synth(stream_synth: StreamSynthesizer, scheduler: FairScheduler) -> StreamSynthesizer:
+    """stream_synth dont chaque morceau est inféré sous le tour de rôle de scheduler."""
+
+    def stream(text: str) -> Iterator[Tuple[np.ndarray, int]]:
+        key = _session_key()
+        chunks = stream_synth(text)
+        try:
+            while True:
+                with scheduler.slot(key):
+                    chunk = next(chunks, None)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    return stream
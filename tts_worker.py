@@ -0,0 +1,209 @@
+"""
+Processus de synthèse XTTS dédié.
+
+Le modèle est chargé une seule fois dans un processus séparé (spawn) qui reçoit les textes
+par une file; les formes d'onde reviennent dans des blocs multiprocessing.shared_memory
+(seuls le nom du bloc et la longueur transitent par la file, pas le tableau picklé).
+Le processus principal garde ainsi le GIL libre pour les callbacks audio et le réseau.
+
+- TtsWorker(...)(text) -> (waveform, sample_rate): même interface que create_coqui_synth
+- cancel_pending(): abandonne les travaux en attente (réponse devenue obsolète)
+- redémarrage automatique du processus s'il meurt, travaux en cours resoumis une fois
+"""
+
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import weakref
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+MAX_ATTEMPTS = 2
+
+
+def _create_shm(size: int) -> shared_memory.SharedMemory:
+    """Bloc partagé créé côté worker sans suivi du resource_tracker (le parent le libère)."""
+    try:
+        return shared_memory.SharedMemory(create=True, size=size, track=False)
+    except TypeError:  # Python < 3.13
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        try:
+            from multiprocessing import resource_tracker
+
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        return shm
+
+
+def _worker_main(jobs, results, stale_before, model_name, language, speaker, speaker_wav) -> None:
+    """Boucle du processus de synthèse: charge le modèle puis traite les travaux."""
+    from tts_engine import create_coqui_synth
+
+    synth = create_coqui_synth(model_name, language, speaker, speaker_wav, use_worker=False)
+    results.put(("ready", None))
+    while True:
+        job = jobs.get()
+        if job is None:
+            return
+        job_id, text = job
+        if job_id < stale_before.value:
+            results.put(("cancelled", job_id))
+            continue
+        try:
+            wav, sr = synth(text)
+            wav = np.ascontiguousarray(wav, dtype=np.float32)
+            shm = _create_shm(max(1, wav.nbytes))
+            np.ndarray(wav.shape, dtype=np.float32, buffer=shm.buf)[:] = wav
+            results.put(("done", job_id, shm.name, int(wav.shape[0]), int(sr)))
+            shm.close()
+        except Exception as e:
+            results.put(("error", job_id, repr(e)))
+
+
+class TtsWorker:
+    """Synthèse XTTS dans un processus dédié, appelable comme create_coqui_synth()."""
+
+    def __init__(
+        self,
+        model_name: str,
+        language: str,
+        speaker: Optional[str] = None,
+        speaker_wav: Optional[str] = None,
+        max_restarts: int = 5,
+    ):
+        self._args = (model_name, language, speaker, speaker_wav)
+        self._ctx = mp.get_context("spawn")
+        self._stale_before = self._ctx.Value("q", 0)
+        self._ids = itertools.count(1)
+        self._pending: Dict[int, Tuple[Future, str, int]] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        self.restarts = 0
+        self.max_restarts = max_restarts
+        self._ready = threading.Event()
+        self._start_process()
+        self._reader = threading.Thread(target=self._read_results, name="tts-worker-reader", daemon=True)
+        self._reader.start()
+
+    def _start_process(self) -> None:
+        self._jobs = self._ctx.Queue()
+        self._results = self._ctx.Queue()
+        self._ready.clear()
+        self._process = self._ctx.Process(
+            target=_worker_main,
+            args=(self._jobs, self._results, self._stale_before) + self._args,
+            name="tts-worker",
+            daemon=True,
+        )
+        self._process.start()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """Attend le chargement du modèle dans le worker."""
+        return self._ready.wait(timeout)
+
+    # --- soumission ---
+
+    def submit(self, text: str) -> "Future[Tuple[np.ndarray, int]]":
+        future: "Future[Tuple[np.ndarray, int]]" = Future()
+        if self._closed:
+            future.set_exception(RuntimeError("Worker TTS fermé."))
+            return future
+        with self._lock:
+            job_id = next(self._ids)
+            self._pending[job_id] = (future, text, 1)
+            self._jobs.put((job_id, text))
+        return future
+
+    def synthesize(self, text: str) -> Tuple[np.ndarray, int]:
+        return self.submit(text).result()
+
+    __call__ = synthesize
+
+    def cancel_pending(self) -> int:
+        """Annule tous les travaux soumis jusqu'ici (ceux en file sont ignorés par le worker)."""
+        with self._lock:
+            self._stale_before.value = next(self._ids)
+            cancelled = list(self._pending.values())
+            self._pending.clear()
+        for future, _, _ in cancelled:
+            future.cancel()
+        return len(cancelled)
+
+    def close(self) -> None:
+        self._closed = True
+        self.cancel_pending()
+        try:
+            self._jobs.put(None)
+            self._process.join(timeout=5)
+        except Exception:
+            pass
+        if self._process.is_alive():
+            self._process.terminate()
+
+    # --- résultats ---
+
+    @staticmethod
+    def _attach(name: str, length: int) -> np.ndarray:
+        """Vue sans copie sur le bloc partagé; le bloc est délié tout de suite et fermé avec le tableau."""
+        shm = shared_memory.SharedMemory(name=name)
+        wav = np.ndarray((length,), dtype=np.float32, buffer=shm.buf)
+        shm.unlink()
+        weakref.finalize(wav, shm.close)
+        return wav
+
+    def _read_results(self) -> None:
+        while not self._closed:
+            try:
+                msg = self._results.get(timeout=0.5)
+            except queue.Empty:
+                if not self._process.is_alive() and not self._closed:
+                    self._restart()
+                continue
+            except (EOFError, OSError):
+                if not self._closed:
+                    self._restart()
+                continue
+            kind = msg[0]
+            if kind == "ready":
+                self._ready.set()
+                continue
+            job_id = msg[1]
+            with self._lock:
+                entry = self._pending.pop(job_id, None)
+            if kind == "done":
+                _, _, name, length, sr = msg
+                wav = self._attach(name, length)
+                if entry is not None and not entry[0].cancelled():
+                    entry[0].set_result((wav, sr))
+            elif kind == "error" and entry is not None:
+                entry[0].set_exception(RuntimeError(f"Synthèse échouée dans le worker: {msg[2]}"))
+
+    def _restart(self) -> None:
+        """Relance le worker mort et resoumet une fois les travaux non obsolètes."""
+        self.restarts += 1
+        print(f"[TTS-WORKER] Processus arrêté (code {self._process.exitcode}); redémarrage #{self.restarts}.")
+        with self._lock:
+            pending = dict(self._pending)
+            self._pending.clear()
+        if self.restarts > self.max_restarts:
+            for future, _, _ in pending.values():
+                future.set_exception(RuntimeError("Worker TTS indisponible (trop de redémarrages)."))
+            self._closed = True
+            return
+        self._start_process()
+        # File FIFO: seul le plus ancien travail était en cours au moment du crash
+        in_flight = min(pending) if pending else None
+        with self._lock:
+            for job_id, (future, text, attempts) in sorted(pending.items()):
+                if job_id == in_flight:
+                    attempts += 1
+                if attempts > MAX_ATTEMPTS or job_id < self._stale_before.value:
+                    future.set_exception(RuntimeError("Synthèse abandonnée après un crash du worker."))
+                    continue
+                self._pending[job_id] = (future, text, attempts)
+                self._jobs.put((job_id, text))
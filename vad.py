@@ -0,0 +1,263 @@
+"""
+Détection d'activité vocale (VAD) trame par trame et détection de fin de tour.
+
+- frame_features(frames): énergie (dBFS), taux de passage par zéro, platitude spectrale (vectorisé)
+- AdaptiveVAD: trames de 10–30 ms, plancher de bruit adaptatif, hangover
+- RmsVAD: ancien critère (RMS fixe sur blocs de 1024 échantillons), gardé pour comparaison
+- Endpointer: début / fin de tour à partir des décisions trame par trame
+- create_vad(kind, sample_rate_hz): construit le couple (vad, endpointer) selon STT_VAD
+"""
+
+import os
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+_EPS = 1e-12
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, "") or default)
+    except Exception:
+        return default
+
+
+def frame_features(frames: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Caractéristiques par trame pour un tableau (n_trames, longueur_trame) float32.
+
+    Retourne (énergie en dBFS, taux de passage par zéro [0..1], platitude spectrale [0..1]).
+    """
+    if frames.ndim != 2 or frames.shape[0] == 0:
+        empty = np.zeros((0,), dtype=np.float32)
+        return empty, empty, empty
+    energy_db = 10.0 * np.log10(np.mean(np.square(frames, dtype=np.float32), axis=1) + _EPS)
+    signs = np.signbit(frames)
+    zcr = np.mean(signs[:, 1:] != signs[:, :-1], axis=1)
+    window = np.hanning(frames.shape[1]).astype(np.float32)
+    power = np.square(np.abs(np.fft.rfft(frames * window, axis=1))) + _EPS
+    flatness = np.exp(np.mean(np.log(power), axis=1)) / np.mean(power, axis=1)
+    return energy_db.astype(np.float32), zcr.astype(np.float32), flatness.astype(np.float32)
+
+
+class AdaptiveVAD:
+    """VAD trame par trame avec plancher de bruit adaptatif.
+
+    Une trame est parole si son énergie dépasse le plancher de snr_db (et qu'elle est
+    voisée: faible platitude spectrale / ZCR modéré), ou de snr_db + 6 dB sans condition.
+    Le plancher suit les trames de non-parole (descente rapide, montée lente) pour
+    s'adapter au bruit de la source (p.ex. moniteur Meet). Le hangover prolonge la
+    décision parole de quelques trames pour couvrir les courtes pauses intra-mot.
+    """
+
+    def __init__(
+        self,
+        sample_rate_hz: int = 16000,
+        frame_ms: Optional[float] = None,
+        snr_db: Optional[float] = None,
+        hangover_ms: Optional[float] = None,
+        abs_min_db: float = -65.0,
+        flatness_max: float = 0.45,
+        zcr_max: float = 0.35,
+        floor_rise_db_per_s: float = 3.0,
+    ):
+        if frame_ms is None:
+            frame_ms = _env_float("VAD_FRAME_MS", 20.0)
+        frame_ms = min(30.0, max(10.0, float(frame_ms)))
+        self.sample_rate_hz = int(sample_rate_hz)
+        self.frame_ms = frame_ms
+        self.frame_len = max(1, int(round(self.sample_rate_hz * frame_ms / 1000.0)))
+        self.snr_db = _env_float("VAD_SNR_DB", 9.0) if snr_db is None else float(snr_db)
+        hangover_ms = _env_float("VAD_HANGOVER_MS", 120.0) if hangover_ms is None else float(hangover_ms)
+        self.hangover_frames = int(round(hangover_ms / frame_ms))
+        self.abs_min_db = abs_min_db
+        self.flatness_max = flatness_max
+        self.zcr_max = zcr_max
+        self._rise_per_frame = floor_rise_db_per_s * frame_ms / 1000.0
+        self.reset()
+
+    def reset(self) -> None:
+        self.noise_floor_db: Optional[float] = None
+        self._hang = 0
+        self._remainder = np.zeros((0,), dtype=np.float32)
+
+    def prime(self, samples: np.ndarray) -> None:
+        """Initialise le plancher de bruit sur un extrait récent, sans garder d'état de décision."""
+        self.process(samples)
+        self._hang = 0
+        self._remainder = np.zeros((0,), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        """Décisions parole (bool) pour chaque trame complète de samples (le reste est gardé)."""
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+        n_frames = samples.shape[0] // self.frame_len
+        used = n_frames * self.frame_len
+        self._remainder = samples[used:].copy()
+        if n_frames == 0:
+            return np.zeros((0,), dtype=bool)
+        return self.classify(samples[:used].reshape(n_frames, self.frame_len))
+
+    def classify(self, frames: np.ndarray) -> np.ndarray:
+        energy_db, zcr, flatness = frame_features(frames)
+        if self.noise_floor_db is None:
+            self.noise_floor_db = float(min(np.min(energy_db), -40.0))
+        voiced = (flatness < self.flatness_max) & (zcr < self.zcr_max)
+        loud = energy_db > self.abs_min_db
+
+        out = np.zeros(energy_db.shape[0], dtype=bool)
+        floor = self.noise_floor_db
+        for i in range(energy_db.shape[0]):
+            e = float(energy_db[i])
+            snr = e - floor
+            raw = bool(loud[i]) and ((snr > self.snr_db and bool(voiced[i])) or snr > self.snr_db + 6.0)
+            if raw:
+                self._hang = self.hangover_frames
+                # montée très lente même en parole continue (changement de bruit de fond)
+                floor += self._rise_per_frame * 0.25
+            else:
+                if e < floor:
+                    floor += 0.5 * (e - floor)
+                else:
+                    floor = min(e, floor + self._rise_per_frame)
+                if self._hang > 0:
+                    self._hang -= 1
+                    raw = True
+            out[i] = raw
+        self.noise_floor_db = floor
+        return out
+
+
+class RmsVAD:
+    """Ancien critère: RMS d'un bloc de 1024 échantillons comparé à un seuil fixe."""
+
+    def __init__(self, sample_rate_hz: int = 16000, threshold_rms: float = 0.010, block_size: int = 1024):
+        self.sample_rate_hz = int(sample_rate_hz)
+        self.threshold_rms = threshold_rms
+        self.frame_len = block_size
+        self.frame_ms = 1000.0 * block_size / self.sample_rate_hz
+        self.reset()
+
+    def reset(self) -> None:
+        self._remainder = np.zeros((0,), dtype=np.float32)
+
+    def process(self, samples: np.ndarray) -> np.ndarray:
+        samples = np.asarray(samples, dtype=np.float32).reshape(-1)
+        if self._remainder.size:
+            samples = np.concatenate((self._remainder, samples))
+        n_frames = samples.shape[0] // self.frame_len
+        used = n_frames * self.frame_len
+        self._remainder = samples[used:].copy()
+        if n_frames == 0:
+            return np.zeros((0,), dtype=bool)
+        frames = samples[:used].reshape(n_frames, self.frame_len)
+        return np.sqrt(np.mean(np.square(frames), axis=1)) >= self.threshold_rms
+
+
+class Endpointer:
+    """Début / fin de tour à partir des décisions parole trame par trame.
+
+    - début: min_speech_ms de parole consécutive (start_frame = première trame de la série)
+    - fin: endpoint_ms de non-parole après le début, si la durée du tour atteint min_utterance_ms
+      (un tour plus court est considéré comme un faux départ et annulé)
+    - min_total_ms: durée minimale du tour (silence compris) avant de pouvoir conclure
+    - max_utterance_ms: fin forcée
+    """
+
+    def __init__(
+        self,
+        frame_ms: float,
+        min_speech_ms: float = 100.0,
+        endpoint_ms: float = 300.0,
+        min_utterance_ms: float = 250.0,
+        max_utterance_ms: float = 15000.0,
+        min_total_ms: float = 0.0,
+    ):
+        self.frame_ms = float(frame_ms)
+        self.min_speech_frames = max(1, int(round(min_speech_ms / frame_ms)))
+        self.endpoint_frames = max(1, int(round(endpoint_ms / frame_ms)))
+        self.min_utterance_frames = max(1, int(round(min_utterance_ms / frame_ms)))
+        self.max_utterance_frames = max(1, int(round(max_utterance_ms / frame_ms)))
+        self.min_total_frames = int(round(min_total_ms / frame_ms))
+        self.reset()
+
+    def reset(self) -> None:
+        self.frame_index = 0
+        self.started = False
+        self.ended = False
+        self.start_frame: Optional[int] = None
+        self.end_frame: Optional[int] = None
+        self._run = 0
+        self._silence = 0
+
+    @property
+    def silence_frames(self) -> int:
+        """Trames de non-parole consécutives depuis la dernière trame de parole du tour en cours."""
+        return self._silence if self.started else 0
+
+    def update(self, flags: np.ndarray) -> List[Tuple[str, int]]:
+        """Consomme des décisions trame par trame; retourne les événements ("start"|"end", trame)."""
+        events: List[Tuple[str, int]] = []
+        for flag in np.asarray(flags, dtype=bool):
+            idx = self.frame_index
+            self.frame_index += 1
+            if self.ended:
+                continue
+            if not self.started:
+                self._run = self._run + 1 if flag else 0
+                if self._run >= self.min_speech_frames:
+                    self.started = True
+                    self.start_frame = idx - self._run + 1
+                    self._silence = 0
+                    events.append(("start", self.start_frame))
+                continue
+            self._silence = 0 if flag else self._silence + 1
+            length = idx + 1 - self.start_frame
+            if length >= self.max_utterance_frames:
+                self.ended, self.end_frame = True, idx + 1
+                events.append(("end", self.end_frame))
+            elif self._silence >= self.endpoint_frames and length >= self.min_total_frames:
+                if length - self._silence < self.min_utterance_frames:
+                    # faux départ (clic, toux brève): on se remet en attente
+                    self.started, self.start_frame, self._run = False, None, 0
+                    continue
+                self.ended, self.end_frame = True, idx + 1
+                events.append(("end", self.end_frame))
+        return events
+
+
+def create_vad(
+    kind: Optional[str] = None,
+    sample_rate_hz: int = 16000,
+    max_utterance_ms: float = 15000.0,
+    threshold_rms: float = 0.010,
+    min_speech_ms: int = 800,
+    silence_ms: int = 1800,
+    min_duration_s: float = 2.0,
+):
+    """Construit (vad, endpointer) selon kind ou STT_VAD (adaptive|rms, def: adaptive).
+
+    Les paramètres threshold_rms/min_speech_ms/silence_ms/min_duration_s ne concernent que
+    le mode rms (comportement historique de record_until_silence). Le mode adaptive se règle
+    via VAD_FRAME_MS, VAD_SNR_DB, VAD_HANGOVER_MS et VAD_ENDPOINT_MS.
+    """
+    kind = (kind or os.getenv("STT_VAD", "adaptive") or "adaptive").strip().lower()
+    if kind == "rms":
+        vad = RmsVAD(sample_rate_hz, threshold_rms=threshold_rms)
+        endpointer = Endpointer(
+            vad.frame_ms,
+            min_speech_ms=min_speech_ms,
+            endpoint_ms=silence_ms,
+            min_utterance_ms=0.0,
+            max_utterance_ms=max_utterance_ms,
+            min_total_ms=min_duration_s * 1000.0,
+        )
+        return vad, endpointer
+    vad = AdaptiveVAD(sample_rate_hz)
+    endpointer = Endpointer(
+        vad.frame_ms,
+        endpoint_ms=_env_float("VAD_ENDPOINT_MS", 300.0),
+        max_utterance_ms=max_utterance_ms,
+    )
+    return vad, endpointer